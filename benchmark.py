@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import platform
+import sys
+import time
+
+from modules import jj_fakes
+
+# Benchmark-suite voor de keten sensor -> mapping -> MIDI, zonder hardware: RPi.GPIO en rtmidi
+# worden vervangen door nep-modules (zie jj_fakes), zodat ook de echte backends worden gemeten.
+#
+#   python benchmark.py                              # resultaten naar benchmark-results.json
+#   python benchmark.py -o nieuw.json --compare oud.json
+#
+# Met --compare wordt elk resultaat naast een eerdere run gezet; een verslechtering groter dan
+# --threshold (standaard 10%) geeft exitcode 1, zodat een CI-job erop kan falen.
+
+GPIO, MIDI_SYSTEM = jj_fakes.install()
+
+from modules import jj_log  # noqa: E402
+jj_log.configure(level="warning")  # Alleen problemen; meldingen bij het aanmaken van sensoren en poorten niet
+
+from modules import jj_filters as filters  # noqa: E402  (na install(), zodat de nep-modules worden gebruikt)
+from modules import jj_gpio  # noqa: E402
+from modules import jj_mapping as mapping  # noqa: E402
+from modules import jj_midi as midi  # noqa: E402
+from modules import jj_notes as notes  # noqa: E402
+from modules import jj_optional  # noqa: E402
+from modules import jj_pipeline as pipeline  # noqa: E402
+from modules import jj_routing as routing  # noqa: E402
+from modules import jj_ultrasonic as us  # noqa: E402
+from modules import jj_zones as zones  # noqa: E402
+from main import distance_to_midi_value  # noqa: E402
+
+TRIG_PIN = 23
+ECHO_PIN = 24
+
+
+def rate(function, count):
+    """Roept function count keer aan en geeft aanroepen per seconde."""
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return count / (time.perf_counter() - start)
+
+
+def make_gpio(realtime):
+    """Een gesimuleerde GPIO-backend achter het (nep-)RPi.GPIO met een doel op 100 cm."""
+    backend = jj_gpio.SimulatedGPIOBackend(realtime=realtime)
+    backend.attach_echo(TRIG_PIN, ECHO_PIN, jj_gpio.SimulatedGPIOBackend.pulse_for_distance(100.0))
+    if GPIO is None:
+        return backend  # Echte RPi.GPIO aanwezig: meet de gesimuleerde backend direct
+    jj_fakes.install_gpio(backend)
+    return None  # UltrasonicSensor maakt zelf een RPiGPIOBackend aan, bovenop het nep-RPi.GPIO
+
+
+def bench_sensor(count):
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Edge-capture met direct afgeleverde flanken: meet de overhead van de meetcode zelf
+        sensor = us.UltrasonicSensor(TRIG_PIN, ECHO_PIN, gpio=make_gpio(realtime=False), capture="edge",
+                                     settle_s=0.0, max_range_cm=400)
+        results["get_distance_edge_per_s"] = rate(sensor.get_distance, count)
+        sensor.close()
+        # Polling met echte echo-tijden (~5.8 ms bij 100 cm): begrensd door de akoestiek
+        sensor = us.UltrasonicSensor(TRIG_PIN, ECHO_PIN, gpio=make_gpio(realtime=True), capture="poll",
+                                     settle_s=0.0, max_range_cm=400)
+        results["get_distance_poll_realtime_per_s"] = rate(sensor.get_distance, max(10, count // 100))
+        sensor.close()
+    return results
+
+
+def bench_midi(count):
+    with contextlib.redirect_stdout(io.StringIO()):
+        sender = midi.MidiSender(port_index=0, midiout=midi.SimulatedMidiOut(keep_messages=False))
+    values = [i % 128 for i in range(count)]
+    cases = {
+        "note_on": lambda v: sender.send_note_on(0, v, 100),
+        "note_off": lambda v: sender.send_note_off(0, v),
+        "control_change": lambda v: sender.send_control_change(0, 7, v),
+        "program_change": lambda v: sender.send_program_change(0, v),
+        "pitch_bend": lambda v: sender.send_pitch_bend(0, v * 128 - 8192),
+    }
+    results = {}
+    for name, send in cases.items():
+        start = time.perf_counter()
+        for value in values:
+            send(value)
+        results[f"midi_{name}_per_s"] = count / (time.perf_counter() - start)
+    return results
+
+
+def bench_mapping(count):
+    distances = [2.0 + (i * 0.37) % 398.0 for i in range(count)]
+    mapper = mapping.DistanceMapper(min_distance_cm=2, max_distance_cm=400, out_min=67, out_max=127)
+    results = {}
+    # De tabellen worden bij de eerste aanroep gebouwd; meet dat apart van de doorvoer
+    start = time.perf_counter()
+    mapper.map_distance(100.0)
+    results["mapping_lut_build_ms"] = (time.perf_counter() - start) * 1000
+    for name, function in (("mapping_legacy", distance_to_midi_value), ("mapping_lut", mapper.map_distance)):
+        start = time.perf_counter()
+        for distance in distances:
+            function(distance)
+        results[f"{name}_per_s"] = count / (time.perf_counter() - start)
+    pulses = [2.0 * d / 34320 for d in distances]
+    start = time.perf_counter()
+    for pulse in pulses:
+        mapper.map_pulse(pulse)
+    results["mapping_lut_pulse_per_s"] = count / (time.perf_counter() - start)
+    return results
+
+
+def bench_routing(count, sensors=40, routes_per_sensor=10):
+    """Routeringsmatrix met tientallen sensoren en honderden routes (met samenvoegen) over 4 poorten."""
+    outputs = {}
+    for i in range(4):
+        midiout = midi.SimulatedMidiOut(keep_messages=False)
+        midiout.open_port(0)
+        outputs[f"poort{i}"] = midiout
+    matrix = routing.RoutingMatrix(outputs, merge="avg")
+    for sensor in range(sensors):
+        for k in range(routes_per_sensor):
+            matrix.add_route(sensor, f"poort{k % 4}", channel=k % 16, kind="cc",
+                             controller=(sensor * routes_per_sensor + k) % 32)
+    matrix.compile()
+    distances = [2.0 + (i * 0.37) % 398.0 for i in range(count // sensors)]
+    start = time.perf_counter()
+    for distance in distances:
+        for sensor in range(sensors):
+            matrix.route(sensor, distance + sensor)
+    return {"routing_samples_per_s": len(distances) * sensors / (time.perf_counter() - start)}
+
+
+def bench_zones(count, sensors=6):
+    """Positiebepaling en zonetracking op synthetische frames (een doel dat door de ruimte loopt)."""
+    np = jj_optional.load_numpy()
+    if np is None:
+        return {}  # Zonder NumPy geen zonemapping
+    angles = [2 * math.pi * i / sensors for i in range(sensors)]
+    # Sensoren op een ellips rond een ruimte van 400 x 300 cm, naar het midden gericht
+    layout = zones.SensorLayout([(200 + 200 * math.cos(a), 150 + 150 * math.sin(a), math.degrees(a) + 180)
+                                 for a in angles])
+    grid = zones.ZoneGrid(0, 0, 400, 300, columns=4, rows=3)
+    steps = np.arange(count)
+    path = np.column_stack((200 + 150 * np.cos(steps / 100), 150 + 100 * np.sin(steps / 70)))
+    frames = np.hypot(path[:, None, 0] - layout.positions[:, 0], path[:, None, 1] - layout.positions[:, 1])
+    frames += np.random.default_rng(0).normal(0.0, 1.0, frames.shape)
+    frames[steps % 7 == 0, steps[steps % 7 == 0] % sensors] = np.nan  # Af en toe een gemiste echo
+    timestamps = steps * 0.02
+
+    frame_lists = [[None if math.isnan(d) else d for d in frame] for frame in frames[:count // 10].tolist()]
+    tracker = zones.ZoneTracker(grid)
+    start = time.perf_counter()
+    for frame, timestamp in zip(frame_lists, timestamps.tolist()):
+        tracker.update(layout.locate(frame), timestamp)
+    results = {"zones_frame_us": (time.perf_counter() - start) / len(frame_lists) * 1e6}
+
+    start = time.perf_counter()
+    tracker.track_batch(layout.locate_batch(frames), timestamps)
+    results["zones_batch_frames_per_s"] = count / (time.perf_counter() - start)
+    return results
+
+
+def bench_main_loop(duration_s):
+    """De keten van main.py (filters, mapping, NoteManager) als pipeline, met realtime echo's."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        sensor = us.UltrasonicSensor(TRIG_PIN, ECHO_PIN, gpio=make_gpio(realtime=True), capture="edge",
+                                     settle_s=0.0, max_range_cm=400)
+        filtered_sensor = filters.FilteredSensor(sensor, filters.FilterChain(
+            filters.OutlierGate(max_step=30.0, min_value=2, max_value=400),
+            filters.RollingMedian(window=5),
+        ))
+        mapper = mapping.DistanceMapper(min_distance_cm=2, max_distance_cm=400, out_min=67, out_max=127)
+        sender = midi.MidiSender(port_index=0, midiout=midi.SimulatedMidiOut(keep_messages=False))
+        note_manager = notes.NoteManager(sender, channel=0, velocity=100, mode="mono")
+        sensor_pipeline = pipeline.SensorMidiPipeline(
+            read_sample=filtered_sensor.get_distance,
+            map_sample=mapper.map_distance,
+            send_sample=note_manager.play,
+            on_read_failure=note_manager.sensor_missed,
+            acquire_rate_hz=50.0,
+        )
+        asyncio.run(sensor_pipeline.run(duration_s=duration_s))
+        sensor.close()
+    latency = sensor_pipeline.latency_stats()
+    return {f"main_loop_latency_{key}": value for key, value in latency.items() if key != "count"}
+
+
+def compare(results, baseline, threshold):
+    """Zet de resultaten naast een eerdere run; geeft de namen van verslechterde resultaten terug."""
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or not old:
+            continue
+        higher_is_better = name.endswith("per_s")  # Anders een latentie: lager is beter
+        change = (value - old) / old
+        worse = -change if higher_is_better else change
+        marker = "  <-- verslechterd" if worse > threshold else ""
+        if marker:
+            regressions.append(name)
+        print(f"{name:<42} {old:>14.3f} -> {value:>14.3f} ({change:+.1%}){marker}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark van de keten sensor -> mapping -> MIDI zonder hardware.")
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="JSON-bestand voor de resultaten")
+    parser.add_argument("--compare", help="Eerder JSON-resultaat om mee te vergelijken")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Toegestane verslechtering (fractie)")
+    parser.add_argument("--quick", action="store_true", help="Minder herhalingen (voor een snelle controle)")
+    args = parser.parse_args(argv)
+
+    count = 20000 if args.quick else 200000
+    results = {}
+    results.update(bench_sensor(count // 10))
+    results.update(bench_midi(count))
+    results.update(bench_mapping(count))
+    results.update(bench_routing(count))
+    results.update(bench_zones(count // 10))
+    results.update(bench_main_loop(1.0 if args.quick else 5.0))
+
+    for name, value in results.items():
+        print(f"{name:<42} {value:>14.3f}" if value is not None and not math.isnan(value) else f"{name:<42} -")
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "fake_gpio": GPIO is not None,
+        "fake_rtmidi": MIDI_SYSTEM is not None,
+        "quick": args.quick,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultaten geschreven naar {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} resultaat/resultaten verslechterd met meer dan {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import statistics
+import time
+
+from modules import jj_gpio
+from modules import jj_log
+from modules import jj_mapping as mapping
+from modules import jj_ultrasonic as us
+
+# Benchmark van de looptijd van een meetlus met uitgebreide logging aan en uit. De logregels gaan
+# naar een trage stream die een seriële console nabootst (115200 baud, ~11.5 kB/s), zoals op een
+# Pi zonder netwerk. Per sample worden twee regels gelogd (afstand en MIDI-waarde, zoals main.py
+# vroeger printte) en elke tiende meting geeft een echo-timeout.
+#
+#   synchroon: elke regel direct geschreven in de meetlus (zoals met print())
+#   uit:       niveau 'warning', de per-sample regels worden direct weggegooid
+#   aan:       niveau 'debug' via de achtergrondthread, met samenvoegen van herhaalde meldingen
+#   aan-alles: idem, maar zonder samenvoegen (elke regel gaat naar de console, op de achtergrond)
+
+SAMPLES = 500
+BAUD_BYTES_PER_S = 115200 / 10
+
+class SerialConsole:
+    """Stream die per geschreven byte even wacht, zoals een seriële console."""
+
+    def __init__(self, bytes_per_s=BAUD_BYTES_PER_S):
+        self.bytes_per_s = bytes_per_s
+        self.bytes_written = 0
+
+    def write(self, text):
+        self.bytes_written += len(text)
+        time.sleep(len(text) / self.bytes_per_s)
+
+    def flush(self):
+        pass
+
+def make_sensor():
+    gpio = jj_gpio.SimulatedGPIOBackend(realtime=False)
+    count = [0]
+
+    def pulse():
+        count[0] += 1
+        return None if count[0] % 10 == 0 else jj_gpio.SimulatedGPIOBackend.pulse_for_distance(100.0 + count[0] % 7)
+
+    gpio.attach_echo(23, 24, pulse)
+    return us.UltrasonicSensor(23, 24, gpio=gpio, capture="edge", timeout_s=0.002, settle_s=0.0)
+
+def run_loop(level, **sink_options):
+    console = SerialConsole()
+    sink = jj_log.configure(level=level, stream=console, **sink_options)
+    log = jj_log.get_logger("main")
+    sensor = make_sensor()
+    mapper = mapping.DistanceMapper(min_distance_cm=2, max_distance_cm=400, out_min=67, out_max=127)
+    loop_times = []
+    for _ in range(SAMPLES):
+        start = time.perf_counter()
+        distance = sensor.get_distance()
+        if distance is not None:
+            log.debug(f"Afstand: {distance:.2f} cm")
+            log.debug(f"MIDI-waarde: {mapper.map_distance(distance)}")
+        loop_times.append(time.perf_counter() - start)
+    sensor.close()
+    sink.close()  # Schrijft ook de achterstand van de achtergrondthread weg (niet meegeteld in de looptijd)
+    stats = sink.stats()
+    loop_times.sort()
+    return {
+        "mean_us": statistics.fmean(loop_times) * 1e6,
+        "p50_us": loop_times[len(loop_times) // 2] * 1e6,
+        "p99_us": loop_times[int(len(loop_times) * 0.99)] * 1e6,
+        "written": stats["written"],
+        "suppressed": stats["suppressed"],
+        "bytes": console.bytes_written,
+    }
+
+if __name__ == "__main__":
+    results = {
+        "synchroon": run_loop("debug", threaded=False, dedupe_window_s=0),
+        "uit": run_loop("warning"),
+        "aan": run_loop("debug"),
+        "aan-alles": run_loop("debug", dedupe_window_s=0),
+    }
+    jj_log.configure()
+    print(f"{'logging':<10} {'gem (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10} {'regels':>8} {'samengevat':>11} {'bytes':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['mean_us']:>10.1f} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} "
+              f"{r['written']:>8} {r['suppressed']:>11} {r['bytes']:>8}")
@@ -1,6 +1,15 @@
 from modules import jj_midi as midi
 from modules import jj_ultrasonic as us
-import time
+from modules import jj_pipeline as pipeline
+from modules import jj_filters as filters
+from modules import jj_mapping as mapping
+from modules import jj_notes as notes
+from modules import jj_midifile as midifile
+from modules import jj_adaptive as adaptive
+from modules import jj_ports as ports
+from modules import jj_health as health
+from modules import jj_log
+import asyncio
 
 def distance_to_midi_value(distance, min_distance=2, max_distance=400):
     """
@@ -16,37 +25,74 @@ if __name__ == "__main__":
 
     TRIG_PIN = 23
     ECHO_PIN = 24
+    MIDI_PORT_INDEX = 3
+    MIDI_PORT_NAME = None  # Bijv. "Midi Gadget": volgt de poort op naam, ook na opnieuw inpluggen
+    MIDI_FILE = None  # Bijv. "sessie.mid" om zonder MIDI-hardware naar een MIDI-bestand te schrijven
+    LOG_LEVEL = "info"  # "debug" voor uitgebreide logging, "warning" voor alleen problemen
+    LOG_FORMAT = "human"  # Of "structured" (compacte JSON per regel, bijv. voor journald)
+
+    # Logregels gaan via een achtergrondthread naar stdout; herhalingen worden samengevat
+    jj_log.configure(level=LOG_LEVEL, format=LOG_FORMAT)
+    log = jj_log.get_logger("main")
 
     sensor = None # Initialiseer sensor buiten try-blok voor cleanup
+    sensor_pipeline = None
+    note_manager = None
 
     try:
-        midi_sender = midi.MidiSender(port_index=3)
-        sensor = us.UltrasonicSensor(TRIG_PIN, ECHO_PIN, unit="cm")
-
-        print("\nStart met meten. Druk Ctrl+C om te stoppen.")
-        while True:
-            distance = sensor.get_distance()
-            if distance is not None:
-                print(f"Afstand: {distance} {sensor.unit}")
-                print(distance_to_midi_value(distance)) # Converteer afstand naar MIDI-waarde
-                midi_value = distance_to_midi_value(distance)
-                if midi_value is not None:
-                    # Stuur een Control Change op kanaal 0 (MIDI-kanaal 1)
-                    # midi_sender.send_control_change(0, 7, midi_value)
-                    midi_sender.send_note_on(0, midi_value, 100)  # Speel een noot (C3) met de MIDI-waarde
-            else:
-                print("Meting mislukt of buiten bereik.")
-            time.sleep(0.5) # Wacht 0.5 seconden tussen metingen
+        if MIDI_FILE:
+            midi_sender = midi.MidiSender(port_index=0, midiout=midifile.MidiFileOut(MIDI_FILE))
+        elif MIDI_PORT_NAME:
+            midi_sender = midi.MidiSender(port_index=0, midiout=ports.ReconnectingMidiOut(MIDI_PORT_NAME))
+        else:
+            # Poort zoeken en openen op de achtergrond, terwijl de sensor stabiliseert
+            midi_sender = midi.MidiSender(port_index=MIDI_PORT_INDEX, background=True)
+        sensor = us.UltrasonicSensor(TRIG_PIN, ECHO_PIN, unit="cm", max_range_cm=400, capture="edge")
+        # Blijft de sensor falen (bijv. losgeraakt), dan wordt hij alleen nog af en toe geprobeerd
+        # in plaats van elke meting een volle timeout te kosten
+        monitored_sensor = health.HealthMonitoredSensor(sensor)
+        # Verwerp losse spookecho's en dempt de ruis voordat de afstand een noot wordt
+        filtered_sensor = filters.FilteredSensor(monitored_sensor, filters.FilterChain(
+            filters.OutlierGate(max_step=30.0, min_value=2, max_value=400),
+            filters.RollingMedian(window=5),
+        ))
+
+        # Snel meten als er beweging is, langzaam als alles stil staat
+        sampler = adaptive.AdaptiveSampler(filtered_sensor, min_rate_hz=2.0, max_rate_hz=16.0)
+
+        # Zelfde bereik als distance_to_midi_value, maar via een vooraf berekende tabel.
+        # Probeer bijv. scale="pentatonic", curve="logarithmic" of hysteresis_mm=10.
+        mapper = mapping.DistanceMapper(min_distance_cm=2, max_distance_cm=400, out_min=67, out_max=127)
+
+        # Stuurt alleen een Note On als de noot verandert en laat de vorige noot los
+        note_manager = notes.NoteManager(midi_sender, channel=0, velocity=100, mode="mono")
+
+        # Meten, mappen en verzenden draaien als losse stappen met elk een eigen tempo:
+        # de sampler bepaalt het meettempo en de MIDI-uitvoer verstuurt steeds de nieuwste waarde.
+        sensor_pipeline = pipeline.SensorMidiPipeline(
+            read_sample=sampler.read,
+            map_sample=mapper.map_distance,
+            # Speel een noot op kanaal 0 (MIDI-kanaal 1) met de MIDI-waarde
+            # Of een Control Change: lambda value: midi_sender.send_control_change(0, 7, value)
+            send_sample=note_manager.play,
+            on_read_failure=note_manager.sensor_missed,
+            acquire_rate_hz=None,
+            map_policy="drop-oldest",
+            output_policy="coalesce-latest",
+        )
+
+        log.info("Start met meten. Druk Ctrl+C om te stoppen.")
+        asyncio.run(sensor_pipeline.run())
 
     except KeyboardInterrupt:
-        print("\nProgramma gestopt door gebruiker.")
+        log.info("Programma gestopt door gebruiker.")
     finally:
+        if sensor_pipeline:
+            log.info("Pipeline", **sensor_pipeline.stats())
+            log.info("Sampler", **sampler.stats())
+            log.info("Sensor", **monitored_sensor.health.stats())
+        if note_manager:
+            note_manager.all_notes_off()  # Geen hangende noten op de synth
         # Zorg ervoor dat GPIO wordt opgeruimd, zelfs bij een fout
         if sensor:
-            del sensor # Dit roept __del__ aan
-        else:
-            # Als sensor niet is geïnitialiseerd (bijv. door fout in __init__),
-            # dan moeten we GPIO toch opruimen als er iets is ingesteld.
-            # Dit is een catch-all, maar idealiter vang je fouten in __init__ al op.
-            GPIO.cleanup()
-
+            sensor.close()
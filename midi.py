@@ -27,39 +27,59 @@ def send_control_change(port_index, channel, controller_number, value):
     send_midi_message(port_index, cc_message)
 
 
+_open_ports = {}  # port_index -> open rtmidi.MidiOut, kept open between messages
+
+
 def send_midi_message(port_index, message):
     """
     Sends a MIDI message to the specified output port.
+    The port is opened once and kept open for later messages.
 
     Args:
         port_index (int): The index of the MIDI output port to use.
         message (list): A list of integers representing the MIDI message bytes.
     """
-    midiout = rtmidi.MidiOut()
-    available_ports = midiout.get_ports()
-
-    if not available_ports:
-        print("No MIDI output ports found. Please ensure your device is connected and recognized.")
-        return
-
-    if port_index >= len(available_ports) or port_index < 0:
-        print(f"Invalid port index {port_index}. Available ports:")
-        for i, port_name in enumerate(available_ports):
-            print(f"  [{i}]: {port_name}")
-        return
+    port = _open_ports.get(port_index)
+    if port is None:
+        if not available_ports:
+            print("No MIDI output ports found. Please ensure your device is connected and recognized.")
+            return
+
+        if port_index >= len(available_ports) or port_index < 0:
+            print(f"Invalid port index {port_index}. Available ports:")
+            for i, port_name in enumerate(available_ports):
+                print(f"  [{i}]: {port_name}")
+            return
+
+        try:
+            port = rtmidi.MidiOut()
+            port.open_port(port_index)
+            print(f"Sending to port: {available_ports[port_index]}")
+        except rtmidi.SystemError as e:
+            print(f"Error opening MIDI port: {e}")
+            return
+        _open_ports[port_index] = port
 
     try:
-        midiout.open_port(port_index)
-        port_name = available_ports[port_index]
-        print(f"Sending to port: {port_name}")
-
         print(f"  Sending message: {message} (hex: {[hex(b) for b in message]})")
-        midiout.send_message(message)
-        time.sleep(0.1) # Give a small delay to ensure message is sent
+        port.send_message(message)
     except rtmidi.SystemError as e:
-        print(f"Error opening or sending MIDI message: {e}")
-    finally:
-        del midiout # Close the MIDI output when done
+        print(f"Error sending MIDI message: {e}")
+
+
+def close_midi_ports(drain_s=0.1):
+    """
+    Closes the ports opened by send_midi_message.
+
+    Args:
+        drain_s (float): Short delay before closing, so the last messages are delivered.
+    """
+    if not _open_ports:
+        return
+    time.sleep(drain_s)  # Give the driver a moment to deliver the last messages
+    for port in _open_ports.values():
+        port.close_port()
+    _open_ports.clear()
 
 
 print("Available MIDI input ports:")
@@ -73,4 +93,7 @@ print ("Available MIDI ports:")
 for i, port in enumerate(available_ports):
     print(f"{i}: {port}")
 
-send_control_change(3, 0, 90, 127)
\ No newline at end of file
+try:
+    send_control_change(3, 0, 90, 127)
+finally:
+    close_midi_ports()
@@ -0,0 +1,48 @@
+import time
+from modules import jj_midi as midi
+
+# Micro-benchmark: berichten per seconde via MidiSender.send_control_change tegenover
+# CoalescingMidiSender, met een gesimuleerde rtmidi-uitvoer (geen MIDI-hardware nodig).
+
+N = 200000
+
+def bench(label, send, values):
+    start = time.perf_counter()
+    for value in values:
+        send(0, 7, value)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {len(values) / elapsed:>12,.0f} aanroepen/s")
+    return elapsed
+
+def make_sender():
+    return midi.MidiSender(port_index=0, midiout=midi.SimulatedMidiOut(keep_messages=False))
+
+if __name__ == "__main__":
+    # Een langzaam veranderend signaal, zoals een afstandssensor dat geeft: veel herhalingen
+    slow_values = [(i // 16) % 128 for i in range(N)]
+    # Elke aanroep een andere waarde: het slechtste geval voor send-on-change
+    changing_values = [i % 128 for i in range(N)]
+
+    sender = make_sender()
+    bench("MidiSender.send_control_change", sender.send_control_change, changing_values)
+    print(f"  verstuurd: {sender.midiout.sent_count}")
+
+    sender = make_sender()
+    fast = midi.CoalescingMidiSender(sender)
+    bench("CoalescingMidiSender (elke waarde anders)", fast.send_control_change, changing_values)
+    print(f"  verstuurd: {sender.midiout.sent_count}")
+
+    sender = make_sender()
+    bench("MidiSender.send_control_change (traag signaal)", sender.send_control_change, slow_values)
+    print(f"  verstuurd: {sender.midiout.sent_count}")
+
+    sender = make_sender()
+    fast = midi.CoalescingMidiSender(sender, deadband=1)
+    bench("CoalescingMidiSender (traag signaal, deadband 1)", fast.send_control_change, slow_values)
+    print(f"  verstuurd: {sender.midiout.sent_count}, onderdrukt: {fast.suppressed_count}")
+
+    sender = make_sender()
+    fast = midi.CoalescingMidiSender(sender, coalesce_window_s=0.005)
+    bench("CoalescingMidiSender (venster 5 ms)", fast.send_control_change, changing_values)
+    fast.flush()
+    print(f"  verstuurd: {sender.midiout.sent_count}, samengevoegd/onderdrukt: {fast.suppressed_count}")
@@ -0,0 +1,98 @@
+import collections
+import time
+
+class AdaptiveSampler:
+    """
+    Past de meetsnelheid van een sensor aan de beweging van het doel aan.
+
+    Beweegt het doel (verandering groter dan motion_threshold_cm tussen twee metingen), dan gaat
+    de snelheid direct naar max_rate_hz; staat het stil, dan zakt de snelheid geleidelijk naar
+    min_rate_hz. De minimale hertrigger-tijd van de sensor wordt altijd gerespecteerd.
+    read() wacht zelf tot de volgende meting aan de beurt is en kan dus direct als
+    read_sample van een SensorMidiPipeline worden gebruikt (met acquire_rate_hz=None).
+    """
+
+    def __init__(self, sensor, min_rate_hz=2.0, max_rate_hz=16.0, motion_threshold_cm=1.0,
+                 decay=0.8, window=64):
+        """
+        Args:
+            sensor: Een UltrasonicSensor (of iets met get_distance()).
+            min_rate_hz (float, optional): Meetsnelheid bij een stilstaand doel.
+            max_rate_hz (float, optional): Meetsnelheid bij beweging; begrensd door MIN_RETRIGGER_S.
+            motion_threshold_cm (float, optional): Verandering die als beweging telt.
+            decay (float, optional): Factor waarmee de snelheid per stilstaande meting daalt.
+            window (int, optional): Aantal recente metingen voor de statistieken.
+        """
+        min_interval_s = getattr(sensor, "MIN_RETRIGGER_S", 0.0)
+        if min_interval_s:
+            max_rate_hz = min(max_rate_hz, 1.0 / min_interval_s)
+        if not 0 < min_rate_hz <= max_rate_hz:
+            raise ValueError("min_rate_hz moet groter dan 0 en niet groter dan max_rate_hz zijn.")
+        self.sensor = sensor
+        self.min_rate_hz = min_rate_hz
+        self.max_rate_hz = max_rate_hz
+        self.motion_threshold_cm = motion_threshold_cm
+        self.decay = decay
+
+        self.rate_hz = max_rate_hz
+        self.last_distance = None
+        self._next_at = None
+        # Recente metingen als (tijdstip, timeout?) voor de effectieve snelheid en het timeout-percentage
+        self._history = collections.deque(maxlen=window)
+
+    def _adapt(self, distance):
+        if distance is None:
+            return  # Geen informatie over beweging; snelheid blijft gelijk
+        if self.last_distance is not None and abs(distance - self.last_distance) > self.motion_threshold_cm:
+            self.rate_hz = self.max_rate_hz
+        else:
+            self.rate_hz = max(self.min_rate_hz, self.rate_hz * self.decay)
+        self.last_distance = distance
+
+    def read(self):
+        """
+        Wacht tot de volgende meting aan de beurt is, meet en past de snelheid aan.
+
+        Returns:
+            float: De afstand, of None bij een mislukte meting.
+        """
+        now = time.perf_counter()
+        if self._next_at is not None and self._next_at > now:
+            time.sleep(self._next_at - now)
+        started = time.perf_counter()
+        # Alleen echte echo-timeouts tellen: een door een filter verworpen sample is ook None.
+        # De teller van de sensor is ook door wrappers (FilteredSensor, RecordingSensor) heen bereikbaar.
+        timeouts = getattr(self.sensor, "timeout_count", None)
+        distance = self.sensor.get_distance()
+        if timeouts is None:
+            timed_out = distance is None  # Sensor zonder teller: elke mislukte meting telt
+        else:
+            timed_out = self.sensor.timeout_count != timeouts
+        self._history.append((started, timed_out))
+        self._adapt(distance)
+        self._next_at = started + 1.0 / self.rate_hz
+        return distance
+
+    def effective_rate_hz(self):
+        """Gemeten meetsnelheid over de recente metingen."""
+        if len(self._history) < 2:
+            return 0.0
+        elapsed = self._history[-1][0] - self._history[0][0]
+        return (len(self._history) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def timeout_rate(self):
+        """
+        Fractie van de recente metingen met een echo-timeout. Samples die een filter verwerpt of die
+        buiten bereik vallen tellen niet mee (alleen bij een sensor zonder timeout_count telt elke None).
+        """
+        if not self._history:
+            return 0.0
+        return sum(1 for _, failed in self._history if failed) / len(self._history)
+
+    def stats(self):
+        return {
+            "rate_hz": self.rate_hz,
+            "effective_rate_hz": self.effective_rate_hz(),
+            "timeout_rate": self.timeout_rate(),
+            "timeout_s": getattr(self.sensor, "timeout_s", None),
+        }
@@ -0,0 +1,171 @@
+import sys
+import types
+
+from modules import jj_gpio
+
+# Nep-versies van de modules RPi.GPIO en rtmidi, zodat code die deze modules direct importeert
+# (ook de losse scripts zoals ultrasonic.py en midi.py) zonder Raspberry Pi of MIDI-hardware draait.
+# Roep install() aan vóórdat de andere modules worden geïmporteerd:
+#
+#     from modules import jj_fakes
+#     gpio, midi_system = jj_fakes.install()
+#     from modules import jj_midi as midi   # gebruikt nu het nep-rtmidi
+
+
+def make_fake_gpio_module(backend=None):
+    """
+    Bouwt een module met de interface van RPi.GPIO (BCM-nummering) bovenop een
+    SimulatedGPIOBackend. Koppel echo's met backend.attach_echo(trig, echo, pulsduur).
+    """
+    backend = backend if backend is not None else jj_gpio.SimulatedGPIOBackend()
+    module = types.ModuleType("RPi.GPIO")
+    module.BCM, module.BOARD = 11, 10
+    module.OUT, module.IN = 0, 1
+    module.LOW, module.HIGH = jj_gpio.GPIOBackend.LOW, jj_gpio.GPIOBackend.HIGH
+    module.RISING, module.FALLING, module.BOTH = 31, 32, 33
+    module.PUD_OFF, module.PUD_DOWN, module.PUD_UP = 20, 21, 22
+    module.backend = backend
+    state = {"mode": None}
+    delivering = {}  # pin -> niveau van de flank die op dit moment aan een callback wordt gemeld
+
+    def setmode(mode):
+        state["mode"] = mode
+
+    def getmode():
+        return state["mode"]
+
+    def setwarnings(flag):
+        pass
+
+    def setup(channel, direction, pull_up_down=None, initial=None):
+        for pin in channel if isinstance(channel, (list, tuple)) else (channel,):
+            if direction == module.OUT:
+                backend.setup_output(pin, module.LOW if initial is None else initial)
+            else:
+                backend.setup_input(pin)
+
+    def output(channel, value):
+        backend.output(channel, value)
+
+    def input(channel):
+        # Binnen een flank-callback geeft de echte bibliotheek het niveau direct na de flank
+        level = delivering.get(channel)
+        return backend.input(channel) if level is None else level
+
+    def add_event_detect(channel, edge, callback=None, bouncetime=None):
+        def _on_edge(pin, level, timestamp_ns):
+            if edge == module.RISING and level != module.HIGH or edge == module.FALLING and level != module.LOW:
+                return
+            if callback is not None:
+                delivering[pin] = level
+                try:
+                    callback(pin)
+                finally:
+                    delivering.pop(pin, None)
+        backend.add_edge_callback(channel, _on_edge)
+
+    def remove_event_detect(channel):
+        backend.remove_edge_callback(channel)
+
+    def cleanup(channel=None):
+        backend.cleanup(None if channel is None else
+                        list(channel) if isinstance(channel, (list, tuple)) else [channel])
+
+    for function in (setmode, getmode, setwarnings, setup, output, input, add_event_detect,
+                     remove_event_detect, cleanup):
+        setattr(module, function.__name__, function)
+    return module
+
+
+class _FakeMidiIn:
+    """Minimale rtmidi.MidiIn zonder ingangen (alleen zodat imports en get_ports() werken)."""
+
+    def get_ports(self):
+        return []
+
+    def get_port_count(self):
+        return 0
+
+    def open_port(self, port=0, name=None):
+        raise RuntimeError(f"Ongeldige poort {port}: het nep-rtmidi heeft geen ingangen")
+
+    def is_port_open(self):
+        return False
+
+    def close_port(self):
+        pass
+
+    def get_message(self):
+        return None
+
+    def set_callback(self, callback, data=None):
+        pass
+
+
+def make_fake_rtmidi_module(system=None):
+    """
+    Bouwt een module met de interface van rtmidi bovenop een SimulatedMidiSystem, zodat poorten
+    tijdens een test kunnen verschijnen en verdwijnen (system.add_port() / remove_port()).
+    """
+    from modules.jj_midi import SimulatedMidiSystem
+    system = system if system is not None else SimulatedMidiSystem(["Simulated MIDI Out"])
+    module = types.ModuleType("rtmidi")
+    # Subklasse van RuntimeError: ook code die zonder rtmidi is geladen (MidiSystemError = RuntimeError)
+    # vangt deze fouten dan op
+    module.SystemError = type("SystemError", (RuntimeError,), {"__module__": "rtmidi"})
+    module.MidiOut = system.MidiOut
+    module.MidiIn = _FakeMidiIn
+    module.API_UNSPECIFIED = 0
+    module.get_compiled_api = lambda: [module.API_UNSPECIFIED]
+    module.system = system
+    return module
+
+
+def install_gpio(backend=None):
+    """Zet een nep-RPi.GPIO bovenop backend in sys.modules en geeft de backend terug."""
+    gpio_module = make_fake_gpio_module(backend)
+    package = types.ModuleType("RPi")
+    package.__path__ = []
+    package.GPIO = gpio_module
+    sys.modules["RPi"] = package
+    sys.modules["RPi.GPIO"] = gpio_module
+    return gpio_module.backend
+
+
+def install_rtmidi(system=None):
+    """Zet een nep-rtmidi bovenop system in sys.modules en geeft het MIDI-systeem terug."""
+    rtmidi_module = make_fake_rtmidi_module(system)
+    sys.modules["rtmidi"] = rtmidi_module
+    # Heeft jj_midi al (vergeefs) naar rtmidi gezocht, laad dan bij het volgende gebruik het nep-rtmidi
+    midi_module = sys.modules.get("modules.jj_midi")
+    if midi_module is not None and midi_module.rtmidi is None:
+        midi_module._rtmidi_loaded = False
+    return rtmidi_module.system
+
+
+def install(gpio_backend=None, midi_system=None, force=False):
+    """
+    Zet nep-versies van RPi.GPIO en rtmidi in sys.modules.
+
+    Args:
+        gpio_backend (SimulatedGPIOBackend, optional): Backend achter het nep-RPi.GPIO.
+        midi_system (SimulatedMidiSystem, optional): MIDI-systeem achter het nep-rtmidi.
+        force (bool, optional): Ook installeren als de echte module beschikbaar is.
+
+    Returns:
+        tuple: (gpio_backend, midi_system); None voor een module waarvoor de echte wordt gebruikt.
+    """
+    installed_gpio = installed_midi = None
+    if force or not _importable("RPi.GPIO"):
+        installed_gpio = install_gpio(gpio_backend)
+    if force or not _importable("rtmidi"):
+        installed_midi = install_rtmidi(midi_system)
+    return installed_gpio, installed_midi
+
+
+def _importable(name):
+    try:
+        __import__(name)
+        return True
+    except (ImportError, RuntimeError):  # RPi.GPIO geeft een RuntimeError buiten een Raspberry Pi
+        return False
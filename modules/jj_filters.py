@@ -0,0 +1,303 @@
+import bisect
+import math
+
+from modules import jj_optional
+
+
+class StreamFilter:
+    """
+    Basisklasse voor een streaming filter op afstandsmetingen.
+
+    update(value) verwerkt één sample en geeft de gefilterde waarde terug (of None als het
+    sample verworpen wordt). process_batch(samples) draait hetzelfde filter over een hele reeks
+    opgenomen samples; subklassen kunnen dit met NumPy vectoriseren.
+    """
+
+    def update(self, value):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def process_batch(self, samples):
+        """
+        Draait het filter over een reeks samples en geeft de gefilterde reeks terug.
+        Verworpen samples worden NaN (of None zonder NumPy).
+        """
+        results = [self.update(float(value)) for value in samples]
+        np = jj_optional.load_numpy()
+        if np is None:
+            return results
+        return np.array([math.nan if value is None else value for value in results], dtype=float)
+
+
+class RollingMedian(StreamFilter):
+    """
+    Lopende mediaan over de laatste `window` samples.
+    Een ringbuffer onthoudt de volgorde, een gesorteerde lijst levert de mediaan. Per sample is
+    dat een bisect (O(log window)) plus het verschuiven van de lijst bij del/insort (O(window));
+    voor de kleine vensters van een afstandssensor is dat goedkoop, maar niet O(1).
+
+    process_batch() gaat verder vanaf de streamingtoestand (zoals update()) en laat die achter
+    alsof de samples één voor één zijn verwerkt.
+    """
+
+    def __init__(self, window=5):
+        if window < 1:
+            raise ValueError("Het venster moet minstens 1 sample groot zijn.")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._ring = [0.0] * self.window
+        self._index = 0
+        self._count = 0
+        self._sorted = []
+
+    def update(self, value):
+        if self._count == self.window:
+            oldest = self._ring[self._index]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        else:
+            self._count += 1
+        self._ring[self._index] = value
+        self._index = (self._index + 1) % self.window
+        bisect.insort(self._sorted, value)
+
+        n = self._count
+        middle = n // 2
+        if n % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2.0
+
+    def process_batch(self, samples):
+        np = jj_optional.load_numpy()
+        if np is None:
+            return super().process_batch(samples)
+        samples = np.asarray(samples, dtype=float)
+        window, count, n = self.window, self._count, len(samples)
+        # Wat er al in het venster zit (oud naar nieuw) gaat vóór de batch
+        if count == window:
+            history = self._ring[self._index:] + self._ring[:self._index]
+        else:
+            history = self._ring[:count]
+        combined = np.concatenate((np.asarray(history, dtype=float), samples))
+        out = np.empty(n, dtype=float)
+        # Samples met nog een onvolledig venster gaan via de streamingversie
+        head = min(n, max(0, window - 1 - count))
+        for i in range(head):
+            out[i] = self.update(samples[i])
+        if head < n:
+            # Sample i eindigt op index count + i van combined; zijn venster begint op count + i - window + 1
+            windows = np.lib.stride_tricks.sliding_window_view(combined, window)
+            out[head:] = np.median(windows[count + head - window + 1:count + n - window + 1], axis=1)
+            # Zet de streamingtoestand gelijk aan het einde van de batch
+            self.reset()
+            for value in combined[-window:]:
+                self.update(float(value))
+        return out
+
+
+def _ema_batch(samples, alpha, start):
+    """
+    Gevectoriseerde EMA y[n] = y[n-1] + alpha * (x[n] - y[n-1]) in blokken.
+    Binnen een blok is y een gewogen cumulatieve som; de blokgrootte houdt de gewichten
+    binnen het bereik van float64.
+    """
+    np = jj_optional.load_numpy()
+    decay = 1.0 - alpha
+    out = np.empty(len(samples), dtype=float)
+    if decay <= 0.0:
+        out[:] = samples
+        return out
+    block = int(min(4096, max(1, -200.0 / math.log10(decay)))) if decay < 1.0 else 4096
+    powers = decay ** np.arange(1, block + 1)
+    previous = start
+    for begin in range(0, len(samples), block):
+        chunk = samples[begin:begin + block]
+        p = powers[:len(chunk)]
+        weighted = np.cumsum(chunk / p) * alpha
+        out[begin:begin + len(chunk)] = p * (previous + weighted)
+        previous = out[begin + len(chunk) - 1]
+    return out
+
+
+class ExponentialMovingAverage(StreamFilter):
+    """Exponentieel voortschrijdend gemiddelde: y = y + alpha * (x - y)."""
+
+    def __init__(self, alpha=0.3):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha moet tussen 0 (exclusief) en 1 liggen.")
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def process_batch(self, samples):
+        np = jj_optional.load_numpy()
+        if np is None:
+            return super().process_batch(samples)
+        samples = np.asarray(samples, dtype=float)
+        if len(samples) == 0:
+            return samples.copy()
+        start = samples[0] if self.value is None else self.value
+        out = _ema_batch(samples, self.alpha, start)
+        self.value = float(out[-1])
+        return out
+
+
+class Kalman1D(StreamFilter):
+    """
+    Eendimensionaal Kalmanfilter voor een (vrijwel) constante afstand.
+
+    Args:
+        process_variance (float): Hoeveel de werkelijke afstand per sample mag veranderen (Q).
+        measurement_variance (float): Ruis van de sensor (R), in cm^2.
+    """
+
+    def __init__(self, process_variance=1.0, measurement_variance=4.0):
+        self.q = process_variance
+        self.r = measurement_variance
+        self.reset()
+
+    def reset(self):
+        self.estimate = None
+        self.error = 1.0
+
+    def update(self, value):
+        if self.estimate is None:
+            self.estimate = value
+            self.error = self.r
+            return value
+        error = self.error + self.q
+        gain = error / (error + self.r)
+        self.estimate += gain * (value - self.estimate)
+        self.error = (1.0 - gain) * error
+        return self.estimate
+
+    def process_batch(self, samples):
+        np = jj_optional.load_numpy()
+        if np is None:
+            return super().process_batch(samples)
+        samples = np.asarray(samples, dtype=float)
+        out = np.empty(len(samples), dtype=float)
+        # De versterking hangt niet af van de metingen en convergeert snel; tot die tijd
+        # draait het gewone filter, daarna is het een EMA met alpha = stationaire versterking.
+        i = 0
+        previous_gain = None
+        while i < len(samples):
+            if self.estimate is not None:
+                error = self.error + self.q
+                gain = error / (error + self.r)
+                if previous_gain is not None and abs(gain - previous_gain) < 1e-12:
+                    break
+                previous_gain = gain
+            out[i] = self.update(samples[i])
+            i += 1
+        if i < len(samples):
+            out[i:] = _ema_batch(samples[i:], previous_gain, self.estimate)
+            self.estimate = float(out[-1])
+        return out
+
+
+class OutlierGate(StreamFilter):
+    """
+    Verwerpt samples die te ver of te snel afwijken van de laatst geaccepteerde waarde.
+
+    Args:
+        max_step (float): Maximale sprong tussen twee opeenvolgende samples (bijv. cm).
+        min_value (float, optional): Ondergrens van een geldige meting.
+        max_value (float, optional): Bovengrens van een geldige meting.
+        relock_after (int, optional): Na zoveel verworpen samples op rij wordt de nieuwe
+                                      waarde toch geaccepteerd (het object is echt verplaatst).
+    """
+
+    def __init__(self, max_step=30.0, min_value=None, max_value=None, relock_after=3):
+        self.max_step = max_step
+        self.min_value = min_value
+        self.max_value = max_value
+        self.relock_after = relock_after
+        self.reset()
+
+    def reset(self):
+        self.last = None
+        self.rejected_in_row = 0
+        self.rejected = 0
+
+    def update(self, value):
+        if (self.min_value is not None and value < self.min_value) or \
+                (self.max_value is not None and value > self.max_value):
+            self.rejected += 1
+            return None
+        if self.last is not None and abs(value - self.last) > self.max_step:
+            self.rejected_in_row += 1
+            if self.rejected_in_row < self.relock_after:
+                self.rejected += 1
+                return None
+        self.rejected_in_row = 0
+        self.last = value
+        return value
+
+
+class FilterChain(StreamFilter):
+    """
+    Schakelt filters achter elkaar. Een verworpen sample (None) stopt de keten voor dat sample.
+    """
+
+    def __init__(self, *filters):
+        self.filters = list(filters)
+
+    def reset(self):
+        for stage in self.filters:
+            stage.reset()
+
+    def update(self, value):
+        for stage in self.filters:
+            if value is None:
+                return None
+            value = stage.update(value)
+        return value
+
+    def process_batch(self, samples):
+        np = jj_optional.load_numpy()
+        if np is None:
+            return super().process_batch(samples)
+        values = np.asarray(samples, dtype=float)
+        for stage in self.filters:
+            valid = ~np.isnan(values)
+            if valid.all():
+                values = np.asarray(stage.process_batch(values), dtype=float)
+            else:
+                # Verworpen samples overslaan, zoals in de streamingmodus
+                filtered = np.asarray(stage.process_batch(values[valid]), dtype=float)
+                values = np.full(len(values), math.nan)
+                values[valid] = filtered
+        return values
+
+
+class FilteredSensor:
+    """
+    Zet een filter(keten) achter een sensor. get_distance() geeft de gefilterde afstand;
+    overige attributen (unit, close, ...) worden doorgegeven aan de onderliggende sensor.
+    """
+
+    def __init__(self, sensor, stream_filter):
+        self.sensor = sensor
+        self.filter = stream_filter
+
+    def get_distance(self):
+        distance = self.sensor.get_distance()
+        if distance is None:
+            return None
+        return self.filter.update(distance)
+
+    def __getattr__(self, name):
+        return getattr(self.sensor, name)
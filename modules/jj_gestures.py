@@ -0,0 +1,319 @@
+import collections
+import math
+import time
+
+from modules import jj_optional
+
+# Een herkend gebaar. value is afhankelijk van het soort gebaar:
+#   swipe_in / swipe_out: snelheid in cm/s, hold: afstand in cm, tap: duur in seconden.
+Gesture = collections.namedtuple("Gesture", ["kind", "index", "timestamp", "value"])
+
+# Volgorde waarin gebaren van hetzelfde sample worden gemeld (ook in de batchmodus)
+GESTURE_KINDS = ("tap", "swipe_in", "swipe_out", "hold")
+
+
+class GestureDetector:
+    """
+    Herkent gebaren in een (gefilterde) stroom afstandsmetingen.
+
+    - swipe_in / swipe_out: binnen `window` samples en hooguit swipe_time_s komt het doel
+      minstens swipe_distance_cm dichterbij (of gaat het zover weg). Gemeld bij het begin van de beweging.
+    - hold: het doel staat minstens hold_s stil (per sample niet meer dan hold_tolerance_cm verschil).
+    - tap: het doel verschijnt en verdwijnt weer binnen tap_max_s.
+
+    Een doel is aanwezig als de afstand tussen min_distance_cm en presence_cm ligt; None of NaN
+    telt als afwezig. Per sample kost update() een vaste hoeveelheid werk en geheugen.
+    """
+
+    def __init__(self, window=8, swipe_distance_cm=20.0, swipe_time_s=0.5, hold_s=1.0,
+                 hold_tolerance_cm=2.0, tap_max_s=0.3, min_distance_cm=2.0, presence_cm=150.0):
+        """
+        Args:
+            window (int, optional): Aantal samples waarover een swipe wordt bekeken.
+            swipe_distance_cm (float, optional): Minimale verplaatsing voor een swipe.
+            swipe_time_s (float, optional): Maximale duur van een swipe.
+            hold_s (float, optional): Hoe lang het doel stil moet staan voor een hold.
+            hold_tolerance_cm (float, optional): Maximale verandering per sample die nog als stil telt.
+            tap_max_s (float, optional): Maximale aanwezigheid voor een tap.
+            min_distance_cm (float, optional): Kleinere afstanden tellen als afwezig.
+            presence_cm (float, optional): Grotere afstanden tellen als afwezig.
+        """
+        if window < 2:
+            raise ValueError("window moet minstens 2 zijn.")
+        self.window = window
+        self.swipe_distance_cm = swipe_distance_cm
+        self.swipe_time_s = swipe_time_s
+        self.hold_s = hold_s
+        self.hold_tolerance_cm = hold_tolerance_cm
+        self.tap_max_s = tap_max_s
+        self.min_distance_cm = min_distance_cm
+        self.presence_cm = presence_cm
+        self.reset()
+
+    def reset(self):
+        self._times = [0.0] * self.window
+        self._distances = [0.0] * self.window
+        self._present = [False] * self.window
+        self._absent_in_window = self.window
+        self._count = 0
+        self._last_distance = None
+        self._present_since = None
+        self._steady_since = None
+        self._swipe_in = self._swipe_out = self._holding = False
+        self.velocity_cm_per_s = 0.0
+
+    def _is_present(self, distance):
+        return (distance is not None and not math.isnan(distance)
+                and self.min_distance_cm <= distance <= self.presence_cm)
+
+    def update(self, distance, timestamp=None):
+        """
+        Verwerkt één meting.
+
+        Args:
+            distance (float): De (gefilterde) afstand in cm, of None bij een mislukte meting.
+            timestamp (float, optional): Tijdstip in seconden; standaard time.perf_counter().
+
+        Returns:
+            list: De gebaren (Gesture) die bij dit sample zijn herkend, meestal leeg.
+        """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        index = self._count
+        self._count += 1
+        present = self._is_present(distance)
+        was_present = self._last_distance is not None
+        events = []
+
+        # Ringbuffer: het oudste sample wordt overschreven
+        slot = index % self.window
+        self._absent_in_window += (not present) - (not self._present[slot])
+        self._times[slot] = timestamp
+        self._distances[slot] = distance if present else 0.0
+        self._present[slot] = present
+
+        # Tap: korte aanwezigheid die weer eindigt
+        if present and not was_present:
+            self._present_since = timestamp
+        elif was_present and not present:
+            duration = timestamp - self._present_since
+            if duration <= self.tap_max_s:
+                events.append(Gesture("tap", index, timestamp, duration))
+
+        # Swipes: verplaatsing tussen het oudste en nieuwste sample in een volledig venster
+        swipe_in = swipe_out = False
+        if self._count >= self.window and not self._absent_in_window:
+            oldest = (index + 1) % self.window
+            elapsed = timestamp - self._times[oldest]
+            change = distance - self._distances[oldest]
+            self.velocity_cm_per_s = change / elapsed if elapsed > 0 else 0.0
+            if elapsed <= self.swipe_time_s:
+                swipe_in = change <= -self.swipe_distance_cm
+                swipe_out = change >= self.swipe_distance_cm
+        elif not present:
+            self.velocity_cm_per_s = 0.0
+        if swipe_in and not self._swipe_in:
+            events.append(Gesture("swipe_in", index, timestamp, -self.velocity_cm_per_s))
+        if swipe_out and not self._swipe_out:
+            events.append(Gesture("swipe_out", index, timestamp, self.velocity_cm_per_s))
+        self._swipe_in, self._swipe_out = swipe_in, swipe_out
+
+        # Hold: lang genoeg zonder grote stap tussen opeenvolgende samples
+        if not present:
+            self._steady_since = None
+        elif not was_present or abs(distance - self._last_distance) > self.hold_tolerance_cm:
+            self._steady_since = timestamp
+        holding = self._steady_since is not None and timestamp - self._steady_since >= self.hold_s
+        if holding and not self._holding:
+            events.append(Gesture("hold", index, timestamp, distance))
+        self._holding = holding
+
+        self._last_distance = distance if present else None
+        return events
+
+    def detect_batch(self, distances, timestamps):
+        """
+        Zoekt alle gebaren in een opgenomen reeks, gevectoriseerd met NumPy.
+        Geeft dezelfde gebaren als update() per sample (vanaf een gereset detector).
+
+        Args:
+            distances: Afstanden in cm; NaN (of None) voor mislukte metingen.
+            timestamps: Tijdstippen in seconden, even lang als distances.
+
+        Returns:
+            list: Alle herkende gebaren (Gesture), op volgorde van sample.
+        """
+        np = jj_optional.load_numpy()
+        if np is None:
+            self.reset()
+            events = []
+            for distance, timestamp in zip(distances, timestamps):
+                events.extend(self.update(distance, timestamp))
+            return events
+
+        d = np.array([math.nan if value is None else value for value in distances], dtype=float)
+        t = np.asarray(timestamps, dtype=float)
+        n = len(d)
+        if n == 0:
+            return []
+        present = (d >= self.min_distance_cm) & (d <= self.presence_cm)  # NaN vergelijkt als False
+        previous = np.concatenate(([False], present[:-1]))
+        found = []
+
+        # Tap: lengte van elke aanwezigheidsreeks die eindigt
+        starts = np.flatnonzero(present & ~previous)
+        ends = np.flatnonzero(~present & previous)
+        starts = starts[:len(ends)]
+        durations = t[ends] - t[starts]
+        taps = durations <= self.tap_max_s
+        found.append((ends[taps], 0, durations[taps]))
+
+        # Swipes: volledige vensters zonder afwezige samples
+        w = self.window
+        if n >= w:
+            absent_counts = np.concatenate(([0], np.cumsum(~present)))
+            last = np.arange(w - 1, n)
+            first = last - w + 1
+            full = absent_counts[last + 1] - absent_counts[first] == 0
+            elapsed = t[last] - t[first]
+            change = d[last] - d[first]
+            with np.errstate(invalid="ignore"):
+                fast = full & (elapsed <= self.swipe_time_s)
+                velocity = np.where(elapsed > 0, change / np.where(elapsed > 0, elapsed, 1.0), 0.0)
+                for order, condition, sign in ((1, fast & (change <= -self.swipe_distance_cm), -1.0),
+                                               (2, fast & (change >= self.swipe_distance_cm), 1.0)):
+                    rising = condition & ~np.concatenate(([False], condition[:-1]))
+                    found.append((last[rising], order, sign * velocity[rising]))
+
+        # Hold: tijd sinds de laatste onderbreking (afwezig of te grote stap)
+        with np.errstate(invalid="ignore"):
+            step = np.abs(np.diff(d, prepend=math.nan))
+        steady_step = present & previous & (step <= self.hold_tolerance_cm)
+        restart = present & ~steady_step
+        since = np.maximum.accumulate(np.where(restart, np.arange(n), -1))
+        holding = present & (since >= 0) & (t - t[np.maximum(since, 0)] >= self.hold_s)
+        rising = holding & ~np.concatenate(([False], holding[:-1]))
+        found.append((np.flatnonzero(rising), 3, d[rising]))
+
+        indices = np.concatenate([item[0] for item in found])
+        orders = np.concatenate([np.full(len(item[0]), item[1]) for item in found])
+        values = np.concatenate([item[2] for item in found])
+        events = []
+        for position in np.lexsort((orders, indices)):
+            index = int(indices[position])
+            events.append(Gesture(GESTURE_KINDS[orders[position]], index, float(t[index]),
+                                  float(values[position])))
+        return events
+
+
+class ProgramChange:
+    """Actie: stuurt een Program Change."""
+
+    def __init__(self, program, channel=0):
+        self.program = program
+        self.channel = channel
+
+    def __call__(self, sender, gesture):
+        sender.send_program_change(self.channel, self.program)
+
+
+class VelocityNote:
+    """
+    Actie: speelt een noot met een velocity die afhangt van de snelheid van het gebaar
+    (lineair tussen min_speed en max_speed cm/s) en laat hem na length_s weer los.
+    """
+
+    def __init__(self, note, channel=0, min_speed_cm_per_s=20.0, max_speed_cm_per_s=200.0,
+                 min_velocity=20, max_velocity=127, length_s=0.25):
+        self.note = note
+        self.channel = channel
+        self.min_speed = min_speed_cm_per_s
+        self.max_speed = max_speed_cm_per_s
+        self.min_velocity = min_velocity
+        self.max_velocity = max_velocity
+        self.length_s = length_s
+        self._release_at = None
+
+    def velocity_for(self, speed):
+        fraction = (abs(speed) - self.min_speed) / (self.max_speed - self.min_speed)
+        fraction = min(1.0, max(0.0, fraction))
+        return int(round(self.min_velocity + fraction * (self.max_velocity - self.min_velocity)))
+
+    def __call__(self, sender, gesture):
+        if self._release_at is not None:
+            sender.send_note_off(self.channel, self.note)
+        sender.send_note_on(self.channel, self.note, self.velocity_for(gesture.value))
+        self._release_at = gesture.timestamp + self.length_s
+
+    def tick(self, sender, now):
+        if self._release_at is not None and now >= self._release_at:
+            sender.send_note_off(self.channel, self.note)
+            self._release_at = None
+
+
+class CcRamp:
+    """
+    Actie: laat een controller in duration_s van start naar end lopen. De tussenwaarden
+    worden bij elke update van de GestureEngine verstuurd (alleen als de waarde verandert).
+    """
+
+    def __init__(self, controller, start=0, end=127, duration_s=1.0, channel=0):
+        self.controller = controller
+        self.start = start
+        self.end = end
+        self.duration_s = duration_s
+        self.channel = channel
+        self._started_at = None
+        self._last_value = None
+
+    def __call__(self, sender, gesture):
+        self._started_at = gesture.timestamp
+        self._last_value = None
+        self.tick(sender, gesture.timestamp)
+
+    def tick(self, sender, now):
+        if self._started_at is None:
+            return
+        fraction = 1.0 if self.duration_s <= 0 else min(1.0, (now - self._started_at) / self.duration_s)
+        value = int(round(self.start + fraction * (self.end - self.start)))
+        if value != self._last_value:
+            sender.send_control_change(self.channel, self.controller, value)
+            self._last_value = value
+        if fraction >= 1.0:
+            self._started_at = None
+
+
+class GestureEngine:
+    """
+    Koppelt een GestureDetector aan MIDI-acties, bijv.:
+
+        GestureEngine(GestureDetector(), midi_sender, {
+            "swipe_in": [VelocityNote(60)],
+            "hold": [ProgramChange(5)],
+            "tap": [CcRamp(74, 0, 127, duration_s=0.5)],
+        })
+
+    Een actie is een callable action(sender, gesture); acties met een tick(sender, now)-methode
+    (noot loslaten, CC-ramp) worden bij elke update bijgewerkt.
+    """
+
+    def __init__(self, detector, sender, bindings=None):
+        self.detector = detector
+        self.sender = sender
+        self.bindings = {kind: list(bindings.get(kind, ())) if bindings else [] for kind in GESTURE_KINDS}
+        self._ticking = [action for actions in self.bindings.values() for action in actions
+                         if hasattr(action, "tick")]
+        self.counts = dict.fromkeys(GESTURE_KINDS, 0)
+
+    def update(self, distance, timestamp=None):
+        """Verwerkt één meting, voert de acties van herkende gebaren uit en geeft die gebaren terug."""
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        gestures = self.detector.update(distance, timestamp)
+        for gesture in gestures:
+            self.counts[gesture.kind] += 1
+            for action in self.bindings[gesture.kind]:
+                action(self.sender, gesture)
+        for action in self._ticking:
+            action.tick(self.sender, timestamp)
+        return gestures
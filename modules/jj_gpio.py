@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+
+from modules import jj_log
+
+log = jj_log.get_logger("gpio")
+
+# Keuze van de standaardbackend: 'auto' (RPi.GPIO als dat te laden is, anders gesimuleerd),
+# 'rpi' of 'simulated'. In te stellen met de omgevingsvariabele JJ_GPIO_BACKEND.
+BACKEND_ENV = "JJ_GPIO_BACKEND"
+
+class GPIOBackend:
+    """
+    Basisklasse voor een GPIO-backend.
+
+    Een backend levert de paar GPIO-functies die de sensoren nodig hebben: pinnen instellen,
+    uitgangen schakelen, ingangen lezen en flanken (edges) melden via een callback.
+    Zo kan dezelfde sensorcode draaien op een Raspberry Pi (RPiGPIOBackend) of op een
+    gewone Linux-machine met een gesimuleerde echobron (SimulatedGPIOBackend).
+
+    Een edge-callback wordt aangeroepen als callback(pin, level, timestamp_ns), waarbij
+    timestamp_ns een time.perf_counter_ns() tijdstempel van de flank is.
+    """
+
+    LOW = 0
+    HIGH = 1
+
+    def setup_output(self, pin, initial=LOW):
+        raise NotImplementedError
+
+    def setup_input(self, pin):
+        raise NotImplementedError
+
+    def output(self, pin, value):
+        raise NotImplementedError
+
+    def input(self, pin):
+        raise NotImplementedError
+
+    def add_edge_callback(self, pin, callback):
+        raise NotImplementedError
+
+    def remove_edge_callback(self, pin):
+        raise NotImplementedError
+
+    def cleanup(self, pins=None):
+        raise NotImplementedError
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """
+    GPIO-backend bovenop RPi.GPIO (BCM-nummering).
+    RPi.GPIO wordt pas geïmporteerd wanneer deze backend wordt aangemaakt.
+    """
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        self._GPIO = GPIO
+        GPIO.setmode(GPIO.BCM)  # Gebruik BCM-nummering voor GPIO-pinnen
+        self._callbacks = {}
+
+    def setup_output(self, pin, initial=GPIOBackend.LOW):
+        self._GPIO.setup(pin, self._GPIO.OUT, initial=initial)
+
+    def setup_input(self, pin):
+        self._GPIO.setup(pin, self._GPIO.IN)
+
+    def output(self, pin, value):
+        self._GPIO.output(pin, value)
+
+    def input(self, pin):
+        return self._GPIO.input(pin)
+
+    def add_edge_callback(self, pin, callback):
+        """
+        Registreert een callback voor zowel stijgende als dalende flanken op de pin.
+        De tijdstempel wordt zo vroeg mogelijk in de RPi.GPIO-callbackthread genomen.
+        """
+        GPIO = self._GPIO
+        perf_counter_ns = time.perf_counter_ns
+
+        def _on_edge(channel):
+            timestamp_ns = perf_counter_ns()
+            callback(channel, GPIO.input(channel), timestamp_ns)
+
+        self._callbacks[pin] = _on_edge
+        GPIO.add_event_detect(pin, GPIO.BOTH, callback=_on_edge)
+
+    def remove_edge_callback(self, pin):
+        if self._callbacks.pop(pin, None) is not None:
+            self._GPIO.remove_event_detect(pin)
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            self._GPIO.cleanup()
+        else:
+            for pin in pins:
+                self.remove_edge_callback(pin)
+            self._GPIO.cleanup(list(pins))
+
+
+class SimulatedGPIOBackend(GPIOBackend):
+    """
+    Gesimuleerde GPIO-backend met een model van HC-SR04 echo's, voor gebruik zonder Raspberry Pi.
+
+    Met attach_echo() koppel je een TRIG-pin aan een ECHO-pin. Na elke triggerpuls (HOOG -> LAAG)
+    wordt de ECHO-pin na trigger_latency_s hoog en na de pulsduur weer laag. input() volgt dit
+    model in echte tijd, zodat ook de polling-meetmethode werkt.
+
+    Edge-callbacks krijgen de gemodelleerde tijdstempels van de flanken mee. Met realtime=True
+    worden ze op het juiste moment vanuit een timerthread afgeleverd; met realtime=False direct
+    tijdens de triggerpuls, wat tests en benchmarks niet laat wachten op de gesimuleerde echo.
+    """
+
+    def __init__(self, realtime=True):
+        self.realtime = realtime
+        self._levels = {}
+        self._outputs = set()
+        self._callbacks = {}
+        self._echoes = {}       # trig_pin -> (echo_pin, pulse_source, trigger_latency_s)
+        self._pulses = {}       # echo_pin -> (rise_ns, fall_ns)
+        self._lock = threading.Lock()
+        self.trigger_count = 0
+
+    def attach_echo(self, trig_pin, echo_pin, pulse_source, trigger_latency_s=0.0005):
+        """
+        Koppelt een gesimuleerde echobron aan een TRIG/ECHO-pinpaar.
+
+        Args:
+            trig_pin (int): De TRIG-pin die de meting start.
+            echo_pin (int): De ECHO-pin waarop de puls verschijnt.
+            pulse_source (float or callable): Pulsduur in seconden, of een functie zonder
+                                              argumenten die per meting de pulsduur teruggeeft.
+                                              None betekent: geen echo.
+            trigger_latency_s (float, optional): Tijd tussen einde triggerpuls en begin echo.
+        """
+        self._echoes[trig_pin] = (echo_pin, pulse_source, trigger_latency_s)
+
+    @staticmethod
+    def pulse_for_distance(distance_cm, speed_of_sound_cm_per_s=34320):
+        """Geeft de echo-pulsduur (s) die bij een afstand in cm hoort."""
+        return 2.0 * distance_cm / speed_of_sound_cm_per_s
+
+    def setup_output(self, pin, initial=GPIOBackend.LOW):
+        self._outputs.add(pin)
+        self._levels[pin] = initial
+
+    def setup_input(self, pin):
+        self._levels.setdefault(pin, self.LOW)
+
+    def output(self, pin, value):
+        previous = self._levels.get(pin, self.LOW)
+        self._levels[pin] = value
+        if previous == self.HIGH and value == self.LOW and pin in self._echoes:
+            self._start_echo(pin)
+
+    def input(self, pin):
+        pulse = self._pulses.get(pin)
+        if pulse is None:
+            return self._levels.get(pin, self.LOW)
+        now_ns = time.perf_counter_ns()
+        return self.HIGH if pulse[0] <= now_ns < pulse[1] else self.LOW
+
+    def add_edge_callback(self, pin, callback):
+        self._callbacks[pin] = callback
+
+    def remove_edge_callback(self, pin):
+        self._callbacks.pop(pin, None)
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            pins = list(self._levels)
+        for pin in pins:
+            self._callbacks.pop(pin, None)
+            self._pulses.pop(pin, None)
+            self._levels.pop(pin, None)
+            self._outputs.discard(pin)
+
+    def _start_echo(self, trig_pin):
+        echo_pin, pulse_source, latency_s = self._echoes[trig_pin]
+        self.trigger_count += 1
+        pulse_s = pulse_source() if callable(pulse_source) else pulse_source
+        if pulse_s is None:
+            return  # Geen echo: de ECHO-pin blijft laag
+        rise_ns = time.perf_counter_ns() + int(latency_s * 1e9)
+        fall_ns = rise_ns + int(pulse_s * 1e9)
+        with self._lock:
+            self._pulses[echo_pin] = (rise_ns, fall_ns)
+
+        if not self.realtime:
+            self._fire(echo_pin, self.HIGH, rise_ns)
+            self._fire(echo_pin, self.LOW, fall_ns)
+            return
+
+        # Eén thread per puls levert beide flanken, zodat ze nooit in de verkeerde volgorde aankomen
+        thread = threading.Thread(target=self._deliver, args=(echo_pin, rise_ns, fall_ns), daemon=True)
+        thread.start()
+
+    def _deliver(self, pin, rise_ns, fall_ns):
+        for level, at_ns in ((self.HIGH, rise_ns), (self.LOW, fall_ns)):
+            delay_s = (at_ns - time.perf_counter_ns()) / 1e9
+            if delay_s > 0:
+                time.sleep(delay_s)
+            self._fire(pin, level, at_ns)
+
+    def _fire(self, pin, level, timestamp_ns):
+        callback = self._callbacks.get(pin)
+        if callback is not None:
+            callback(pin, level, timestamp_ns)
+
+
+def create_backend(kind=None):
+    """
+    Maakt de standaard GPIO-backend aan. RPi.GPIO wordt pas hier (bij het eerste gebruik) geladen.
+
+    Bij 'auto' wordt alleen teruggevallen op de gesimuleerde backend als RPi.GPIO niet geïnstalleerd
+    is. Een RuntimeError van RPi.GPIO (geen toegang tot /dev/gpiomem, geen Raspberry Pi) wordt
+    doorgegeven: een sensor die stilletjes gesimuleerde waarden geeft, is erger dan een foutmelding.
+    Kies op een ontwikkelmachine met RPi.GPIO expliciet 'simulated'.
+
+    Args:
+        kind (str, optional): 'auto', 'rpi' of 'simulated'. Standaard de waarde van
+                              JJ_GPIO_BACKEND, of 'auto'.
+    """
+    kind = (kind or os.environ.get(BACKEND_ENV, "auto")).lower()
+    if kind == "simulated":
+        return SimulatedGPIOBackend()
+    if kind not in ("auto", "rpi"):
+        raise ValueError(f"Ongeldige GPIO-backend '{kind}'. Kies 'auto', 'rpi' of 'simulated'.")
+    try:
+        return RPiGPIOBackend()
+    except ImportError as e:
+        if kind == "rpi":
+            raise
+        log.warning(f"RPi.GPIO niet beschikbaar ({e}); de gesimuleerde GPIO-backend wordt gebruikt.",
+                    key="gpio_fallback")
+        return SimulatedGPIOBackend()
@@ -0,0 +1,287 @@
+import collections
+import time
+
+from modules import jj_log
+from modules import jj_ultrasonic as us
+
+log = jj_log.get_logger("health")
+
+# Uitkomst van één meting, zoals SensorHealth die bijhoudt
+OK, TIMEOUT, ERROR, OUT_OF_RANGE = range(4)
+OUTCOMES = ("ok", "timeout", "error", "out_of_range")
+
+# Toestanden van de circuit breaker: 'closed' meet normaal, 'open' slaat metingen over tot de
+# volgende probe, 'half_open' laat probe-metingen door tot de sensor weer gezond is (of niet).
+STATES = ("closed", "open", "half_open")
+
+# Omrekening naar cm voor de grenzen van classify(), per eenheid van de sensor
+_UNIT_TO_CM = {"cm": 1.0, "m": 100.0}
+
+# Een gezondheidsgebeurtenis: kind is de nieuwe toestand ('open', 'half_open' of 'closed'),
+# state_duration_s hoe lang de vorige toestand duurde, rates de foutfracties per uitkomst.
+HealthEvent = collections.namedtuple("HealthEvent", ["kind", "sensor", "timestamp", "state_duration_s", "rates"])
+
+
+class SensorHealth:
+    """
+    Houdt per sensor de uitkomsten van de laatste `window` metingen bij (in een bytearray met
+    vaste tellers, dus vaste kosten per meting) en beheert een circuit breaker.
+
+    Zijn de recente metingen te vaak mislukt, dan gaat de breaker open: allow() geeft dan False
+    en de sensor wordt niet meer getriggerd, zodat een losgeraakte sensor niet elke cyclus een
+    volle echo-timeout kost. Na backoff_s mag één probe-meting; mislukt die, dan verdubbelt de
+    wachttijd (tot max_backoff_s), lukken er recover_successes achter elkaar, dan sluit de breaker.
+
+    Welke uitkomsten als fout tellen is instelbaar: standaard 'timeout' en 'error'. Buiten bereik
+    telt niet mee, want bij een theremin-achtige opstelling staat er vaak gewoon niemand voor de sensor.
+    """
+
+    def __init__(self, sensor=None, window=32, failure_threshold=0.8, min_samples=8, consecutive_failures=10,
+                 backoff_s=0.5, max_backoff_s=5.0, backoff_factor=2.0, recover_successes=2,
+                 failures=("timeout", "error"), min_distance_cm=None, max_distance_cm=None, on_event=None):
+        """
+        Args:
+            sensor (optional): Naam of index van de sensor (voor de gebeurtenissen).
+            window (int, optional): Aantal recente metingen voor de foutfracties.
+            failure_threshold (float, optional): Foutfractie waarboven de breaker opengaat.
+            min_samples (int, optional): Minimaal aantal metingen voordat de foutfractie telt.
+            consecutive_failures (int, optional): Aantal fouten op rij waarna de breaker altijd opengaat.
+            backoff_s (float, optional): Wachttijd tot de eerste probe.
+            max_backoff_s (float, optional): Grootste wachttijd tussen probes.
+            backoff_factor (float, optional): Vermenigvuldiging van de wachttijd na een mislukte probe.
+            recover_successes (int, optional): Aantal geslaagde probes op rij om de breaker te sluiten.
+            failures (tuple, optional): Uitkomsten die als fout tellen (uit OUTCOMES).
+            min_distance_cm (float, optional): Kleinere afstanden tellen als 'out_of_range'.
+            max_distance_cm (float, optional): Grotere afstanden tellen als 'out_of_range'.
+            on_event (callable, optional): Wordt aangeroepen met een HealthEvent, bijv. een HealthReporter.
+        """
+        unknown = set(failures) - set(OUTCOMES)
+        if unknown or "ok" in failures:
+            raise ValueError(f"Ongeldige foutuitkomsten {sorted(unknown) or ['ok']}. Kies uit {OUTCOMES[1:]}.")
+        if window < 1 or not 0.0 < failure_threshold <= 1.0:
+            raise ValueError("Ongeldige instellingen. window moet minimaal 1 zijn en failure_threshold in (0, 1] liggen.")
+        self.sensor = sensor
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.min_samples = min(min_samples, window)
+        self.consecutive_failures = consecutive_failures
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.backoff_factor = backoff_factor
+        self.recover_successes = recover_successes
+        self._is_failure = tuple(name in failures for name in OUTCOMES)
+        self.min_distance_cm = min_distance_cm
+        self.max_distance_cm = max_distance_cm
+        self.on_event = on_event
+
+        self._outcomes = bytearray(window)
+        self._position = 0
+        self.totals = [0] * len(OUTCOMES)  # Sinds het begin, per uitkomst
+        self.skipped_count = 0
+        self.reset()
+
+    def reset(self):
+        """Wist het venster en sluit de breaker (zonder gebeurtenis)."""
+        self._counts = [0] * len(OUTCOMES)
+        self._filled = 0
+        self._failures = 0
+        self._failure_streak = 0
+        self._success_streak = 0
+        self.state = "closed"
+        self._state_since = time.perf_counter()
+        self._current_backoff_s = self.backoff_s
+        self.next_probe_at = None
+
+    def classify(self, distance, unit="cm"):
+        """
+        Uitkomst voor een geslaagde meting: OK, of OUT_OF_RANGE buiten min/max_distance_cm.
+
+        Args:
+            distance (float): De gemeten afstand.
+            unit (str, optional): Eenheid van distance ('cm' of 'm'); wordt omgerekend naar cm.
+        """
+        distance = distance * _UNIT_TO_CM[unit]
+        if self.min_distance_cm is not None and distance < self.min_distance_cm:
+            return OUT_OF_RANGE
+        if self.max_distance_cm is not None and distance > self.max_distance_cm:
+            return OUT_OF_RANGE
+        return OK
+
+    def allow(self, now=None):
+        """
+        Mag de sensor nu gemeten worden? In de toestand 'open' alleen als de volgende probe aan
+        de beurt is (de breaker gaat dan naar 'half_open'). Een overgeslagen meting wordt geteld.
+        """
+        if self.state != "open":
+            return True
+        now = time.perf_counter() if now is None else now
+        if now < self.next_probe_at:
+            self.skipped_count += 1
+            return False
+        self._transition("half_open", now)
+        return True
+
+    def record(self, outcome, now=None):
+        """
+        Legt de uitkomst van een meting vast (OK, TIMEOUT, ERROR of OUT_OF_RANGE) en werkt de breaker bij.
+        """
+        # Vast venster: de oudste uitkomst valt eruit, de nieuwe komt erbij
+        if self._filled == self.window:
+            old = self._outcomes[self._position]
+            self._counts[old] -= 1
+            self._failures -= self._is_failure[old]
+        else:
+            self._filled += 1
+        self._outcomes[self._position] = outcome
+        self._position = (self._position + 1) % self.window
+        self._counts[outcome] += 1
+        self.totals[outcome] += 1
+
+        failed = self._is_failure[outcome]
+        self._failures += failed
+        if failed:
+            self._failure_streak += 1
+            self._success_streak = 0
+        else:
+            self._failure_streak = 0
+            self._success_streak += 1
+
+        if self.state == "closed":
+            if failed and (self._failure_streak >= self.consecutive_failures or
+                           self._filled >= self.min_samples and
+                           self._failures >= self.failure_threshold * self._filled):
+                self._open(self.backoff_s, now)
+        elif self.state == "half_open":
+            if failed:
+                self._open(min(self._current_backoff_s * self.backoff_factor, self.max_backoff_s), now)
+            elif self._success_streak >= self.recover_successes:
+                # Gezond: begin met een schoon venster, anders gaat de breaker door oude fouten meteen weer open
+                self._counts = [0] * len(OUTCOMES)
+                self._filled = self._failures = self._failure_streak = 0
+                self._current_backoff_s = self.backoff_s
+                self.next_probe_at = None
+                self._transition("closed", now)
+
+    def _open(self, backoff_s, now):
+        now = time.perf_counter() if now is None else now
+        self._current_backoff_s = backoff_s
+        self.next_probe_at = now + backoff_s
+        self._success_streak = 0
+        self._transition("open", now)
+
+    def _transition(self, state, now):
+        now = time.perf_counter() if now is None else now
+        duration_s = now - self._state_since
+        self.state = state
+        self._state_since = now
+        if self.on_event is not None:
+            self.on_event(HealthEvent(state, self.sensor, now, duration_s, self.rates()))
+
+    def rates(self):
+        """Fractie per uitkomst over het huidige venster (dict)."""
+        filled = self._filled
+        return {name: (count / filled if filled else 0.0) for name, count in zip(OUTCOMES, self._counts)}
+
+    def failure_rate(self):
+        return self._failures / self._filled if self._filled else 0.0
+
+    def stats(self):
+        return {
+            "sensor": self.sensor,
+            "state": self.state,
+            "failure_rate": self.failure_rate(),
+            "rates": self.rates(),
+            "totals": dict(zip(OUTCOMES, self.totals)),
+            "skipped": self.skipped_count,
+            "backoff_s": self._current_backoff_s,
+        }
+
+
+class HealthReporter:
+    """
+    Verwerkt HealthEvents: een logregel, een teller/duur in Instrumentation (stap 'health_<toestand>',
+    met de duur van de vorige toestand) en optioneel een MIDI CC per sensor: 127 gezond, 64 probe, 0 defect.
+
+        reporter = HealthReporter(metrics=metrics, sender=midi_sender, controller=90)
+        health = SensorHealth("links", on_event=reporter)
+    """
+
+    CC_VALUES = {"closed": 127, "half_open": 64, "open": 0}
+
+    def __init__(self, log=log.warning, metrics=None, sender=None, channel=0, controller=None):
+        """
+        Args:
+            log (callable, optional): Krijgt de logregel (standaard een waarschuwing via jj_log); None om
+                                      niet te loggen.
+            metrics (Instrumentation, optional): Legt per gebeurtenis de duur van de vorige toestand vast.
+            sender (MidiSender, optional): Verstuurt de CC.
+            channel (int, optional): MIDI-kanaal voor de CC.
+            controller (int, optional): Controllernummer; bij een sensorindex wordt die erbij opgeteld.
+        """
+        self.log = log
+        self.metrics = metrics
+        self.sender = sender
+        self.channel = channel
+        self.controller = controller
+        self.events = collections.deque(maxlen=64)  # Laatste gebeurtenissen, voor diagnose
+
+    def __call__(self, event):
+        self.events.append(event)
+        if self.log is not None:
+            rates = ", ".join(f"{name} {rate:.0%}" for name, rate in event.rates.items() if name != "ok" and rate)
+            self.log(f"Sensor {event.sensor}: {event.kind} na {event.state_duration_s:.1f}s"
+                     + (f" ({rates})" if rates else ""))
+        if self.metrics is not None:
+            self.metrics.stage(f"health_{event.kind}").record(int(event.state_duration_s * 1e9))
+        if self.sender is not None and self.controller is not None:
+            offset = event.sensor if isinstance(event.sensor, int) else 0
+            self.sender.send_control_change(self.channel, min(self.controller + offset, 127),
+                                            self.CC_VALUES[event.kind])
+
+
+class HealthMonitoredSensor:
+    """
+    Zet een SensorHealth achter een UltrasonicSensor. get_distance() werkt als altijd, maar slaat
+    de meting direct over (None) zolang de breaker open staat, en print niet bij elke timeout:
+    fouten worden geteld en alleen toestandswisselingen worden gemeld (via on_event).
+    Overige attributen (unit, close, ...) worden doorgegeven aan de onderliggende sensor.
+
+    Een kale UltrasonicSensor wordt via de ruwe pulsduur gemeten, zodat een echo-timeout en een
+    andere fout uit elkaar te houden zijn. Elk ander object met get_distance() (bijv. een
+    RecordingSensor of FilteredSensor) werkt ook; daar telt None als 'timeout' (geen meting).
+    """
+
+    def __init__(self, sensor, health=None):
+        self.sensor = sensor
+        if health is None:
+            name = f"Trig={sensor.trig_pin}" if hasattr(sensor, "trig_pin") else None
+            health = SensorHealth(name, max_distance_cm=getattr(sensor, "max_range_cm", None),
+                                  on_event=HealthReporter())
+        self.health = health
+        self.unit = getattr(sensor, "unit", "cm")
+        if isinstance(sensor, us.UltrasonicSensor):
+            self._measure = lambda: sensor.pulse_to_distance(sensor._get_raw_pulse_duration())
+        else:
+            self._measure = sensor.get_distance
+
+    def get_distance(self):
+        health = self.health
+        if not health.allow():
+            return None
+        try:
+            distance = self._measure()
+        except us.EchoTimeout:
+            health.record(TIMEOUT)
+            return None
+        except Exception:
+            health.record(ERROR)
+            return None
+        if distance is None:
+            health.record(TIMEOUT)
+            return None
+        outcome = health.classify(distance, self.unit)
+        health.record(outcome)
+        return distance if outcome == OK else None
+
+    def __getattr__(self, name):
+        return getattr(self.sensor, name)
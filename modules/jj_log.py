@@ -0,0 +1,283 @@
+import atexit
+import collections
+import json
+import sys
+import threading
+import time
+
+# Logging zonder synchrone stdout-I/O in de meetlus. Een logregel wordt in de aanroepende thread
+# alleen in een ringbuffer gezet; een achtergrondthread formatteert en schrijft. Herhaalde meldingen
+# (zelfde sleutel) worden binnen een venster samengevoegd:
+#
+#     12:00:01.204 WARNING ultrasonic: Echo timeout: Geen echo ontvangen (sensor te ver of geen object).
+#     12:00:06.210 WARNING ultrasonic: Echo timeout: Geen echo ontvangen (sensor te ver of geen object). (×42 in de laatste 5 s)
+#
+# Gebruik in een module:
+#
+#     from modules import jj_log
+#     log = jj_log.get_logger("ultrasonic")
+#     log.warning(f"Sensor Error: {e}", key="sensor_error")
+#
+# en kies eenmalig (bijv. in main.py) niveau en formaat met jj_log.configure(level="debug", format="structured").
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+LEVEL_NAMES = {value: name.upper() for name, value in LEVELS.items()}
+FORMATS = ("human", "structured")
+
+# Een logregel; count > 1 is een samenvatting van count meldingen binnen window_s seconden
+LogRecord = collections.namedtuple("LogRecord", ["timestamp", "level", "source", "key", "message", "fields",
+                                                 "count", "window_s"])
+
+
+def _level_value(level):
+    if isinstance(level, int):
+        return level
+    try:
+        return LEVELS[level.lower()]
+    except KeyError:
+        raise ValueError(f"Ongeldig logniveau '{level}'. Kies uit {tuple(LEVELS)}.") from None
+
+
+class AsyncLogSink:
+    """
+    Schrijft logregels vanuit een achtergrondthread naar een stream.
+
+    - emit() zet de regel alleen in een deque met vaste capaciteit (ringbuffer); is die vol, dan
+      valt de oudste regel weg en wordt dat later gemeld. Er wordt niet gewacht op I/O of een lock.
+    - Per sleutel wordt de eerste melding direct geschreven; herhalingen binnen dedupe_window_s
+      worden geteld en aan het eind van het venster als één samenvatting geschreven.
+    - format 'human' geeft leesbare regels, 'structured' compacte JSON (één object per regel).
+
+    Met threaded=False wordt direct in de aanroepende thread geschreven (zelfde deduplicatie).
+    """
+
+    def __init__(self, stream=None, format="human", level="info", capacity=1024, dedupe_window_s=5.0,
+                 flush_interval_s=0.1, threaded=True):
+        """
+        Args:
+            stream (optional): Bestandsachtig object; standaard sys.stdout (opgezocht bij het schrijven).
+            format (str, optional): 'human' of 'structured'.
+            level (str, optional): Lager niveau wordt direct bij emit() weggegooid.
+            capacity (int, optional): Grootte van de ringbuffer.
+            dedupe_window_s (float, optional): Venster voor het samenvoegen van herhaalde meldingen; 0 = uit.
+            flush_interval_s (float, optional): Hoe vaak de schrijfthread de buffer leegt.
+            threaded (bool, optional): Schrijf vanuit een achtergrondthread.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Ongeldig logformaat '{format}'. Kies uit {FORMATS}.")
+        self.stream = stream
+        self.format = format
+        self.level = _level_value(level)
+        self.dedupe_window_s = dedupe_window_s
+        self.flush_interval_s = flush_interval_s
+        self.threaded = threaded
+        self._buffer = collections.deque(maxlen=capacity)
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self._windows = {}  # sleutel -> [begin van het venster, aantal onderdrukt, laatste record]
+        self.emitted_count = 0
+        self.handled_count = 0
+        self.written_count = 0
+        self.suppressed_count = 0
+        self._reported_dropped = 0
+
+    def enabled(self, level):
+        return _level_value(level) >= self.level
+
+    def emit(self, level, source, message, key=None, fields=None):
+        """Zet een logregel in de buffer (niveau als getal, zie LEVELS)."""
+        if level < self.level or self._closed:
+            return
+        self._buffer.append((time.time(), level, source, key or message, message, fields))
+        self.emitted_count += 1
+        if not self.threaded:
+            self.flush()
+        elif self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._write_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jj-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+
+    @property
+    def dropped_count(self):
+        """Aantal regels dat uit de volle ringbuffer is gevallen."""
+        return max(0, self.emitted_count - self.handled_count - len(self._buffer))
+
+    def flush(self):
+        """Verwerkt alle gebufferde regels en schrijft verlopen samenvattingen (mag uit elke thread)."""
+        with self._write_lock:
+            lines = []
+            buffer = self._buffer
+            while buffer:
+                try:
+                    timestamp, level, source, key, message, fields = buffer.popleft()
+                except IndexError:
+                    break
+                self.handled_count += 1
+                self._handle(LogRecord(timestamp, level, source, key, message, fields, 1, 0.0), lines)
+            self._expire(time.time(), lines)
+            dropped = self.dropped_count
+            if dropped > self._reported_dropped:
+                lines.append(self._format(LogRecord(time.time(), LEVELS["warning"], "log", "dropped",
+                                                    f"{dropped - self._reported_dropped} logregel(s) verloren "
+                                                    f"(buffer vol)", None, 1, 0.0)))
+                self._reported_dropped = dropped
+            if lines:
+                self._write(lines)
+
+    def _handle(self, record, lines):
+        window_s = self.dedupe_window_s
+        if window_s <= 0:
+            lines.append(self._format(record))
+            return
+        window = self._windows.get(record.key)
+        if window is not None and record.timestamp - window[0] < window_s:
+            window[1] += 1
+            window[2] = record
+            self.suppressed_count += 1
+            return
+        if window is not None and window[1]:
+            lines.append(self._format(self._summary(window)))
+        self._windows[record.key] = [record.timestamp, 0, record]
+        lines.append(self._format(record))
+
+    def _expire(self, now, lines):
+        """Schrijft de samenvatting van vensters die voorbij zijn en ruimt stille sleutels op."""
+        window_s = self.dedupe_window_s
+        for key, window in list(self._windows.items()):
+            if now - window[0] >= window_s:
+                if window[1]:
+                    lines.append(self._format(self._summary(window)))
+                del self._windows[key]
+
+    def _summary(self, window):
+        # Het aantal in de samenvatting is het totaal binnen het venster, inclusief de eerste melding
+        return window[2]._replace(count=window[1] + 1, window_s=self.dedupe_window_s)
+
+    def _format(self, record):
+        if self.format == "structured":
+            entry = {"ts": round(record.timestamp, 3), "lvl": LEVEL_NAMES.get(record.level, record.level),
+                     "src": record.source, "msg": record.message}
+            if record.key != record.message:
+                entry["key"] = record.key
+            if record.count > 1 or record.window_s:
+                entry["n"] = record.count
+                entry["window_s"] = record.window_s
+            if record.fields:
+                entry.update(record.fields)
+            return json.dumps(entry, separators=(",", ":"), default=str)
+        clock = time.strftime("%H:%M:%S", time.localtime(record.timestamp))
+        millis = int(record.timestamp * 1000) % 1000
+        line = f"{clock}.{millis:03d} {LEVEL_NAMES.get(record.level, record.level)} {record.source}: {record.message}"
+        if record.fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in record.fields.items())
+        if record.window_s:
+            line += f" (×{record.count} in de laatste {record.window_s:g} s)"
+        return line
+
+    def _write(self, lines):
+        stream = self.stream if self.stream is not None else sys.stdout
+        try:
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+            self.written_count += len(lines)
+        except (OSError, ValueError):
+            pass  # Gesloten of weggevallen stream: logging mag de meetlus niet laten vastlopen
+
+    def close(self):
+        """Stopt de schrijfthread en schrijft alles wat nog in de buffer of in een venster staat."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        self.flush()
+        lines = []
+        self._expire(float("inf"), lines)
+        if lines:
+            self._write(lines)
+
+    def stats(self):
+        return {
+            "emitted": self.emitted_count,
+            "written": self.written_count,
+            "suppressed": self.suppressed_count,
+            "dropped": self.dropped_count,
+            "buffered": len(self._buffer),
+        }
+
+
+class Logger:
+    """Logger voor één bron (bijv. 'midi'); schrijft naar de sink van configure()."""
+
+    def __init__(self, source):
+        self.source = source
+
+    def _log(self, level, message, key, fields):
+        sink = _sink
+        if level >= sink.level:
+            sink.emit(level, self.source, message, key, fields or None)
+
+    def debug(self, message, key=None, **fields):
+        self._log(10, message, key, fields)
+
+    def info(self, message, key=None, **fields):
+        self._log(20, message, key, fields)
+
+    def warning(self, message, key=None, **fields):
+        self._log(30, message, key, fields)
+
+    def error(self, message, key=None, **fields):
+        self._log(40, message, key, fields)
+
+    def enabled(self, level):
+        """Handig om een dure logregel alleen op te bouwen als hij ook geschreven wordt."""
+        return _sink.enabled(level)
+
+
+_sink = AsyncLogSink()
+_loggers = {}
+
+
+def get_logger(source):
+    """Geeft de (gedeelde) Logger voor een bron."""
+    logger = _loggers.get(source)
+    if logger is None:
+        logger = _loggers[source] = Logger(source)
+    return logger
+
+
+def configure(level="info", format="human", stream=None, **sink_options):
+    """
+    Vervangt de standaard sink (de oude wordt eerst leeggeschreven en gesloten).
+    Overige argumenten gaan naar AsyncLogSink. Geeft de nieuwe sink terug.
+    """
+    global _sink
+    old = _sink
+    _sink = AsyncLogSink(stream=stream, format=format, level=level, **sink_options)
+    old.close()
+    return _sink
+
+
+def get_sink():
+    return _sink
+
+
+def flush():
+    """Schrijft alles wat nog in de buffer staat (bijv. vóór een input()-prompt)."""
+    _sink.flush()
+
+
+atexit.register(lambda: _sink.close())
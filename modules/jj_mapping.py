@@ -0,0 +1,231 @@
+import math
+from array import array
+
+# Toonladders als intervallen (halve tonen) vanaf de grondtoon
+SCALES = {
+    "chromatic": (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11),
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+    "pentatonic": (0, 2, 4, 7, 9),
+    "minor_pentatonic": (0, 3, 5, 7, 10),
+}
+
+CURVES = ("linear", "exponential", "logarithmic")
+
+# Standaard uitvoerbereik per doel
+TARGET_RANGES = {
+    "note": (67, 127),
+    "cc": (0, 127),
+    "pitch_bend": (-8192, 8191),
+}
+
+
+class DistanceMapper:
+    """
+    Zet afstanden (of echo-pulsduren) om naar een MIDI-waarde via een vooraf berekende tabel.
+
+    De tabel bevat per millimeter (map_distance) of per microseconde echotijd (map_pulse) direct
+    de uitvoerwaarde, inclusief curve en toonladder. Per sample is dat één tabelopzoeking in
+    plaats van float-normalisatie en losse puls -> cm -> MIDI omrekeningen. De tabellen worden
+    pas (opnieuw) opgebouwd bij het eerste gebruik na een wijziging van de parameters.
+
+    Het bereik wordt op de exacte afstand gecontroleerd (zoals distance_to_midi_value), de waarde
+    is die van de dichtstbijzijnde hele millimeter. Vlak bij de grens tussen twee waarden kan die
+    één stap afwijken van een exacte berekening (bijv. 399.99 cm geeft 127, exact 126).
+    """
+
+    _PARAMETERS = ("min_distance_cm", "max_distance_cm", "out_min", "out_max", "curve",
+                   "curve_amount", "invert", "scale", "root", "target", "speed_of_sound_cm_per_s")
+
+    def __init__(self, min_distance_cm=2, max_distance_cm=400, target="note", out_min=None,
+                 out_max=None, curve="linear", curve_amount=4.0, invert=False, scale=None,
+                 root=60, hysteresis_mm=0, speed_of_sound_cm_per_s=34320):
+        """
+        Args:
+            min_distance_cm (float, optional): Kleinste geldige afstand. Standaard 2 cm.
+            max_distance_cm (float, optional): Grootste geldige afstand. Standaard 400 cm.
+            target (str, optional): 'note', 'cc' of 'pitch_bend'. Bepaalt het standaard uitvoerbereik.
+            out_min (int, optional): Uitvoerwaarde bij min_distance_cm (of bij max als invert=True).
+            out_max (int, optional): Uitvoerwaarde bij max_distance_cm.
+            curve (str, optional): 'linear', 'exponential' of 'logarithmic'.
+            curve_amount (float, optional): Sterkte van de exponentiële/logaritmische curve.
+            invert (bool, optional): Dichterbij geeft een hogere waarde.
+            scale (str, optional): Toonladder om noten op te laten vallen (zie SCALES); alleen voor 'note'.
+            root (int, optional): Grondtoon van de toonladder (MIDI-nootnummer). Standaard 60 (C).
+            hysteresis_mm (int, optional): Een nieuwe waarde wordt pas gekozen als de afstand zoveel
+                                           millimeter binnen het gebied van die waarde ligt.
+            speed_of_sound_cm_per_s (float, optional): Voor de tabel per microseconde echotijd.
+        """
+        if target not in TARGET_RANGES:
+            raise ValueError(f"Ongeldig doel '{target}'. Kies uit {tuple(TARGET_RANGES)}.")
+        default_min, default_max = TARGET_RANGES[target]
+        self.__dict__["_dirty"] = True
+        self.min_distance_cm = min_distance_cm
+        self.max_distance_cm = max_distance_cm
+        self.target = target
+        self.out_min = default_min if out_min is None else out_min
+        self.out_max = default_max if out_max is None else out_max
+        self.curve = curve
+        self.curve_amount = curve_amount
+        self.invert = invert
+        self.scale = scale
+        self.root = root
+        self.hysteresis_mm = hysteresis_mm
+        self.speed_of_sound_cm_per_s = speed_of_sound_cm_per_s
+
+        # De tabellen beginnen bij 0 mm / 0 µs (het stuk onder het minimum wordt nooit gelezen), zodat
+        # de index direct de afgeronde afstand of pulsduur is. Per tabel één tuple, zodat het meetpad
+        # met één attribuut toe kan en wisselen atomair is:
+        #   _mm: (kleinste cm, grootste cm, tabel, hysterese in mm) of None als de tabellen ongeldig zijn
+        #   _us: (kortste puls in s, langste puls in s, tabel)
+        self._mm_table = None
+        self._mm = None
+        self._us = None
+        # Hysteresetoestand [laatste index, laatste waarde], apart per tabel (de indices van de
+        # mm- en µs-tabel zijn niet vergelijkbaar); lijsten zodat het bijwerken niet langs __setattr__ hoeft
+        self._held_mm = [None, None]
+        self._held_us = [None, None]
+
+    def __setattr__(self, name, value):
+        # Een gewijzigde parameter maakt de tabellen ongeldig; ze worden lui opnieuw opgebouwd
+        if name in self._PARAMETERS:
+            self.__dict__["_dirty"] = True
+            self.__dict__["_mm"] = None
+        elif name == "hysteresis_mm" and self.__dict__.get("_mm") is not None:
+            self.__dict__["_mm"] = self._mm[:3] + (value,)
+        object.__setattr__(self, name, value)
+
+    def _validate(self):
+        if self.curve not in CURVES:
+            raise ValueError(f"Ongeldige curve '{self.curve}'. Kies uit {CURVES}.")
+        if self.scale is not None and self.scale not in SCALES:
+            raise ValueError(f"Ongeldige toonladder '{self.scale}'. Kies uit {tuple(SCALES)}.")
+        if not 0 <= self.min_distance_cm < self.max_distance_cm:
+            raise ValueError("min_distance_cm moet kleiner zijn dan max_distance_cm.")
+
+    def _shape(self, t):
+        """Past de curve toe op een genormaliseerde positie t (0..1)."""
+        k = self.curve_amount
+        if self.curve == "exponential":
+            return (math.exp(k * t) - 1.0) / (math.exp(k) - 1.0)
+        if self.curve == "logarithmic":
+            return math.log1p(k * t) / math.log1p(k)
+        return t
+
+    def _snap_table(self):
+        """Tabel nootnummer (0-127) -> dichtstbijzijnde noot in de toonladder."""
+        intervals = SCALES[self.scale]
+        in_scale = [n for n in range(128) if (n - self.root) % 12 in intervals]
+        return [min(in_scale, key=lambda s: (abs(s - n), s)) for n in range(128)]
+
+    def _value_for_distance(self, distance_cm, snap):
+        t = (distance_cm - self.min_distance_cm) / (self.max_distance_cm - self.min_distance_cm)
+        if self.invert:
+            t = 1.0 - t
+        value = int(self.out_min + self._shape(t) * (self.out_max - self.out_min))
+        if self.target == "pitch_bend":
+            return max(-8192, min(8191, value))
+        value = max(0, min(127, value))
+        return snap[value] if snap else value
+
+    def _rebuild(self):
+        self._validate()
+        snap = self._snap_table() if self.scale and self.target == "note" else None
+        low, high = self.min_distance_cm, self.max_distance_cm
+        # Index = int(afstand * 10 + 0.5); binnen [low, high] valt die altijd tussen deze grenzen
+        first_mm = int(low * 10 + 0.5)
+        last_mm = int(high * 10 + 0.5)
+        self._mm_table = array("h", (self._value_for_distance(min(max(mm / 10.0, low), high), snap)
+                                     for mm in range(first_mm, last_mm + 1)))
+        table = array("h", [self._mm_table[0]]) * first_mm + self._mm_table
+
+        self._us = self._build_us_table(self.speed_of_sound_cm_per_s, snap)
+        self._snap = snap
+        self._held_mm = [None, None]
+        self._held_us = [None, None]
+        self.__dict__["_mm"] = (low, high, table, self.hysteresis_mm)
+        self.__dict__["_dirty"] = False
+
+    def _build_us_table(self, speed_cm_per_s, snap):
+        """Tabel per microseconde echotijd: afstand = t * c / 2."""
+        us_to_cm = speed_cm_per_s / 2e6
+        low, high = self.min_distance_cm, self.max_distance_cm
+        min_pulse_s, max_pulse_s = 2.0 * low / speed_cm_per_s, 2.0 * high / speed_cm_per_s
+        first_us = int(min_pulse_s * 1e6 + 0.5)
+        last_us = int(max_pulse_s * 1e6 + 0.5)
+        values = array("h", (self._value_for_distance(min(max(us * us_to_cm, low), high), snap)
+                             for us in range(first_us, last_us + 1)))
+        return min_pulse_s, max_pulse_s, array("h", [values[0]]) * first_us + values
+
+    def _hold(self, held, table, index, step_per_mm):
+        """Past de hysterese toe: blijf op de vorige waarde tot de nieuwe ver genoeg in zijn gebied ligt."""
+        value = table[index]
+        if held[1] is not None and value != held[1]:
+            offset = int(self.hysteresis_mm * step_per_mm)
+            probe = index - offset if index > held[0] else index + offset
+            probe = 0 if probe < 0 else len(table) - 1 if probe >= len(table) else probe
+            if table[probe] == held[1]:
+                return held[1]
+        held[0] = index
+        held[1] = value
+        return value
+
+    def map_distance(self, distance_cm):
+        """
+        Zet een afstand in cm om naar de uitvoerwaarde.
+
+        Returns:
+            int: De uitvoerwaarde, of None als de afstand buiten bereik is.
+        """
+        mm = self._mm
+        if mm is None:
+            self._rebuild()
+            mm = self._mm
+        low, high, table, hysteresis_mm = mm
+        # Bereik op de exacte afstand: na het afronden zouden bijv. 1.96 en 400.04 cm nog binnen vallen
+        if low <= distance_cm <= high:
+            if hysteresis_mm:
+                return self._hold(self._held_mm, table, int(distance_cm * 10 + 0.5), 1.0)
+            return table[int(distance_cm * 10 + 0.5)]
+        return None
+
+    def map_pulse(self, pulse_s):
+        """
+        Zet een echo-pulsduur (s) direct om naar de uitvoerwaarde, zonder tussenstap via cm.
+
+        Returns:
+            int: De uitvoerwaarde, of None als de puls buiten bereik is.
+        """
+        if self._dirty:
+            self._rebuild()
+        min_pulse_s, max_pulse_s, table = self._us
+        if min_pulse_s <= pulse_s <= max_pulse_s:
+            if self.hysteresis_mm:
+                # Eén millimeter komt overeen met ongeveer 5.8 microseconden echotijd (heen en terug)
+                return self._hold(self._held_us, table, int(pulse_s * 1e6 + 0.5),
+                                  2e5 / self.speed_of_sound_cm_per_s)
+            return table[int(pulse_s * 1e6 + 0.5)]
+        return None
+
+    def set_speed_of_sound(self, speed_cm_per_s):
+        """
+        Past de geluidssnelheid voor map_pulse() aan. Als de tabellen al bestaan wordt de nieuwe
+        tabel per microseconde hier (in de thread van de aanroeper) gebouwd en in één keer gewisseld,
+        zodat het meetpad niet op de herberekening wacht.
+        Te gebruiken als luisteraar: compensator.add_listener(mapper.set_speed_of_sound).
+        """
+        if speed_cm_per_s == self.speed_of_sound_cm_per_s:
+            return
+        if self._dirty:
+            self.speed_of_sound_cm_per_s = speed_cm_per_s
+            return
+        us_table = self._build_us_table(speed_cm_per_s, self._snap)
+        self.__dict__["speed_of_sound_cm_per_s"] = speed_cm_per_s  # zonder de tabellen ongeldig te maken
+        self._us = us_table
+        self._held_us = [None, None]  # De indices van de oude tabel gelden niet meer
+
+    def table(self):
+        """Geeft de (eventueel opnieuw opgebouwde) tabel per millimeter terug, voor inspectie."""
+        if self._dirty:
+            self._rebuild()
+        return self._mm_table
@@ -0,0 +1,147 @@
+import json
+import time
+from array import array
+
+class Histogram:
+    """
+    HDR-achtig histogram van duren in nanoseconden, in een vooraf gealloceerde array.
+
+    Waarden onder 128 ns krijgen elk een eigen bucket; daarboven heeft elke macht van twee
+    64 sub-buckets, wat een relatieve fout van hooguit ~1.6% geeft. record() alloceert niets
+    en neemt geen lock: gebruik per histogram één schrijvende thread (één per meetstap).
+    """
+
+    SUB_BUCKETS = 64
+    LINEAR_LIMIT = 2 * SUB_BUCKETS  # 128
+
+    def __init__(self, max_shift=36):
+        """
+        Args:
+            max_shift (int, optional): Bepaalt de grootste meetbare waarde (~2^(max_shift + 7) ns,
+                                       standaard ruim 2 uur). Grotere waarden komen in de laatste bucket.
+        """
+        self.max_shift = max_shift
+        self.counts = array("Q", bytes(8 * (self.LINEAR_LIMIT + max_shift * self.SUB_BUCKETS)))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.min = None
+
+    def _index(self, value):
+        if value < self.LINEAR_LIMIT:
+            return value if value > 0 else 0
+        shift = value.bit_length() - 7
+        if shift > self.max_shift:
+            return len(self.counts) - 1
+        return self.LINEAR_LIMIT + (shift - 1) * self.SUB_BUCKETS + ((value >> shift) - self.SUB_BUCKETS)
+
+    def _value_at(self, index):
+        """Geeft de bovengrens van een bucket (in ns)."""
+        if index < self.LINEAR_LIMIT:
+            return index
+        shift, sub = divmod(index - self.LINEAR_LIMIT, self.SUB_BUCKETS)
+        shift += 1
+        return ((sub + self.SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, value_ns):
+        """Legt één duur (int, nanoseconden) vast."""
+        self.counts[self._index(value_ns)] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+
+    def percentile(self, p):
+        """Geeft het p-de percentiel (0-100) in nanoseconden, of None als er niets is vastgelegd."""
+        if not self.count:
+            return None
+        target = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            if bucket:
+                seen += bucket
+                if seen >= target:
+                    return min(self._value_at(index), self.max)
+        return self.max
+
+    def reset(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.min = None
+
+    def snapshot(self):
+        """Geeft count, mean, p50, p99 en max in microseconden."""
+        if not self.count:
+            return {"count": 0, "mean_us": None, "p50_us": None, "p99_us": None, "max_us": None}
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1e3,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class Instrumentation:
+    """
+    Verzameling histogrammen per meetstap, bijv. 'trigger_to_echo', 'echo_width', 'mapping',
+    'send' en 'inter_message'.
+
+    Geef een Instrumentation-object mee aan UltrasonicSensor, MidiSender of SensorMidiPipeline
+    (parameter metrics) om te meten. Zonder metrics (None) kost het per meting alleen een
+    is-None-controle.
+    """
+
+    STAGES = ("trigger_to_echo", "echo_width", "mapping", "send", "inter_message", "latency")
+
+    def __init__(self, stages=STAGES):
+        self.histograms = {name: Histogram() for name in stages}
+        self.started_at = time.time()
+
+    def __getitem__(self, name):
+        return self.histograms[name]
+
+    def stage(self, name):
+        """Geeft het histogram van een stap; maakt het aan als het nog niet bestaat."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def record(self, name, value_ns):
+        self.histograms[name].record(value_ns)
+
+    def snapshot(self):
+        """Geeft per stap de samenvatting (count/mean/p50/p99/max in microseconden)."""
+        return {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+
+    def to_prometheus(self, prefix="jj"):
+        """
+        Geeft de histogrammen als Prometheus-tekst (summary met quantiles, in seconden).
+        """
+        lines = []
+        for name, histogram in self.histograms.items():
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            if histogram.count:
+                for quantile, p in (("0.5", 50), ("0.99", 99), ("1", 100)):
+                    value = histogram.max if p == 100 else histogram.percentile(p)
+                    lines.append(f'{metric}{{quantile="{quantile}"}} {value / 1e9:.9f}')
+            lines.append(f"{metric}_sum {histogram.total / 1e9:.9f}")
+            lines.append(f"{metric}_count {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        """Schrijft een snapshot als JSON-bestand."""
+        with open(path, "w") as f:
+            json.dump({"started_at": self.started_at, "written_at": time.time(),
+                       "stages": self.snapshot()}, f, indent=2)
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
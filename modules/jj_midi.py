@@ -1,13 +1,159 @@
-import rtmidi
+import os
+import sys
+import threading
 import time
 
+from modules import jj_log
+
+log = jj_log.get_logger("midi")
+
+# python-rtmidi wordt pas bij het eerste gebruik geladen (zie load_rtmidi()), zodat deze module snel
+# en ook zonder rtmidi (bijv. op een build-machine) te importeren is. Tot dan is MidiSystemError
+# een RuntimeError; daarna rtmidi.SystemError.
+rtmidi = None
+MidiSystemError = RuntimeError
+_rtmidi_loaded = False
+
+# Keuze van de standaarduitvoer: 'auto' (rtmidi als dat te laden is, anders gesimuleerd),
+# 'rtmidi' of 'simulated'. In te stellen met de omgevingsvariabele JJ_MIDI_BACKEND.
+BACKEND_ENV = "JJ_MIDI_BACKEND"
+
+
+def load_rtmidi():
+    """Laadt python-rtmidi (één keer) en geeft de module terug, of None als die niet geïnstalleerd is."""
+    global rtmidi, MidiSystemError, _rtmidi_loaded
+    if not _rtmidi_loaded:
+        try:
+            import rtmidi as module
+        except ImportError:
+            module = None
+        if module is not None:
+            rtmidi = module
+            MidiSystemError = module.SystemError
+        _rtmidi_loaded = True
+    return rtmidi
+
+
+def create_midiout(kind=None):
+    """
+    Maakt de standaard MIDI-uitvoer aan: een rtmidi.MidiOut, of een SimulatedMidiOut als
+    python-rtmidi ontbreekt (bij 'auto') of als daarom gevraagd wordt.
+
+    Args:
+        kind (str, optional): 'auto', 'rtmidi' of 'simulated'. Standaard de waarde van
+                              JJ_MIDI_BACKEND, of 'auto'.
+    """
+    kind = (kind or os.environ.get(BACKEND_ENV, "auto")).lower()
+    if kind == "simulated":
+        return SimulatedMidiOut()
+    if kind not in ("auto", "rtmidi"):
+        raise ValueError(f"Ongeldige MIDI-backend '{kind}'. Kies 'auto', 'rtmidi' of 'simulated'.")
+    module = load_rtmidi()
+    if module is not None:
+        return module.MidiOut()
+    if kind == "rtmidi":
+        raise RuntimeError("python-rtmidi is niet geïnstalleerd.")
+    log.warning("python-rtmidi niet gevonden; de gesimuleerde MIDI-uitvoer wordt gebruikt.")
+    return SimulatedMidiOut()
+
+
+def _port_list(ports):
+    """Poorten als '[0]: naam, [1]: naam' voor in een logregel."""
+    return ", ".join(f"[{i}]: {name}" for i, name in enumerate(ports))
+
+
+class SimulatedMidiOut:
+    """
+    Nep-versie van rtmidi.MidiOut voor gebruik zonder MIDI-hardware.
+    Verzonden berichten worden bewaard in self.messages (tenzij keep_messages=False)
+    en geteld in self.sent_count. Met send_delay_s kun je een trage poort nabootsen.
+
+    Geef je een SimulatedMidiSystem mee als ports, dan zie je poorten van dat systeem
+    verschijnen en verdwijnen; verzenden naar een verdwenen poort geeft dan een MidiSystemError.
+    """
+
+    def __init__(self, ports=("Simulated MIDI Out",), send_delay_s=0.0, keep_messages=True):
+        self._ports = ports.ports if isinstance(ports, SimulatedMidiSystem) else list(ports)
+        self._open_index = None
+        self._open_name = None
+        self.send_delay_s = send_delay_s
+        self.keep_messages = keep_messages
+        self.messages = []
+        self.sent_count = 0
+
+    def get_ports(self):
+        return list(self._ports)
+
+    def get_port_count(self):
+        return len(self._ports)
+
+    def open_port(self, port=0, name=None):
+        if not 0 <= port < len(self._ports):
+            raise MidiSystemError(f"Ongeldige poort {port}")
+        self._open_index = port
+        self._open_name = self._ports[port]
+
+    def is_port_open(self):
+        return self._open_index is not None
+
+    def close_port(self):
+        self._open_index = None
+        self._open_name = None
+
+    def send_message(self, message):
+        if self._open_index is None:
+            raise MidiSystemError("Poort is niet geopend")
+        if self._open_name not in self._ports:
+            raise MidiSystemError(f"Poort '{self._open_name}' is verdwenen")
+        if self.send_delay_s:
+            time.sleep(self.send_delay_s)
+        if self.keep_messages:
+            self.messages.append(list(message))
+        self.sent_count += 1
+
+
+class SimulatedMidiSystem:
+    """
+    Nep-MIDI-systeem om hot-plug te testen: een gedeelde poortenlijst waar poorten aan
+    toegevoegd en uit verwijderd kunnen worden. MidiOut() geeft een SimulatedMidiOut die
+    deze lijst ziet, zodat het object als midiout_factory van een MidiPortRegistry werkt.
+    """
+
+    def __init__(self, ports=(), send_delay_s=0.0, keep_messages=True):
+        self.ports = list(ports)
+        self.send_delay_s = send_delay_s
+        self.keep_messages = keep_messages
+        self.outputs = []  # Alle aangemaakte SimulatedMidiOut-objecten, om berichten te controleren
+
+    def add_port(self, name):
+        if name not in self.ports:
+            self.ports.append(name)
+
+    def remove_port(self, name):
+        if name in self.ports:
+            self.ports.remove(name)
+
+    def MidiOut(self):
+        midiout = SimulatedMidiOut(self, send_delay_s=self.send_delay_s, keep_messages=self.keep_messages)
+        self.outputs.append(midiout)
+        return midiout
+
+    def messages(self):
+        """Alle berichten die via dit systeem zijn verzonden, in volgorde van de uitvoerobjecten."""
+        return [message for midiout in self.outputs for message in midiout.messages]
+
+
 class MidiSender:
     """
     Klasse voor het verzenden van MIDI-berichten via python-rtmidi.
     Bundelt functionaliteit voor het openen/sluiten van poorten en het verzenden van diverse MIDI-berichten.
     """
 
-    def __init__(self, port_name=None, port_index=None):
+    # Maximaal aantal Note On/Off-berichten dat wordt bewaard terwijl de poort op de achtergrond opent
+    OPENING_QUEUE_SIZE = 128
+
+    def __init__(self, port_name=None, port_index=None, midiout=None, metrics=None, interactive=None,
+                 background=False):
         """
         Initialiseert de MidiSender. Probeer een MIDI-outputpoort te openen.
 
@@ -16,15 +162,71 @@ class MidiSender:
                                        Bijv. "UM-ONE", "IAC Driver Bus 1", "Midi Gadget".
             port_index (int, optional): De numerieke index van de MIDI-poort om te openen.
                                         Heeft voorrang als zowel port_name als port_index zijn opgegeven.
+            midiout (object, optional): Een al aangemaakt rtmidi.MidiOut-achtig object, bijv. een
+                                        SimulatedMidiOut. Standaard create_midiout().
+            metrics (Instrumentation, optional): Legt per bericht 'send' en 'inter_message' vast.
+            interactive (bool, optional): Vraag om een poortindex als er geen poort is opgegeven.
+                                          Standaard alleen als stdin een terminal is, zodat een
+                                          service (systemd, cron) nooit op input() blijft wachten.
+            background (bool, optional): Laad rtmidi, zoek de poort en open hem in een achtergrondthread,
+                                         zodat de constructor direct terugkeert. Note On/Off-berichten
+                                         van vóór het openen worden bewaard en daarna verstuurd (zodat
+                                         bijv. een NoteManager en het instrument het eens blijven over
+                                         welke noten klinken); andere berichten vervallen (zie wait_ready()).
         """
-        self.midiout = rtmidi.MidiOut()
+        self.midiout = None
         self.port_name = None # Bewaart de naam van de daadwerkelijk geopende poort
         self.port_index = -1  # Bewaart de index van de daadwerkelijk geopende poort
+        self.metrics = metrics
+        self._last_send_ns = None
+        self.dropped_while_opening = 0
+        self._held_while_opening = []
+        self._opening_lock = threading.Lock()
+        self._ready = threading.Event()
+        if midiout is not None and type(midiout).__module__.startswith("rtmidi"):
+            load_rtmidi()  # Zelf aangemaakte rtmidi-uitvoer: vang voortaan rtmidi.SystemError op
+
+        if background:
+            self._opening = True
+            threading.Thread(target=self._open, args=(port_name, port_index, midiout, False),
+                             name="midi-open", daemon=True).start()
+        else:
+            self._opening = False
+            self._open(port_name, port_index, midiout, interactive)
 
+    def wait_ready(self, timeout_s=None):
+        """
+        Wacht tot het openen van de poort (ook op de achtergrond) klaar is.
+
+        Returns:
+            bool: True als de poort open is.
+        """
+        self._ready.wait(timeout_s)
+        return self._is_ready()
+
+    def _open(self, port_name, port_index, midiout, interactive):
+        try:
+            self._open_port(port_name, port_index, midiout, interactive)
+        finally:
+            # Bewaarde noten onder de lock versturen: tot _opening False is, wachten nieuwe
+            # berichten hierop, zodat de volgorde behouden blijft
+            with self._opening_lock:
+                held, self._held_while_opening = self._held_while_opening, []
+                if self._is_ready():
+                    for message in held:
+                        self._send_now(message)
+                elif held:
+                    self.dropped_while_opening += len(held)
+                self._opening = False
+            self._ready.set()
+
+    def _open_port(self, port_name, port_index, midiout, interactive):
+        """Zoekt de gevraagde poort en opent hem (zie __init__)."""
+        self.midiout = midiout if midiout is not None else create_midiout()
         available_ports = self.midiout.get_ports()
 
         if not available_ports:
-            print("Geen MIDI outputpoorten gevonden. Zorg ervoor dat je MIDI-apparaat is aangesloten en herkend.")
+            log.error("Geen MIDI outputpoorten gevonden. Zorg ervoor dat je MIDI-apparaat is aangesloten en herkend.")
             self.midiout = None # Markeer als niet-geïnitialiseerd
             return
 
@@ -33,9 +235,7 @@ class MidiSender:
                 self.port_index = port_index
                 self.port_name = available_ports[port_index]
             else:
-                print(f"Waarschuwing: Ongeldige poortindex {port_index}. Beschikbare poorten:")
-                for i, name in enumerate(available_ports):
-                    print(f"  [{i}]: {name}")
+                log.warning(f"Ongeldige poortindex {port_index}. Beschikbare poorten: {_port_list(available_ports)}")
                 self.midiout = None
                 return
         elif port_name is not None:
@@ -48,16 +248,23 @@ class MidiSender:
                 self.port_index = found_index
                 self.port_name = available_ports[found_index]
             else:
-                print(f"Waarschuwing: Geen MIDI-poort gevonden met naam die '{port_name}' bevat. Beschikbare poorten:")
-                for i, name in enumerate(available_ports):
-                    print(f"  [{i}]: {name}")
+                log.warning(f"Geen MIDI-poort gevonden met naam die '{port_name}' bevat. "
+                            f"Beschikbare poorten: {_port_list(available_ports)}")
                 self.midiout = None
                 return
         else:
-            # Als niets is opgegeven, toon beschikbare poorten en vraag de gebruiker
+            # Als niets is opgegeven, toon beschikbare poorten en vraag de gebruiker.
+            # Dit is een dialoog met de gebruiker, dus direct naar stdout (na de gebufferde logregels).
+            jj_log.flush()
             print("Geen MIDI-poort gespecificeerd. Beschikbare poorten:")
             for i, name in enumerate(available_ports):
                 print(f"  [{i}]: {name}")
+            if interactive is None:
+                interactive = sys.stdin is not None and sys.stdin.isatty()
+            if not interactive:
+                log.error("Geen terminal om een poort te kiezen; geef port_name of port_index op.")
+                self.midiout = None
+                return
             try:
                 chosen_index = int(input("Voer de index in van de MIDI outputpoort die je wilt gebruiken: "))
                 if 0 <= chosen_index < len(available_ports):
@@ -74,9 +281,9 @@ class MidiSender:
 
         try:
             self.midiout.open_port(self.port_index)
-            print(f"MIDI Sender geïnitialiseerd. Verbonden met poort: {self.port_name} (Index: {self.port_index})")
-        except rtmidi.SystemError as e:
-            print(f"Fout bij het openen van MIDI-poort {self.port_name}: {e}")
+            log.info(f"MIDI Sender geïnitialiseerd. Verbonden met poort: {self.port_name} (Index: {self.port_index})")
+        except MidiSystemError as e:
+            log.error(f"Fout bij het openen van MIDI-poort {self.port_name}: {e}")
             self.midiout = None # Markeer als niet-geïnitialiseerd
 
 
@@ -93,23 +300,56 @@ class MidiSender:
         Returns:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
+        if self._opening:
+            with self._opening_lock:
+                if self._opening:
+                    return self._hold_while_opening(message)
         if not self._is_ready():
-            print("Fout: MIDI-poort is niet geopend.")
+            log.error("MIDI-poort is niet geopend.")
             return False
         
         # Basisvalidatie: Zorg ervoor dat alle bytes in het bereik 0-255 liggen
         if not all(0 <= b <= 255 for b in message):
-            print(f"Fout: Ongeldige byte(s) in MIDI-bericht: {message}. Alle bytes moeten tussen 0 en 255 liggen.")
+            log.error(f"Ongeldige byte(s) in MIDI-bericht: {message}. Alle bytes moeten tussen 0 en 255 liggen.",
+                      key="invalid_bytes")
             return False
+        return self._send_now(message)
+
+    def _hold_while_opening(self, message):
+        """
+        De poort wordt nog op de achtergrond geopend: Note On/Off bewaren (tot OPENING_QUEUE_SIZE),
+        de rest laten vervallen. Geeft True als het bericht is bewaard (mislukt het openen, dan vervalt
+        het alsnog en telt het mee in dropped_while_opening).
+        """
+        if (message and message[0] & 0xE0 == 0x80 and all(0 <= b <= 255 for b in message)
+                and len(self._held_while_opening) < self.OPENING_QUEUE_SIZE):
+            self._held_while_opening.append(list(message))
+            return True
+        self.dropped_while_opening += 1
+        return False
 
+    def _send_now(self, message):
         try:
-            self.midiout.send_message(message)
-            # print(f"Verzonden: {message} (hex: {[hex(b) for b in message]})") # Optioneel voor debugging
+            if self.metrics is None:
+                self.midiout.send_message(message)
+            else:
+                self._timed_send(message)
+            # log.debug(f"Verzonden: {message} (hex: {[hex(b) for b in message]})") # Optioneel voor debugging
             return True
-        except rtmidi.SystemError as e:
-            print(f"Fout bij het verzenden van MIDI-bericht: {e}")
+        except MidiSystemError as e:
+            log.error(f"Fout bij het verzenden van MIDI-bericht: {e}", key=f"send_error:{e}")
             return False
 
+    def _timed_send(self, message):
+        """Verstuurt een bericht en legt de verzendduur en de tijd sinds het vorige bericht vast."""
+        start_ns = time.perf_counter_ns()
+        self.midiout.send_message(message)
+        end_ns = time.perf_counter_ns()
+        self.metrics.record("send", end_ns - start_ns)
+        if self._last_send_ns is not None:
+            self.metrics.record("inter_message", start_ns - self._last_send_ns)
+        self._last_send_ns = start_ns
+
     def send_note_on(self, channel, note_number, velocity):
         """
         Verzendt een MIDI Note On-bericht.
@@ -122,7 +362,7 @@ class MidiSender:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
         if not (0 <= channel <= 15 and 0 <= note_number <= 127 and 0 <= velocity <= 127):
-            print("Fout: Ongeldige parameters voor Note On. Kanaal (0-15), Noot (0-127), Velocity (0-127).")
+            log.error("Ongeldige parameters voor Note On. Kanaal (0-15), Noot (0-127), Velocity (0-127).")
             return False
         status_byte = 0x90 | channel
         message = [status_byte, note_number, velocity]
@@ -141,7 +381,7 @@ class MidiSender:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
         if not (0 <= channel <= 15 and 0 <= note_number <= 127 and 0 <= velocity <= 127):
-            print("Fout: Ongeldige parameters voor Note Off. Kanaal (0-15), Noot (0-127), Velocity (0-127).")
+            log.error("Ongeldige parameters voor Note Off. Kanaal (0-15), Noot (0-127), Velocity (0-127).")
             return False
         status_byte = 0x80 | channel
         message = [status_byte, note_number, velocity]
@@ -159,7 +399,7 @@ class MidiSender:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
         if not (0 <= channel <= 15 and 0 <= controller_number <= 127 and 0 <= value <= 127):
-            print("Fout: Ongeldige parameters voor Control Change. Kanaal (0-15), Controller (0-127), Waarde (0-127).")
+            log.error("Ongeldige parameters voor Control Change. Kanaal (0-15), Controller (0-127), Waarde (0-127).")
             return False
         status_byte = 0xB0 | channel
         message = [status_byte, controller_number, value]
@@ -176,7 +416,7 @@ class MidiSender:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
         if not (0 <= channel <= 15 and 0 <= program_number <= 127):
-            print("Fout: Ongeldige parameters voor Program Change. Kanaal (0-15), Programma (0-127).")
+            log.error("Ongeldige parameters voor Program Change. Kanaal (0-15), Programma (0-127).")
             return False
         status_byte = 0xC0 | channel
         message = [status_byte, program_number]
@@ -194,7 +434,7 @@ class MidiSender:
             bool: True als het bericht succesvol is verzonden, anders False.
         """
         if not (0 <= channel <= 15 and -8192 <= bend_value <= 8191):
-            print("Fout: Ongeldige parameters voor Pitch Bend. Kanaal (0-15), Waarde (-8192 tot 8191).")
+            log.error("Ongeldige parameters voor Pitch Bend. Kanaal (0-15), Waarde (-8192 tot 8191).")
             return False
 
         # Converteer 14-bit waarde naar twee 7-bit bytes
@@ -213,5 +453,171 @@ class MidiSender:
         """
         if self.midiout and self.midiout.is_port_open():
             self.midiout.close_port()
-            print(f"MIDI-poort {self.port_name} gesloten.")
+            log.info(f"MIDI-poort {self.port_name} gesloten.")
         del self.midiout
+
+
+class CoalescingMidiSender:
+    """
+    Snelle verzendlaag bovenop een geopende MidiSender voor hoge CC- en pitch-bend-snelheden.
+
+    - Statusbytes worden per kanaal vooraf berekend en berichtbuffers worden hergebruikt.
+    - Kanaal, controller en nootnummer worden met één vergelijking per bericht gecontroleerd (ongeldig:
+      foutmelding en False, zoals MidiSender); waarden en velocity worden alleen begrensd (clamp).
+    - CC- en pitch-bend-waarden worden alleen verstuurd als ze veranderen (optioneel met deadband).
+    - Met coalesce_window_s > 0 worden waarden binnen dat venster samengevoegd: alleen de laatste
+      waarde per controller blijft over en flush() verstuurt alles in één burst. Roep flush()
+      regelmatig aan (bijv. eens per verwerkingstick), anders blijft de laatste waarde hangen
+      tot er een nieuw bericht binnenkomt. Noten worden niet samengevoegd; wachtende berichten
+      gaan eerst, zodat een noot nooit vóór een eerdere CC of pitch bend aankomt.
+    - Een waarde telt pas als verstuurd als het verzenden gelukt is; na een fout wordt dezelfde
+      waarde de volgende keer opnieuw verstuurd.
+    """
+
+    def __init__(self, sender, coalesce_window_s=0.0, deadband=0, pitch_bend_deadband=0):
+        """
+        Args:
+            sender (MidiSender): Een MidiSender met een geopende poort.
+            coalesce_window_s (float, optional): Samenvoegvenster in seconden. 0 = direct verzenden.
+            deadband (int, optional): Minimale verandering van een CC-waarde om te verzenden.
+            pitch_bend_deadband (int, optional): Minimale verandering van de pitch bend om te verzenden.
+        """
+        if not sender._is_ready():
+            raise RuntimeError("MIDI-poort is niet geopend.")
+        self.sender = sender
+        # Met metrics op de MidiSender wordt ook hier per bericht gemeten
+        self._send = sender.midiout.send_message if sender.metrics is None else sender._timed_send
+        self.coalesce_window_s = coalesce_window_s
+        self.deadband = deadband
+        self.pitch_bend_deadband = pitch_bend_deadband
+
+        self._cc_status = [0xB0 | channel for channel in range(16)]
+        self._note_on_status = [0x90 | channel for channel in range(16)]
+        self._note_off_status = [0x80 | channel for channel in range(16)]
+        self._bend_status = [0xE0 | channel for channel in range(16)]
+        self._buffer = [0, 0, 0]
+
+        # Laatst verstuurde waarde per (kanaal, controller) en per kanaal voor pitch bend; -1 = onbekend
+        self._last_cc = [-1] * (16 * 128)
+        self._last_bend = [None] * 16
+        self._pending = {}
+        self._window_start = None
+        self.sent_count = 0
+        self.suppressed_count = 0
+
+    def _write(self, status, data1, data2):
+        buffer = self._buffer
+        buffer[0] = status
+        buffer[1] = data1
+        buffer[2] = data2
+        try:
+            self._send(buffer)
+            self.sent_count += 1
+            return True
+        except MidiSystemError as e:
+            log.error(f"Fout bij het verzenden van MIDI-bericht: {e}", key=f"send_error:{e}")
+            return False
+
+    def _queue(self, key, status, data1, data2):
+        now = time.perf_counter()
+        if self._window_start is None:
+            self._window_start = now
+        if key in self._pending:
+            self.suppressed_count += 1
+        self._pending[key] = (status, data1, data2)
+        if now - self._window_start >= self.coalesce_window_s:
+            self.flush()
+        return True
+
+    def send_control_change(self, channel, controller_number, value):
+        """Verstuurt een CC als de waarde (buiten de deadband) veranderd is."""
+        if not (0 <= channel <= 15 and 0 <= controller_number <= 127):
+            log.error("Ongeldige parameters voor Control Change. Kanaal (0-15), Controller (0-127).",
+                      key="coalescing_cc_params", channel=channel, controller=controller_number)
+            return False
+        value = 0 if value < 0 else 127 if value > 127 else value
+        key = (channel << 7) | controller_number
+        last = self._last_cc[key]
+        if last >= 0 and abs(value - last) <= self.deadband:
+            self.suppressed_count += 1
+            return False
+        if self.coalesce_window_s:
+            # Samengevoegd: de waarde geldt als verstuurd zodra hij wacht; flush() vergeet hem bij een fout
+            self._last_cc[key] = value
+            return self._queue(key, self._cc_status[channel], controller_number, value)
+        if self._write(self._cc_status[channel], controller_number, value):
+            self._last_cc[key] = value
+            return True
+        return False
+
+    def send_pitch_bend(self, channel, bend_value):
+        """Verstuurt een pitch bend (-8192 tot 8191) als de waarde (buiten de deadband) veranderd is."""
+        if not 0 <= channel <= 15:
+            log.error("Ongeldig kanaal voor Pitch Bend. Kanaal (0-15).", key="coalescing_bend_params",
+                      channel=channel)
+            return False
+        bend_value = -8192 if bend_value < -8192 else 8191 if bend_value > 8191 else bend_value
+        last = self._last_bend[channel]
+        if last is not None and abs(bend_value - last) <= self.pitch_bend_deadband:
+            self.suppressed_count += 1
+            return False
+        converted_value = bend_value + 8192
+        status = self._bend_status[channel]
+        if self.coalesce_window_s:
+            self._last_bend[channel] = bend_value
+            return self._queue(0x10000 | channel, status, converted_value & 0x7F, (converted_value >> 7) & 0x7F)
+        if self._write(status, converted_value & 0x7F, (converted_value >> 7) & 0x7F):
+            self._last_bend[channel] = bend_value
+            return True
+        return False
+
+    def send_note_on(self, channel, note_number, velocity):
+        """Verstuurt direct een Note On (noten worden niet samengevoegd; wachtende berichten gaan eerst)."""
+        if not (0 <= channel <= 15 and 0 <= note_number <= 127):
+            log.error("Ongeldige parameters voor Note On. Kanaal (0-15), Noot (0-127).",
+                      key="coalescing_note_params", channel=channel, note=note_number)
+            return False
+        velocity = 0 if velocity < 0 else 127 if velocity > 127 else velocity
+        if self._pending:
+            self.flush()
+        return self._write(self._note_on_status[channel], note_number, velocity)
+
+    def send_note_off(self, channel, note_number, velocity=0):
+        """Verstuurt direct een Note Off (noten worden niet samengevoegd; wachtende berichten gaan eerst)."""
+        if not (0 <= channel <= 15 and 0 <= note_number <= 127):
+            log.error("Ongeldige parameters voor Note Off. Kanaal (0-15), Noot (0-127).",
+                      key="coalescing_note_params", channel=channel, note=note_number)
+            return False
+        velocity = 0 if velocity < 0 else 127 if velocity > 127 else velocity
+        if self._pending:
+            self.flush()
+        return self._write(self._note_off_status[channel], note_number, velocity)
+
+    def flush(self):
+        """
+        Verstuurt alle samengevoegde berichten in één burst.
+
+        Returns:
+            int: Het aantal verstuurde berichten.
+        """
+        pending = self._pending
+        if not pending:
+            return 0
+        sent = 0
+        for key, (status, data1, data2) in pending.items():
+            if self._write(status, data1, data2):
+                sent += 1
+            elif key & 0x10000:
+                self._last_bend[key & 0xF] = None  # Niet verstuurd: de volgende waarde moet er weer door
+            else:
+                self._last_cc[key] = -1
+        pending.clear()
+        self._window_start = None
+        return sent
+
+    def reset(self):
+        """Vergeet de laatst verstuurde waarden, zodat de volgende waarde altijd wordt verstuurd."""
+        self._last_cc = [-1] * (16 * 128)
+        self._last_bend = [None] * 16
+        self._pending.clear()
+        self._window_start = None
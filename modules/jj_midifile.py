@@ -0,0 +1,199 @@
+import struct
+import time
+
+# Vooraf berekende variable-length quantities voor kleine delta-tijden (tot 2 bytes)
+_VLQ_CACHE = [bytes([n]) if n < 0x80 else bytes([0x80 | (n >> 7), n & 0x7F]) for n in range(0x4000)]
+
+
+def encode_vlq(value):
+    """Codeert een niet-negatief getal als MIDI variable-length quantity."""
+    if value < 0x4000:
+        return _VLQ_CACHE[value]
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    out.reverse()
+    return bytes(out)
+
+
+class MidiEventList:
+    """
+    Uitvoer die berichten met tijdstempel in het geheugen bewaart, met de interface van
+    rtmidi.MidiOut. Gebruik als MidiSender(port_index=0, midiout=MidiEventList()).
+    """
+
+    def __init__(self, clock=None):
+        """
+        Args:
+            clock (callable, optional): Functie die de huidige tijd in seconden geeft.
+                                        Standaard time.perf_counter; geef een eigen klok mee
+                                        om offline (sneller dan realtime) te renderen.
+        """
+        self.clock = clock or time.perf_counter
+        self.events = []  # (tijd in seconden sinds het openen, bericht)
+        self._start = None
+
+    def get_ports(self):
+        return ["Geheugen (event-lijst)"]
+
+    def open_port(self, port=0, name=None):
+        self._start = self.clock()
+
+    def is_port_open(self):
+        return self._start is not None
+
+    def close_port(self):
+        pass
+
+    def send_message(self, message):
+        self.events.append((self.clock() - self._start, bytes(message)))
+
+    def write_midi_file(self, path, ppq=480, tempo_us=500000):
+        """Schrijft de bewaarde events naar een Standard MIDI File."""
+        writer = MidiFileOut(path, ppq=ppq, tempo_us=tempo_us)
+        writer.open_port()
+        for timestamp, message in self.events:
+            writer.write_event(timestamp, message)
+        writer.close_port()
+
+
+class MidiFileOut:
+    """
+    Uitvoer die berichten als Standard MIDI File (formaat 0) wegschrijft, met de interface
+    van rtmidi.MidiOut. Gebruik als MidiSender(port_index=0, midiout=MidiFileOut("sessie.mid")).
+
+    Events worden direct (gebufferd) naar het bestand geschreven, zodat ook lange sessies niet
+    in het geheugen worden gehouden. Pas bij close_port() wordt de tracklengte in de header ingevuld.
+    """
+
+    def __init__(self, path, ppq=480, tempo_us=500000, clock=None, running_status=True):
+        """
+        Args:
+            path (str): Het uitvoerbestand (.mid).
+            ppq (int, optional): Ticks per kwartnoot. Standaard 480.
+            tempo_us (int, optional): Microseconden per kwartnoot (500000 = 120 BPM).
+            clock (callable, optional): Functie die de huidige tijd in seconden geeft (standaard
+                                        time.perf_counter); een eigen klok rendert offline.
+            running_status (bool, optional): Laat herhaalde statusbytes weg (kleiner bestand).
+        """
+        self.path = path
+        self.ppq = ppq
+        self.tempo_us = tempo_us
+        self.clock = clock or time.perf_counter
+        self.running_status = running_status
+        self.ticks_per_second = ppq * 1e6 / tempo_us
+        self.event_count = 0
+        self._file = None
+        self._start = None
+
+    def get_ports(self):
+        return [f"MIDI-bestand: {self.path}"]
+
+    def open_port(self, port=0, name=None):
+        self._file = open(self.path, "wb")
+        # Header (formaat 0, één track) en een track-header met voorlopige lengte 0
+        self._file.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, self.ppq))
+        self._file.write(b"MTrk" + struct.pack(">I", 0))
+        self._track_start = self._file.tell()
+        # Tempo-meta-event aan het begin van de track
+        self._file.write(b"\x00\xff\x51\x03" + self.tempo_us.to_bytes(3, "big"))
+        self._last_tick = 0
+        self._last_status = None
+        self._start = self.clock()
+
+    def is_port_open(self):
+        return self._file is not None
+
+    def send_message(self, message):
+        self.write_event(self.clock() - self._start, message)
+
+    def write_event(self, timestamp_s, message):
+        """Schrijft één bericht op tijdstip timestamp_s (seconden sinds het openen)."""
+        tick = int(timestamp_s * self.ticks_per_second + 0.5)
+        if tick < self._last_tick:
+            tick = self._last_tick  # Delta-tijden kunnen niet negatief zijn
+        delta = tick - self._last_tick
+        self._last_tick = tick
+
+        status = message[0]
+        if status == 0xF0:
+            # SysEx krijgt een eigen lengteveld (F0 <lengte> <data ... F7>) en breekt running status af
+            self._file.write(encode_vlq(delta) + b"\xf0" + encode_vlq(len(message) - 1) + bytes(message[1:]))
+            self._last_status = None
+        elif status > 0xF0:
+            # Overige systeemberichten (MTC, song position, klok, ...) bestaan niet als bestandsevent;
+            # ze gaan ongewijzigd in een F7-escape (F7 <lengte> <bytes>). Een losse FF zou anders als
+            # meta-event gelezen worden.
+            self._file.write(encode_vlq(delta) + b"\xf7" + encode_vlq(len(message)) + bytes(message))
+            self._last_status = None
+        elif self.running_status and status == self._last_status:
+            self._file.write(encode_vlq(delta) + bytes(message[1:]))
+        else:
+            self._file.write(encode_vlq(delta) + bytes(message))
+            self._last_status = status
+        self.event_count += 1
+
+    def close_port(self):
+        if self._file is None:
+            return
+        self._file.write(b"\x00\xff\x2f\x00")  # End of Track
+        end = self._file.tell()
+        self._file.seek(self._track_start - 4)
+        self._file.write(struct.pack(">I", end - self._track_start))
+        self._file.close()
+        self._file = None
+
+    def __del__(self):
+        self.close_port()
+
+
+def read_midi_file(path):
+    """
+    Leest een met MidiFileOut geschreven bestand terug als lijst van (tick, bericht) tuples
+    (zonder meta-events). Handig om een render te controleren.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != b"MThd" or data[14:18] != b"MTrk":
+        raise ValueError(f"{path} is geen Standard MIDI File met één track.")
+    length = struct.unpack(">I", data[18:22])[0]
+    position, end = 22, 22 + length
+    tick, status, events = 0, None, []
+
+    def read_vlq(position):
+        value = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value = (value << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                return value, position
+
+    while position < end:
+        delta, position = read_vlq(position)
+        tick += delta
+        if data[position] == 0xFF:
+            meta_length, position = read_vlq(position + 2)
+            position += meta_length
+            continue
+        if data[position] == 0xF0:
+            sysex_length, position = read_vlq(position + 1)
+            events.append((tick, bytes([0xF0]) + data[position:position + sysex_length]))
+            position += sysex_length
+            status = None
+            continue
+        if data[position] == 0xF7:
+            escape_length, position = read_vlq(position + 1)
+            events.append((tick, data[position:position + escape_length]))
+            position += escape_length
+            status = None
+            continue
+        if data[position] & 0x80:
+            status = data[position]
+            position += 1
+        size = 1 if 0xC0 <= status < 0xE0 else 2
+        events.append((tick, bytes([status]) + data[position:position + size]))
+        position += size
+    return events
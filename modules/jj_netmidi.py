@@ -0,0 +1,299 @@
+import collections
+import random
+import socket
+import struct
+import threading
+import time
+
+from modules import jj_log
+
+log = jj_log.get_logger("netmidi")
+
+
+def _osc_string(text):
+    """OSC-string: ASCII, afgesloten met 0 en opgevuld tot een veelvoud van 4 bytes."""
+    data = text.encode("ascii") + b"\x00"
+    return data + b"\x00" * (-len(data) % 4)
+
+
+def osc_message(address, type_tags, *arguments):
+    """
+    Bouwt een OSC-bericht. Ondersteunde typen: 'i' (int32), 'f' (float32), 'm' (MIDI, 4 bytes)
+    en 'N' (nil, zonder argumentbytes; het bijbehorende argument wordt genegeerd).
+    """
+    parts = [_osc_string(address), _osc_string("," + type_tags)]
+    for tag, argument in zip(type_tags, arguments):
+        if tag == "i":
+            parts.append(struct.pack(">i", argument))
+        elif tag == "f":
+            parts.append(struct.pack(">f", argument))
+        elif tag == "m":
+            # Poort-id, status, data1, data2
+            parts.append(bytes((0, *argument, 0, 0, 0))[:4])
+        elif tag == "N":
+            pass
+        else:
+            raise ValueError(f"OSC-type '{tag}' wordt niet ondersteund.")
+    return b"".join(parts)
+
+
+def osc_bundle(messages):
+    """Bundelt OSC-berichten in één pakket (tijdtag 1 = direct uitvoeren)."""
+    parts = [_osc_string("#bundle"), struct.pack(">Q", 1)]
+    for message in messages:
+        parts.append(struct.pack(">i", len(message)))
+        parts.append(message)
+    return b"".join(parts)
+
+
+class Sink:
+    """
+    Basisklasse voor een uitvoerkanaal met een eigen schrijfthread.
+
+    Batches (lijsten met MIDI-berichten per tick) komen in een begrensde wachtrij; is die vol,
+    dan vervalt de oudste batch. Zo blokkeert een trage sink nooit de sensorloop.
+    """
+
+    accepts_sensor_events = False
+
+    def __init__(self, name, queue_size=64):
+        self.name = name
+        self._queue = collections.deque(maxlen=queue_size)
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self.sent_batches = 0
+        self.dropped_batches = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"sink-{self.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Zet een batch of sensor-event in de wachtrij (blokkeert nooit)."""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped_batches += 1
+        self._queue.append(item)
+        self._wakeup.set()
+
+    def _run(self):
+        while self._running or self._queue:
+            if not self._queue:
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                continue
+            kind, payload = self._queue.popleft()
+            try:
+                if kind == "midi":
+                    self.write_batch(payload)
+                else:
+                    self.write_sensor_event(*payload)
+                self.sent_batches += 1
+            except Exception as e:
+                # Per bericht opvangen (OSError, MidiSystemError, struct.error, ...): één fout
+                # mag de schrijfthread niet stoppen, anders vervalt daarna alles stilletjes
+                self.errors += 1
+                log.error(f"Verzenden naar {self.name} mislukt: {e}", key=f"sink_error:{self.name}:{type(e).__name__}",
+                          errors=self.errors)
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write_batch(self, messages):
+        raise NotImplementedError
+
+    def write_sensor_event(self, sensor_id, distance):
+        pass
+
+
+class RtMidiSink(Sink):
+    """Stuurt batches naar een (al geopende) rtmidi.MidiOut of SimulatedMidiOut."""
+
+    def __init__(self, midiout, name="rtmidi", queue_size=64):
+        super().__init__(name, queue_size)
+        self.midiout = midiout
+
+    def write_batch(self, messages):
+        send = self.midiout.send_message
+        for message in messages:
+            send(message)
+
+
+class _SocketSink(Sink):
+    """Gemeenschappelijke basis voor UDP-sinks: één socket die open blijft."""
+
+    def __init__(self, host, port, name, queue_size=64):
+        super().__init__(name, queue_size)
+        self.address = (host, port)
+        self._socket = None
+
+    def open(self):
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class UdpSink(_SocketSink):
+    """Stuurt per tick alle ruwe MIDI-bytes achter elkaar in één UDP-datagram."""
+
+    def __init__(self, host, port, name="udp", queue_size=64):
+        super().__init__(host, port, name, queue_size)
+
+    def write_batch(self, messages):
+        self._socket.sendto(b"".join(bytes(message) for message in messages), self.address)
+
+
+class OscSink(_SocketSink):
+    """
+    Stuurt per tick een OSC-bundel met één '/midi' bericht (type 'm') per MIDI-bericht,
+    en sensorwaarden als '/sensor/<id>/distance' (float, of nil bij een mislukte meting).
+    """
+
+    accepts_sensor_events = True
+
+    def __init__(self, host, port, address="/midi", name="osc", queue_size=64):
+        super().__init__(host, port, name, queue_size)
+        self.osc_address = address
+
+    def write_batch(self, messages):
+        packets = [osc_message(self.osc_address, "m", tuple(message[:3])) for message in messages]
+        self._socket.sendto(packets[0] if len(packets) == 1 else osc_bundle(packets), self.address)
+
+    def write_sensor_event(self, sensor_id, distance):
+        # Een mislukte meting (None) gaat als OSC-nil, zodat de ontvanger hem van 0.0 kan onderscheiden
+        message = osc_message(f"/sensor/{sensor_id}/distance", "N" if distance is None else "f", distance)
+        self._socket.sendto(message, self.address)
+
+
+class RtpMidiSink(_SocketSink):
+    """
+    Stuurt per tick één RTP-MIDI pakket (RFC 6295): RTP-header met payload type 97 en een
+    MIDI command section zonder recovery journal.
+
+    Let op: de AppleMIDI sessie-uitnodiging zit hier niet in; de ontvanger moet pakketten op
+    deze poort accepteren (bijv. een al opgezette sessie of een eigen ontvanger).
+    """
+
+    PAYLOAD_TYPE = 97
+
+    def __init__(self, host, port, ssrc=None, name="rtp-midi", queue_size=64):
+        super().__init__(host, port, name, queue_size)
+        self.ssrc = random.getrandbits(32) if ssrc is None else ssrc
+        self._sequence = random.getrandbits(16)
+        self._clock_start = time.perf_counter()
+
+    def build_packet(self, messages):
+        timestamp = int((time.perf_counter() - self._clock_start) * 10000) & 0xFFFFFFFF  # 100 µs eenheden
+        header = struct.pack(">BBHII", 0x80, 0x80 | self.PAYLOAD_TYPE, self._sequence, timestamp, self.ssrc)
+        self._sequence = (self._sequence + 1) & 0xFFFF
+
+        # MIDI list: eerste commando zonder delta-tijd, daarna delta-tijd 0 per commando
+        midi_list = bytearray(bytes(messages[0]))
+        for message in messages[1:]:
+            midi_list.append(0)
+            midi_list += bytes(message)
+        length = len(midi_list)
+        if length < 16:
+            section = bytes([length])
+        else:
+            section = struct.pack(">H", 0x8000 | length)  # B-bit: lange header (12 bits lengte)
+        return header + section + bytes(midi_list)
+
+    def write_batch(self, messages):
+        self._socket.sendto(self.build_packet(messages), self.address)
+
+
+class MidiFanout:
+    """
+    Stuurt dezelfde MIDI-stroom naar meerdere sinks tegelijk, met de interface van rtmidi.MidiOut.
+    Gebruik als MidiSender(port_index=0, midiout=MidiFanout([...])).
+
+    Berichten worden per tick (tick_s) verzameld en als één batch aan elke sink gegeven;
+    elke sink verstuurt vanuit zijn eigen thread. send_message() blokkeert dus nooit op netwerk-
+    of MIDI-I/O.
+    """
+
+    def __init__(self, sinks, tick_s=0.002):
+        self.sinks = list(sinks)
+        self.tick_s = tick_s
+        self._batch = []
+        self._lock = threading.Lock()
+        self._open = False
+        self._ticker = None
+        self._stop = threading.Event()
+
+    def get_ports(self):
+        return ["Fan-out: " + ", ".join(sink.name for sink in self.sinks)]
+
+    def open_port(self, port=0, name=None):
+        for sink in self.sinks:
+            sink.start()
+        self._open = True
+        if self.tick_s:
+            self._stop.clear()
+            self._ticker = threading.Thread(target=self._tick_loop, name="fanout-tick", daemon=True)
+            self._ticker.start()
+
+    def is_port_open(self):
+        return self._open
+
+    def send_message(self, message):
+        with self._lock:
+            self._batch.append(list(message))
+        if not self.tick_s:
+            self.flush()
+
+    def publish_sensor(self, sensor_id, distance):
+        """Stuurt een sensorwaarde naar de sinks die sensor-events ondersteunen (bijv. OSC)."""
+        for sink in self.sinks:
+            if sink.accepts_sensor_events:
+                sink.submit(("sensor", (sensor_id, distance)))
+
+    def flush(self):
+        """Geeft de verzamelde berichten als één batch aan alle sinks."""
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if batch:
+            for sink in self.sinks:
+                sink.submit(("midi", batch))
+
+    def _tick_loop(self):
+        while not self._stop.wait(self.tick_s):
+            self.flush()
+
+    def close_port(self):
+        if not self._open:
+            return
+        self._stop.set()
+        if self._ticker is not None:
+            self._ticker.join()
+            self._ticker = None
+        self.flush()
+        for sink in self.sinks:
+            sink.stop()
+        self._open = False
+
+    def stats(self):
+        """Geeft per sink het aantal verzonden en gedropte batches en fouten."""
+        return {sink.name: {"sent": sink.sent_batches, "dropped": sink.dropped_batches,
+                            "errors": sink.errors} for sink in self.sinks}
@@ -0,0 +1,141 @@
+import collections
+
+class NoteManager:
+    """
+    Houdt bij welke noten klinken en verstuurt alleen Note On/Off als dat nodig is.
+
+    Actieve noten staan per kanaal in een bitmap (één int van 128 bits). Een Note On gaat alleen
+    de deur uit als de toonhoogte verandert; de vorige noot wordt automatisch losgelaten.
+
+    Modi:
+        'mono'    Eerst de oude noot uit, dan de nieuwe aan (herstart de envelope).
+        'legato'  Eerst de nieuwe noot aan, dan de oude uit (vloeiende overgang).
+        'sustain' Noten blijven klinken tot max_voices bereikt is; daarna wordt de oudste gestopt.
+    """
+
+    MODES = ("mono", "legato", "sustain")
+    ALL_NOTES_OFF_CC = 123
+
+    def __init__(self, sender, channel=0, velocity=100, mode="mono", max_voices=1,
+                 release_after_misses=3):
+        """
+        Args:
+            sender (MidiSender): Iets met send_note_on/send_note_off/send_control_change.
+            channel (int, optional): Standaard MIDI-kanaal (0-15).
+            velocity (int, optional): Standaard velocity (1-127).
+            mode (str, optional): 'mono', 'legato' of 'sustain'.
+            max_voices (int, optional): Maximaal aantal gelijktijdige noten per kanaal (voor 'sustain').
+            release_after_misses (int, optional): Laat alle noten los na zoveel mislukte metingen op rij.
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Ongeldige modus '{mode}'. Kies uit {self.MODES}.")
+        if not 0 <= channel <= 15:
+            raise ValueError("Ongeldig kanaal. Kies 0-15.")
+        self.sender = sender
+        self.channel = channel
+        self.velocity = velocity
+        self.mode = mode
+        self.max_voices = max(1, max_voices) if mode == "sustain" else 1
+        self.release_after_misses = release_after_misses
+
+        self._active = [0] * 16                                  # bitmap van klinkende noten per kanaal
+        self._order = [collections.deque() for _ in range(16)]   # volgorde van aanslaan, voor voice stealing
+        self._played = 0                                         # bitmap van kanalen met een Note On, voor all_notes_off()
+        self._misses = 0
+        self.note_on_count = 0
+        self.note_off_count = 0
+
+    def is_active(self, note, channel=None):
+        """Geeft True als de noot op het kanaal klinkt."""
+        channel = self.channel if channel is None else channel
+        return bool(self._active[channel] >> note & 1)
+
+    def active_notes(self, channel=None):
+        """Geeft de klinkende noten van een kanaal in volgorde van aanslaan."""
+        channel = self.channel if channel is None else channel
+        return list(self._order[channel])
+
+    # De boekhouding volgt alleen berichten die echt verstuurd zijn: een mislukte Note On telt niet
+    # als klinkend, een mislukte Note Off laat de noot actief, zodat een volgende release het opnieuw probeert.
+    def _note_on(self, channel, note, velocity):
+        if not self.sender.send_note_on(channel, note, velocity):
+            return False
+        self._active[channel] |= 1 << note
+        self._order[channel].append(note)
+        self._played |= 1 << channel
+        self.note_on_count += 1
+        return True
+
+    def _note_off(self, channel, note):
+        if not self.sender.send_note_off(channel, note):
+            return False
+        self._active[channel] &= ~(1 << note)
+        self._order[channel].remove(note)
+        self.note_off_count += 1
+        return True
+
+    def play(self, note, velocity=None, channel=None):
+        """
+        Laat een noot klinken. Doet niets als de noot al klinkt.
+
+        Returns:
+            bool: True als er een Note On is verstuurd.
+        """
+        channel = self.channel if channel is None else channel
+        self._misses = 0
+        if self._active[channel] >> note & 1:
+            return False
+        velocity = self.velocity if velocity is None else velocity
+        order = self._order[channel]
+
+        if self.mode == "legato":
+            previous = list(order)
+            if not self._note_on(channel, note, velocity):
+                return False
+            for old in previous:
+                self._note_off(channel, old)
+            return True
+        # 'mono' laat alles los; 'sustain' alleen de oudste noten boven de limiet. Lukt dat niet
+        # (poort weg), dan ook geen nieuwe noot: anders klinken er meer noten dan max_voices.
+        while len(order) >= self.max_voices:
+            if not self._note_off(channel, order[0]):
+                return False
+        return self._note_on(channel, note, velocity)
+
+    def release(self, note=None, channel=None):
+        """Laat één noot los, of alle noten van het kanaal als note None is."""
+        channel = self.channel if channel is None else channel
+        if note is None:
+            for old in list(self._order[channel]):
+                self._note_off(channel, old)
+        elif self._active[channel] >> note & 1:
+            self._note_off(channel, note)
+
+    def sensor_missed(self):
+        """
+        Meld een mislukte meting. Na release_after_misses keer op rij worden alle noten losgelaten,
+        zodat een noot niet blijft hangen als de sensor niets meer ziet.
+        """
+        self._misses += 1
+        if self.release_after_misses and self._misses == self.release_after_misses:
+            self.release_all()
+
+    def release_all(self):
+        """Laat alle bijgehouden noten op alle kanalen los."""
+        for channel in range(16):
+            if self._active[channel]:
+                self.release(channel=channel)
+
+    def all_notes_off(self):
+        """
+        Paniekknop: laat alle bijgehouden noten los en stuurt daarnaast All Notes Off (CC 123)
+        op het standaardkanaal en op elk kanaal waarop deze manager sinds de vorige paniek noten
+        heeft gespeeld, ook als die inmiddels zijn losgelaten.
+        """
+        played = self._played | 1 << self.channel
+        self.release_all()
+        # Noten die niet losgelaten konden worden, houden hun kanaal vast voor de volgende paniek
+        self._played = sum(1 << channel for channel in range(16) if self._active[channel])
+        for channel in range(16):
+            if played >> channel & 1:
+                self.sender.send_control_change(channel, self.ALL_NOTES_OFF_CC, 0)
@@ -0,0 +1,38 @@
+import importlib
+
+# Optionele afhankelijkheden (NumPy) worden pas bij het eerste gebruik geïmporteerd, zodat het
+# importeren van de modules snel blijft en alles zonder die pakketten werkt. Het resultaat wordt
+# onthouden, ook als het pakket ontbreekt:
+#
+#     from modules import jj_optional
+#     np = jj_optional.load_numpy()
+#     if np is None:
+#         ...  # terugvallen op pure Python
+
+_loaded = {}
+
+
+def load_optional(name):
+    """
+    Importeert een optionele module bij de eerste aanroep.
+
+    Args:
+        name (str): Naam van de module, bijv. 'numpy'.
+    Returns:
+        module: De module, of None als die niet geïnstalleerd is.
+    """
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    _loaded[name] = module
+    return module
+
+
+def load_numpy():
+    """NumPy, of None als het ontbreekt."""
+    return load_optional("numpy")
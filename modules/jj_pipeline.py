@@ -0,0 +1,236 @@
+import asyncio
+import collections
+import concurrent.futures
+import time
+
+class Sample:
+    """Eén meting die door de pipeline reist, met de tijdstempel (perf_counter_ns) van acquisitie."""
+
+    __slots__ = ("seq", "acquired_ns", "distance", "value")
+
+    def __init__(self, seq, acquired_ns, distance, value=None):
+        self.seq = seq
+        self.acquired_ns = acquired_ns
+        self.distance = distance
+        self.value = value
+
+
+class StageQueue:
+    """
+    Begrensde asyncio-wachtrij tussen twee pipeline-stappen met een backpressure-beleid.
+
+    Beleid:
+        'block'           De producent wacht tot er plek is.
+        'drop-oldest'     Bij een volle wachtrij vervalt het oudste item.
+        'coalesce-latest' Alleen het nieuwste item blijft bewaard (wachtrij van één).
+    """
+
+    POLICIES = ("block", "drop-oldest", "coalesce-latest")
+
+    def __init__(self, maxsize=8, policy="drop-oldest"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Ongeldig backpressure-beleid '{policy}'. Kies uit {self.POLICIES}.")
+        self.policy = policy
+        self.maxsize = 1 if policy == "coalesce-latest" else max(1, maxsize)
+        self._items = collections.deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    async def put(self, item):
+        if len(self._items) >= self.maxsize:
+            if self.policy == "block":
+                while len(self._items) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            else:
+                self._items.popleft()
+                self.dropped += 1
+        self._items.append(item)
+        self._not_empty.set()
+
+    async def get(self):
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        item = self._items.popleft()
+        self._not_full.set()
+        return item
+
+
+class SensorMidiPipeline:
+    """
+    Asynchrone pipeline: sensor-acquisitie -> mapping -> MIDI-uitvoer.
+
+    Elke stap draait als eigen asyncio-taak en is met de volgende verbonden via een StageQueue.
+    Blokkerende aanroepen (sensor uitlezen, MIDI verzenden) draaien elk in een eigen thread,
+    zodat een trage MIDI-poort of een sensor-timeout de andere stappen niet ophoudt.
+    Per sample wordt de eind-tot-eind latentie (acquisitie tot verzonden) gemeten.
+    """
+
+    def __init__(self, read_sample, map_sample, send_sample, acquire_rate_hz=20.0,
+                 output_rate_hz=None, queue_size=8, map_policy="drop-oldest",
+                 output_policy="coalesce-latest", latency_window=1024, on_read_failure=None,
+                 metrics=None):
+        """
+        Initialiseert de pipeline.
+
+        Args:
+            read_sample (callable): Blokkerende functie zonder argumenten die een afstand of None teruggeeft,
+                                    bijv. sensor.get_distance.
+            map_sample (callable): Functie afstand -> uitvoerwaarde (of None om het sample over te slaan),
+                                   bijv. distance_to_midi_value.
+            send_sample (callable): Blokkerende functie die een uitvoerwaarde verstuurt.
+            acquire_rate_hz (float, optional): Maximale meetsnelheid. Standaard 20 Hz.
+            output_rate_hz (float, optional): Maximale verzendsnelheid; None = zo snel als het binnenkomt.
+            queue_size (int, optional): Grootte van de wachtrijen tussen de stappen.
+            map_policy (str, optional): Backpressure-beleid tussen acquisitie en mapping.
+            output_policy (str, optional): Backpressure-beleid tussen mapping en uitvoer.
+            latency_window (int, optional): Aantal recente latenties dat bewaard wordt voor percentielen.
+            on_read_failure (callable, optional): Wordt aangeroepen als read_sample None teruggeeft,
+                                                  bijv. NoteManager.sensor_missed. Draait in de
+                                                  uitvoerthread, dus nooit tegelijk met send_sample,
+                                                  maar direct: samples die dan nog in een wachtrij
+                                                  staan, worden pas daarna verstuurd.
+            metrics (Instrumentation, optional): Legt 'mapping' en 'latency' per sample vast.
+        """
+        self.read_sample = read_sample
+        self.map_sample = map_sample
+        self.send_sample = send_sample
+        self.on_read_failure = on_read_failure
+        self.metrics = metrics
+        self.acquire_period_s = 1.0 / acquire_rate_hz if acquire_rate_hz else 0.0
+        self.output_period_s = 1.0 / output_rate_hz if output_rate_hz else 0.0
+        self.queue_size = queue_size
+        self.map_policy = map_policy
+        self.output_policy = output_policy
+
+        self.latencies_ns = collections.deque(maxlen=latency_window)
+        self.counters = {"acquired": 0, "failed": 0, "mapped": 0, "skipped": 0, "sent": 0}
+        self._running = False
+        self._map_queue = None
+        self._output_queue = None
+        self._output_executor = None
+
+    async def _acquire(self, executor):
+        loop = asyncio.get_running_loop()
+        seq = 0
+        next_at = time.perf_counter()
+        while self._running:
+            distance = await loop.run_in_executor(executor, self.read_sample)
+            acquired_ns = time.perf_counter_ns()
+            if distance is None:
+                self.counters["failed"] += 1
+                if self.on_read_failure is not None:
+                    self._output_executor.submit(self.on_read_failure)
+            else:
+                self.counters["acquired"] += 1
+                await self._map_queue.put(Sample(seq, acquired_ns, distance))
+                seq += 1
+            next_at += self.acquire_period_s
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_at = time.perf_counter()  # Achterstand niet inhalen
+                await asyncio.sleep(0)
+
+    async def _map(self):
+        while self._running:
+            sample = await self._map_queue.get()
+            if self.metrics is None:
+                sample.value = self.map_sample(sample.distance)
+            else:
+                start_ns = time.perf_counter_ns()
+                sample.value = self.map_sample(sample.distance)
+                self.metrics.record("mapping", time.perf_counter_ns() - start_ns)
+            if sample.value is None:
+                self.counters["skipped"] += 1
+                continue
+            self.counters["mapped"] += 1
+            await self._output_queue.put(sample)
+
+    async def _output(self, executor):
+        loop = asyncio.get_running_loop()
+        next_at = time.perf_counter()
+        while self._running:
+            sample = await self._output_queue.get()
+            await loop.run_in_executor(executor, self.send_sample, sample.value)
+            latency_ns = time.perf_counter_ns() - sample.acquired_ns
+            self.latencies_ns.append(latency_ns)
+            if self.metrics is not None:
+                self.metrics.record("latency", latency_ns)
+            self.counters["sent"] += 1
+            if self.output_period_s:
+                next_at += self.output_period_s
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    next_at = time.perf_counter()
+
+    async def run(self, duration_s=None):
+        """
+        Draait de pipeline tot stop() wordt aangeroepen of duration_s is verstreken.
+        """
+        self._map_queue = StageQueue(self.queue_size, self.map_policy)
+        self._output_queue = StageQueue(self.queue_size, self.output_policy)
+        self._running = True
+        sensor_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        output_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._output_executor = output_executor
+        tasks = [
+            asyncio.create_task(self._acquire(sensor_executor)),
+            asyncio.create_task(self._map()),
+            asyncio.create_task(self._output(output_executor)),
+        ]
+        loop = asyncio.get_running_loop()
+        deadline = None if duration_s is None else loop.time() + duration_s
+        try:
+            while self._running and (deadline is None or loop.time() < deadline):
+                for task in tasks:
+                    if task.done():
+                        task.result()  # Laat een fout in een stap niet stilletjes verdwijnen
+                await asyncio.sleep(0.05 if deadline is None else min(0.05, max(0.0, deadline - loop.time())))
+        finally:
+            self._running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            sensor_executor.shutdown(wait=True)
+            output_executor.shutdown(wait=True)
+
+    def stop(self):
+        """Vraagt de pipeline om te stoppen (mag vanuit een andere thread)."""
+        self._running = False
+
+    def latency_stats(self):
+        """
+        Geeft statistieken over de eind-tot-eind latentie van recente samples (in milliseconden).
+
+        Returns:
+            dict: count, mean_ms, p50_ms, p99_ms en max_ms (None als er nog niets verzonden is).
+        """
+        values = sorted(self.latencies_ns)
+        if not values:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        n = len(values)
+        return {
+            "count": n,
+            "mean_ms": sum(values) / n / 1e6,
+            "p50_ms": values[n // 2] / 1e6,
+            "p99_ms": values[min(n - 1, int(n * 0.99))] / 1e6,
+            "max_ms": values[-1] / 1e6,
+        }
+
+    def stats(self):
+        """Geeft tellers per stap, gedropte items per wachtrij en de latentiestatistieken."""
+        stats = dict(self.counters)
+        stats["dropped_map"] = self._map_queue.dropped if self._map_queue else 0
+        stats["dropped_output"] = self._output_queue.dropped if self._output_queue else 0
+        stats["latency"] = self.latency_stats()
+        return stats
@@ -0,0 +1,277 @@
+import collections
+import re
+import threading
+import time
+
+from modules import jj_log
+from modules import jj_midi
+
+log = jj_log.get_logger("ports")
+
+# ALSA voegt "client:poort"-nummers toe (bijv. "Midi Gadget:Midi Gadget MIDI 1 20:0") die
+# na opnieuw aansluiten kunnen veranderen; voor het opzoeken tellen ze niet mee.
+_PORT_NUMBERS = re.compile(r"\s+\d+:\d+$")
+
+
+def normalize_port_name(name):
+    """Maakt een poortnaam vergelijkbaar: kleine letters, zonder ALSA-nummers en dubbele spaties."""
+    return " ".join(_PORT_NUMBERS.sub("", name).lower().split())
+
+
+class MidiPortRegistry:
+    """
+    Houdt de beschikbare MIDI-outputpoorten bij, geïndexeerd op genormaliseerde naam.
+
+    De poortenlijst wordt via één blijvend rtmidi.MidiOut-object opgevraagd en hooguit eens per
+    cache_ttl_s ververst. Opzoekingen (ook op een deel van de naam) worden bewaard tot de lijst
+    verandert, zodat find() meestal één dict-opzoeking kost.
+    """
+
+    def __init__(self, midiout_factory=None, cache_ttl_s=2.0):
+        """
+        Args:
+            midiout_factory (callable, optional): Maakt een rtmidi.MidiOut-achtig object aan.
+                                                  Standaard rtmidi.MidiOut; gebruik bijv.
+                                                  SimulatedMidiSystem().MidiOut om te testen.
+            cache_ttl_s (float, optional): Maximale leeftijd van de gecachete poortenlijst.
+        """
+        if midiout_factory is None:
+            rtmidi = jj_midi.load_rtmidi()
+            if rtmidi is None:
+                raise RuntimeError("python-rtmidi is niet geïnstalleerd; geef een midiout_factory mee.")
+            midiout_factory = rtmidi.MidiOut
+        self.midiout_factory = midiout_factory
+        self.cache_ttl_s = cache_ttl_s
+        self._probe = None
+        self._ports = []
+        self._index = {}    # genormaliseerde naam -> index
+        self._lookups = {}  # zoekterm -> (index, naam) of None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self.version = 0    # Wordt opgehoogd als de poortenlijst verandert
+
+    def refresh(self, force=True):
+        """
+        Vraagt de poortenlijst opnieuw op (zonder force alleen als de cache verlopen is).
+
+        Returns:
+            bool: True als de lijst is veranderd.
+        """
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.cache_ttl_s:
+            return False
+        with self._lock:
+            if self._probe is None:
+                self._probe = self.midiout_factory()
+            ports = self._probe.get_ports()
+            self._refreshed_at = now
+            if ports == self._ports:
+                return False
+            self._ports = ports
+            self._index = {}
+            for i, name in enumerate(ports):
+                self._index.setdefault(normalize_port_name(name), i)
+            self._lookups = {}
+            self.version += 1
+            return True
+
+    def ports(self):
+        """De (gecachete) lijst met poortnamen."""
+        self.refresh(force=False)
+        return list(self._ports)
+
+    def find(self, name):
+        """
+        Zoekt een poort op volledige of gedeeltelijke naam, ongevoelig voor hoofdletters
+        en ALSA-nummers.
+
+        Returns:
+            tuple: (index, volledige naam), of None als er geen passende poort is.
+        """
+        self.refresh(force=False)
+        lookups = self._lookups
+        if name in lookups:
+            return lookups[name]
+        key = normalize_port_name(name)
+        index = self._index.get(key)
+        if index is None:
+            index = next((i for normalized, i in self._index.items() if key in normalized), None)
+        result = None if index is None else (index, self._ports[index])
+        lookups[name] = result
+        return result
+
+    def close(self):
+        if self._probe is not None:
+            del self._probe
+            self._probe = None
+
+
+class ReconnectingMidiOut:
+    """
+    Een MIDI-uitvoer die aan een poortnaam vastzit in plaats van aan een index, met de
+    interface van rtmidi.MidiOut. Gebruik als MidiSender(port_index=0, midiout=ReconnectingMidiOut(...)).
+
+    Verdwijnt de poort (USB-kabel eruit, synth uit), dan blijft send_message() gewoon werken:
+    berichten worden in een begrensde wachtrij bewaard (when_disconnected="buffer", de oudste
+    vervallen als die vol is) of weggegooid ("drop"). Een achtergrondthread controleert elke
+    retry_interval_s of de poort er (weer) is, maakt opnieuw verbinding en verstuurt de wachtrij.
+    """
+
+    POLICIES = ("buffer", "drop")
+
+    def __init__(self, port_name, registry=None, queue_size=256, when_disconnected="buffer",
+                 retry_interval_s=1.0):
+        """
+        Args:
+            port_name (str): Volledige of gedeeltelijke naam van de poort, bijv. "Midi Gadget".
+            registry (MidiPortRegistry, optional): Gedeeld poortregister; standaard een nieuw register.
+            queue_size (int, optional): Maximaal aantal bewaarde berichten zonder verbinding.
+            when_disconnected (str, optional): 'buffer' of 'drop'.
+            retry_interval_s (float, optional): Interval van de controle- en herverbindthread.
+        """
+        if when_disconnected not in self.POLICIES:
+            raise ValueError(f"Ongeldig beleid '{when_disconnected}'. Kies uit {self.POLICIES}.")
+        self.port_name = port_name
+        self.registry = registry if registry is not None else MidiPortRegistry()
+        self.when_disconnected = when_disconnected
+        self.retry_interval_s = retry_interval_s
+        self._pending = collections.deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._midiout = None
+        self._connecting = False  # Wachtrij wordt geleegd; nieuwe berichten sluiten achteraan aan
+        self._open = False
+        self._thread = None
+        self._stop = threading.Event()
+        self.connected_port = None
+        self.connect_count = 0
+        self.disconnect_count = 0
+        self.dropped_count = 0
+
+    def get_ports(self):
+        return [f"{self.port_name} (hot-plug)"]
+
+    def open_port(self, port=0, name=None):
+        """Probeert direct te verbinden en start de achtergrondthread; blokkeert niet op de poort."""
+        if self._open:
+            return
+        self._open = True
+        self._connect()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="midi-reconnect", daemon=True)
+        self._thread.start()
+
+    def is_port_open(self):
+        """Logisch open: berichten worden ook zonder verbinding geaccepteerd."""
+        return self._open
+
+    @property
+    def connected(self):
+        return self._midiout is not None
+
+    def send_message(self, message):
+        midiout = self._midiout
+        if midiout is not None:
+            try:
+                midiout.send_message(message)
+                return
+            except jj_midi.MidiSystemError as e:
+                self._disconnect(f"verzenden mislukt: {e}")
+        with self._lock:
+            # De thread kan net opnieuw verbonden zijn; dan direct versturen
+            if self._midiout is not None:
+                self._midiout.send_message(message)
+            elif self._connecting or self.when_disconnected == "buffer":
+                if len(self._pending) == self._pending.maxlen:
+                    self.dropped_count += 1
+                self._pending.append(list(message))
+            else:
+                self.dropped_count += 1
+
+    def _connect(self):
+        self.registry.refresh()
+        match = self.registry.find(self.port_name)
+        if match is None:
+            return False
+        index, full_name = match
+        try:
+            midiout = self.registry.midiout_factory()
+            midiout.open_port(index)
+        except jj_midi.MidiSystemError as e:
+            log.warning(f"Kan MIDI-poort {full_name} nog niet openen: {e}", key=f"open_failed:{full_name}")
+            return False
+        # De wachtrij buiten de lock versturen, zodat send_message() niet op een trage poort wacht.
+        # Tot de wachtrij leeg is, gaan nieuwe berichten er achteraan (volgorde blijft behouden);
+        # pas dan wordt de poort onder de lock ingewisseld.
+        with self._lock:
+            self._connecting = True
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._midiout = midiout
+                    self._connecting = False
+                    self.connected_port = full_name
+                    self.connect_count += 1
+                    break
+                batch = list(self._pending)
+                self._pending.clear()
+            sent = 0
+            try:
+                for message in batch:
+                    midiout.send_message(message)
+                    sent += 1
+            except jj_midi.MidiSystemError:
+                with self._lock:
+                    # Het onverstuurde deel terug vooraan; past het niet meer, dan vervallen de nieuwste
+                    unsent = batch[sent:]
+                    self.dropped_count += max(0, len(self._pending) + len(unsent) - self._pending.maxlen)
+                    self._pending.extendleft(reversed(unsent))
+                    self._connecting = False
+                midiout.close_port()
+                return False
+        log.info(f"MIDI-poort verbonden: {full_name}")
+        return True
+
+    def _disconnect(self, reason=None):
+        with self._lock:
+            midiout, self._midiout = self._midiout, None
+        if midiout is None:
+            return
+        if reason is not None:
+            self.disconnect_count += 1
+            log.warning(f"MIDI-poort {self.connected_port} niet meer bereikbaar ({reason}); opnieuw verbinden op de achtergrond.")
+        try:
+            midiout.close_port()
+        except jj_midi.MidiSystemError:
+            pass
+
+    def _run(self):
+        while not self._stop.wait(self.retry_interval_s):
+            if self._midiout is None:
+                self._connect()
+            elif self.registry.refresh():
+                # rtmidi meldt een verdwenen ALSA-poort niet altijd bij het verzenden;
+                # controleer daarom bij elke wijziging of de poort nog in de lijst staat.
+                match = self.registry.find(self.port_name)
+                if match is None or match[1] != self.connected_port:
+                    self._disconnect("poort verdwenen")
+                    self._connect()
+
+    def close_port(self):
+        if not self._open:
+            return
+        self._open = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._disconnect()
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "port": self.connected_port,
+            "connects": self.connect_count,
+            "disconnects": self.disconnect_count,
+            "pending": len(self._pending),
+            "dropped": self.dropped_count,
+        }
@@ -0,0 +1,252 @@
+import mmap
+import os
+import struct
+import time
+
+from modules import jj_log
+from modules import jj_optional
+from modules import jj_ultrasonic as us
+
+log = jj_log.get_logger("recording")
+
+# Bestandsformaat: een header van 16 bytes gevolgd door records van vaste breedte (16 bytes).
+#   header: magic b"JJUS", versie (uint16), recordgrootte (uint16), starttijd (float64, epoch)
+#   record: tijdstempel in ns sinds start (int64), pulsduur in ns (uint32, NO_ECHO bij een timeout),
+#           sensor-id (uint16), vlaggen (uint16)
+MAGIC = b"JJUS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHd")
+RECORD = struct.Struct("<qIHH")
+NO_ECHO = 0xFFFFFFFF
+
+# Velden van een record als NumPy-dtype (zie load_session())
+RECORD_FIELDS = [("timestamp_ns", "<i8"), ("pulse_ns", "<u4"), ("sensor_id", "<u2"), ("flags", "<u2")]
+
+
+class SessionRecorder:
+    """
+    Schrijft ruwe echo-pulsduren met tijdstempel naar een append-only binair logbestand.
+
+    Records worden in een vooraf gealloceerde buffer verzameld en per flush_every records
+    weggeschreven. Een bestaand bestand wordt aangevuld; de tijdstempels lopen dan door
+    vanaf de starttijd in de header.
+    """
+
+    def __init__(self, path, flush_every=256):
+        self.path = path
+        self.flush_every = flush_every
+        self._buffer = bytearray(RECORD.size * flush_every)
+        self._buffered = 0
+        self.record_count = 0
+
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        exists = size >= HEADER.size
+        if exists:
+            start_epoch = read_header(path)
+        self._file = open(path, "ab")
+        if exists:
+            # Een half geschreven laatste record (bijv. na een stroomonderbreking) zou alle
+            # volgende records verschuiven: kap het bestand af op een recordgrens
+            partial = (size - HEADER.size) % RECORD.size
+            if partial:
+                self._file.truncate(size - partial)
+        else:
+            start_epoch = time.time()
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, start_epoch))
+        # Koppel perf_counter_ns aan de starttijd van de sessie
+        self._origin_ns = time.perf_counter_ns() - int((time.time() - start_epoch) * 1e9)
+
+    def record(self, pulse_s, sensor_id=0, flags=0, timestamp_ns=None):
+        """
+        Legt één meting vast.
+
+        Args:
+            pulse_s (float): De echo-pulsduur in seconden, of None bij een timeout.
+            sensor_id (int, optional): Nummer van de sensor (bijv. de index in een SensorArray).
+            flags (int, optional): Vrij te gebruiken vlaggen.
+            timestamp_ns (int, optional): perf_counter_ns() van de meting; standaard nu.
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        pulse_ns = NO_ECHO if pulse_s is None else min(int(pulse_s * 1e9), NO_ECHO - 1)
+        RECORD.pack_into(self._buffer, self._buffered * RECORD.size,
+                         timestamp_ns - self._origin_ns, pulse_ns, sensor_id, flags)
+        self._buffered += 1
+        self.record_count += 1
+        if self._buffered == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._buffered:
+            self._file.write(memoryview(self._buffer)[:self._buffered * RECORD.size])
+            self._buffered = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __del__(self):
+        if hasattr(self, "_file"):
+            self.close()
+
+
+def read_header(path):
+    """Controleert de header van een sessiebestand en geeft de starttijd (epoch) terug."""
+    with open(path, "rb") as f:
+        magic, version, record_size, start_epoch = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path} is geen geldig sessiebestand (versie {VERSION}).")
+    return start_epoch
+
+
+def load_session(path):
+    """
+    Geeft alle records van een sessie als NumPy structured array (memory-mapped, zonder kopie).
+    Velden: timestamp_ns, pulse_ns (NO_ECHO bij een timeout), sensor_id, flags.
+    """
+    np = jj_optional.load_numpy()
+    if np is None:
+        raise RuntimeError("load_session() vereist NumPy; gebruik anders ReplaySensor.")
+    read_header(path)
+    count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+    return np.memmap(path, dtype=np.dtype(RECORD_FIELDS), mode="r", offset=HEADER.size, shape=(count,))
+
+
+class RecordingSensor:
+    """
+    Zet een recorder achter een UltrasonicSensor: get_distance() werkt zoals altijd,
+    maar elke ruwe pulsduur (of timeout) wordt ook in het sessiebestand vastgelegd.
+    """
+
+    def __init__(self, sensor, recorder, sensor_id=0):
+        self.sensor = sensor
+        self.recorder = recorder
+        self.sensor_id = sensor_id
+
+    def get_distance(self):
+        try:
+            pulse_duration = self.sensor._get_raw_pulse_duration()
+        except RuntimeError as e:
+            self.recorder.record(None, self.sensor_id)
+            log.warning(f"Sensor Error: {e}", key=f"recording_error:{self.sensor_id}:{e}", sensor=self.sensor_id)
+            return None
+        self.recorder.record(pulse_duration, self.sensor_id)
+        return self.sensor.pulse_to_distance(pulse_duration)
+
+    def __getattr__(self, name):
+        return getattr(self.sensor, name)
+
+
+class ReplaySensor(us.UltrasonicSensor):
+    """
+    Speelt een opgenomen sessie af met dezelfde interface als UltrasonicSensor.
+
+    Met realtime=True wordt gewacht tot het tijdstip van elk record (gedeeld door speed);
+    anders gaat het zo snel als mogelijk, bijv. om de mapping- en MIDI-keten offline te benchmarken.
+    Na het laatste record geeft get_distance() None terug en staat finished op True,
+    tenzij loop=True.
+    """
+
+    def __init__(self, path, unit="cm", realtime=False, speed=1.0, loop=False, sensor_id=None,
+                 metrics=None, compensator=None):
+        """
+        Args:
+            path (str): Het sessiebestand.
+            unit (str, optional): 'cm' of 'm'.
+            realtime (bool, optional): Speel af in het oorspronkelijke tempo.
+            speed (float, optional): Versnellingsfactor voor realtime afspelen.
+            loop (bool, optional): Begin opnieuw na het laatste record.
+            sensor_id (int, optional): Speel alleen records van deze sensor af.
+            metrics (Instrumentation, optional): Legt 'echo_width' per afgespeelde meting vast.
+            compensator (SpeedOfSoundCompensator, optional): Temperatuurcompensatie, zie UltrasonicSensor.
+        """
+        self.unit = unit.lower()
+        if self.unit not in ["cm", "m"]:
+            raise ValueError("Ongeldige eenheid. Kies 'cm' of 'm'.")
+        read_header(path)
+        self.path = path
+        self.realtime = realtime
+        self.speed = speed
+        self.loop = loop
+        self.sensor_id = sensor_id
+        self.metrics = metrics
+        self.timeout_count = 0
+        self.compensator = compensator
+        self.trig_pin = self.echo_pin = None
+        self.capture = "replay"
+        self.timeout_s = 0.0
+        self.finished = False
+
+        self._file = open(path, "rb")
+        size = os.path.getsize(path)
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.record_count = (size - HEADER.size) // RECORD.size
+        self._closed = False
+        self.rewind()
+
+    @property
+    def MIN_RETRIGGER_S(self):
+        # Offline afspelen hoeft niet op de sensor te wachten (ook niet in measure_burst())
+        return us.UltrasonicSensor.MIN_RETRIGGER_S if self.realtime else 0.0
+
+    def rewind(self):
+        """Begint weer bij het eerste record."""
+        self._position = 0
+        self._replay_start_ns = None
+        self._first_timestamp_ns = None
+        self.finished = False
+
+    def _next_record(self):
+        scanned = 0
+        while True:
+            if self._position >= self.record_count:
+                if not self.loop or not self.record_count:
+                    self.finished = True
+                    return None
+                self.rewind()
+            if scanned == self.record_count:
+                # Een volledige ronde zonder record van deze sensor: niet eindeloos blijven zoeken
+                self.finished = True
+                return None
+            scanned += 1
+            record = RECORD.unpack_from(self._map, HEADER.size + self._position * RECORD.size)
+            self._position += 1
+            if self.sensor_id is None or record[2] == self.sensor_id:
+                return record
+
+    def _get_raw_pulse_duration(self):
+        record = self._next_record()
+        if record is None:
+            raise RuntimeError("Einde van de opname bereikt.")
+        timestamp_ns, pulse_ns = record[0], record[1]
+
+        if self.realtime:
+            now_ns = time.perf_counter_ns()
+            if self._replay_start_ns is None:
+                self._replay_start_ns = now_ns
+                self._first_timestamp_ns = timestamp_ns
+            due_ns = self._replay_start_ns + (timestamp_ns - self._first_timestamp_ns) / self.speed
+            if due_ns > now_ns:
+                time.sleep((due_ns - now_ns) / 1e9)
+
+        if pulse_ns == NO_ECHO:
+            self.timeout_count += 1
+            raise us.EchoTimeout("Echo timeout: Geen echo ontvangen (opgenomen).")
+        if self.metrics is not None:
+            self.metrics.record("echo_width", pulse_ns)
+        return pulse_ns / 1e9
+
+    def get_distance(self):
+        if self.finished:
+            return None
+        return super().get_distance()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
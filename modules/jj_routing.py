@@ -0,0 +1,313 @@
+import collections
+
+from modules import jj_log
+from modules import jj_midi
+from modules import jj_mapping as mapping
+
+log = jj_log.get_logger("routing")
+
+# Eén regel in de routeringsmatrix: sensor -> (poort, kanaal, berichttype, controller).
+# mapper zet de afstand om naar de uitvoerwaarde (standaard een DistanceMapper voor het type);
+# velocity geldt alleen voor noten.
+Route = collections.namedtuple("Route", ["sensor", "port", "channel", "kind", "controller", "mapper", "velocity"])
+
+KINDS = ("cc", "note", "pitch_bend", "program")
+MERGE_RULES = ("last", "min", "max", "avg")
+
+# Uitvoerbereik per berichttype (voor begrenzing) en het doel van de standaard-DistanceMapper
+_VALUE_RANGES = {"cc": (0, 127), "note": (0, 127), "pitch_bend": (-8192, 8191), "program": (0, 127)}
+_MAPPER_TARGETS = {"cc": "cc", "note": "note", "pitch_bend": "pitch_bend", "program": "cc"}
+
+
+def _make_emitter(kind, channel, controller, velocity, send):
+    """Bouwt een functie value -> MIDI-bericht(en) voor één bestemming, met vooraf berekende statusbytes."""
+    if kind == "cc":
+        status = 0xB0 | channel
+        return lambda value, last: send([status, controller, value])
+    if kind == "program":
+        status = 0xC0 | channel
+        return lambda value, last: send([status, value])
+    if kind == "pitch_bend":
+        status = 0xE0 | channel
+
+        def emit_bend(value, last):
+            converted = value + 8192
+            send([status, converted & 0x7F, (converted >> 7) & 0x7F])
+        return emit_bend
+
+    note_on, note_off = 0x90 | channel, 0x80 | channel
+
+    def emit_note(value, last):
+        # Monofoon per bestemming: eerst de vorige noot loslaten; value None laat alleen los
+        if last is not None:
+            send([note_off, last, 0])
+        if value is not None:
+            send([note_on, value, velocity])
+    return emit_note
+
+
+def _make_update(rule, inputs, emitter, low, high, send_on_change, release_on_none=False):
+    """
+    Bouwt de functies van één bestemming. De samenvoegregel wordt hier eenmalig gekozen, zodat
+    per sample geen configuratie meer wordt bekeken. De samengevoegde waarde wordt bijgehouden
+    (som en aantal, of het huidige minimum/maximum) in plaats van per sample opnieuw over alle
+    invoer berekend.
+
+    Met release_on_none (noten) wordt de vorige waarde losgelaten zodra er geen geldige invoer
+    meer is, zodat een noot niet blijft hangen; andere typen houden dan hun laatste waarde.
+
+    Returns:
+        tuple: (update, store, flush). update(positie, waarde) verwerkt één meting en verstuurt
+        direct; store(positie, waarde) werkt alleen de samengevoegde waarde bij en flush()
+        verstuurt die, zodat een heel frame maar één bericht per bestemming oplevert.
+    """
+    values = [None] * inputs
+    state = [None]  # Laatst verstuurde waarde
+
+    def finish(value):
+        last = state[0]
+        if value is None:
+            if release_on_none and last is not None:
+                emitter(None, last)
+                state[0] = None
+            return
+        value = low if value < low else high if value > high else value
+        if send_on_change and value == last:
+            return
+        emitter(value, last)
+        state[0] = value
+
+    if inputs == 1:
+        def update(position, value):
+            finish(value)
+
+        def store(position, value):
+            values[0] = value
+
+        def flush():
+            finish(values[0])
+        return update, store, flush
+
+    present = [0]  # Aantal posities met een geldige waarde
+
+    def store_value(position, value):
+        """Zet de waarde van een positie en houdt het aantal geldige waarden bij; geeft de oude waarde."""
+        old = values[position]
+        values[position] = value
+        present[0] += (value is not None) - (old is not None)
+        return old
+
+    if rule == "last":
+        latest = [None]  # Laatste geldige waarde sinds de vorige flush()
+
+        def update(position, value):
+            store_value(position, value)
+            if value is not None:
+                finish(value)
+            elif not present[0]:
+                finish(None)
+
+        def store(position, value):
+            store_value(position, value)
+            if value is not None:
+                latest[0] = value
+
+        def flush():
+            if latest[0] is not None:
+                finish(latest[0])
+                latest[0] = None
+            elif not present[0]:
+                finish(None)
+        return update, store, flush
+
+    if rule == "avg":
+        total = [0]
+
+        def store(position, value):
+            old = store_value(position, value)
+            total[0] += (0 if value is None else value) - (0 if old is None else old)
+
+        def flush():
+            finish(int(round(total[0] / present[0])) if present[0] else None)
+
+        # Per sample (route()) zonder de extra aanroepen van store() en flush()
+        def update(position, value):
+            old = store_value(position, value)
+            total[0] += (0 if value is None else value) - (0 if old is None else old)
+            finish(int(round(total[0] / present[0])) if present[0] else None)
+        return update, store, flush
+
+    smaller = rule == "min"
+    best = [None]  # Huidige minimum of maximum
+
+    def store(position, value):
+        old = store_value(position, value)
+        current = best[0]
+        if value is not None and (current is None or (value <= current if smaller else value >= current)):
+            best[0] = value
+        elif old is not None and old == current:
+            # De positie met het uiterste is slechter geworden of weggevallen: opnieuw zoeken
+            current = None
+            for v in values:
+                if v is not None and (current is None or (v < current if smaller else v > current)):
+                    current = v
+            best[0] = current
+
+    def flush():
+        finish(best[0])
+
+    def update(position, value):
+        store(position, value)
+        finish(best[0])
+    return update, store, flush
+
+
+class RoutingMatrix:
+    """
+    Verdeelt metingen van meerdere sensoren over MIDI-bestemmingen (poort, kanaal, type, controller).
+
+    Eén sensor kan naar meerdere bestemmingen gaan, en meerdere sensoren naar één bestemming;
+    die worden dan samengevoegd met een regel: 'last' (laatste meting wint), 'min', 'max' of 'avg'.
+    Ontbrekende metingen (None, buiten bereik) tellen bij het samenvoegen niet mee; heeft een
+    notenbestemming helemaal geen geldige invoer meer, dan wordt de klinkende noot losgelaten.
+
+        matrix = RoutingMatrix({"synth": sender_a, "fx": sender_b})
+        matrix.add_route("links", "synth", channel=0, kind="note")
+        matrix.add_route("links", "fx", channel=1, kind="cc", controller=74)
+        matrix.add_route("rechts", "fx", channel=1, kind="cc", controller=74, merge="max")
+        matrix.compile()
+        links = matrix.sensor_index("links")
+        matrix.route(links, afstand)   # per sample
+
+    compile() bouwt een platte tabel: per sensorindex een tuple van
+    (mapper, ((positie, update, store, flush), ...)), met statusbytes, begrenzing en samenvoegregel
+    al ingevuld in die functies. route() doet per sample dus alleen een lijstindex, één mapping per
+    mapper en een paar functieaanroepen. route_frame() voegt eerst alle metingen van het frame
+    samen en verstuurt daarna per geraakte bestemming één keer.
+    """
+
+    def __init__(self, ports, merge="last", send_on_change=True):
+        """
+        Args:
+            ports (dict): Poortnaam -> MidiSender (met een geopende poort), of een rtmidi.MidiOut-achtig object.
+            merge (str, optional): Standaard samenvoegregel voor bestemmingen met meerdere bronnen.
+            send_on_change (bool, optional): Verstuur alleen als de (samengevoegde) waarde verandert.
+        """
+        if merge not in MERGE_RULES:
+            raise ValueError(f"Ongeldige samenvoegregel '{merge}'. Kies uit {MERGE_RULES}.")
+        self.ports = dict(ports)
+        self.merge = merge
+        self.send_on_change = send_on_change
+        self.routes = []
+        self._merge_rules = {}  # bestemming -> samenvoegregel
+        self._default_mappers = {}  # berichttype -> gedeelde DistanceMapper.map_distance
+        self._sensors = {}      # sensor -> index (na compile())
+        self._table = []
+
+    def add_route(self, sensor, port, channel=0, kind="cc", controller=0, mapper=None, velocity=100,
+                  merge=None):
+        """
+        Voegt een route toe. Roep daarna (opnieuw) compile() aan.
+
+        Args:
+            sensor: Naam of nummer van de sensor.
+            port (str): Naam van de poort (sleutel in ports).
+            channel (int, optional): MIDI-kanaal (0-15).
+            kind (str, optional): 'cc', 'note', 'pitch_bend' of 'program'.
+            controller (int, optional): Controllernummer (alleen voor 'cc').
+            mapper (callable, optional): Afstand -> waarde (of None). Standaard een DistanceMapper voor het type.
+            velocity (int, optional): Velocity voor noten.
+            merge (str, optional): Samenvoegregel voor deze bestemming; standaard die van de matrix.
+        """
+        if port not in self.ports:
+            raise ValueError(f"Onbekende poort '{port}'. Kies uit {tuple(self.ports)}.")
+        if kind not in KINDS:
+            raise ValueError(f"Ongeldig berichttype '{kind}'. Kies uit {KINDS}.")
+        if not (0 <= channel <= 15 and 0 <= controller <= 127 and 0 <= velocity <= 127):
+            raise ValueError("Ongeldige MIDI-parameters. Kanaal (0-15), Controller (0-127), Velocity (0-127).")
+        merge = merge or self.merge
+        if merge not in MERGE_RULES:
+            raise ValueError(f"Ongeldige samenvoegregel '{merge}'. Kies uit {MERGE_RULES}.")
+        destination = self._destination(port, channel, kind, controller)
+        if self._merge_rules.get(destination, merge) != merge:
+            raise ValueError(f"Bestemming {destination} heeft al samenvoegregel '{self._merge_rules[destination]}'.")
+        self._merge_rules[destination] = merge
+        if mapper is None:
+            mapper = self._default_mappers.get(kind)
+            if mapper is None:
+                mapper = self._default_mappers[kind] = mapping.DistanceMapper(target=_MAPPER_TARGETS[kind]).map_distance
+                mapper(100.0)  # Bouwt de tabel nu, niet bij het eerste sample
+        self.routes.append(Route(sensor, port, channel, kind, controller, mapper, velocity))
+
+    @staticmethod
+    def _destination(port, channel, kind, controller):
+        return (port, channel, kind, controller if kind == "cc" else 0)
+
+    def _send_function(self, port):
+        target = self.ports[port]
+        if isinstance(target, jj_midi.MidiSender):
+            if not target._is_ready():
+                raise RuntimeError(f"MIDI-poort '{port}' is niet geopend.")
+            # Zoals CoalescingMidiSender: direct naar de uitvoer, met metrics als die er zijn
+            send_message = target.midiout.send_message if target.metrics is None else target._timed_send
+        else:
+            send_message = target.send_message
+
+        def send(message):
+            try:
+                send_message(message)
+            except jj_midi.MidiSystemError as e:
+                log.error(f"Fout bij het verzenden van MIDI-bericht naar {port}: {e}", key=f"send_error:{port}")
+        return send
+
+    def compile(self):
+        """Bouwt de platte verzendtabel uit de routes. Geeft het aantal bestemmingen terug."""
+        sensors = {}
+        for route in self.routes:
+            sensors.setdefault(route.sensor, len(sensors))
+
+        by_destination = collections.defaultdict(list)
+        for route in self.routes:
+            by_destination[self._destination(route.port, route.channel, route.kind, route.controller)].append(route)
+
+        entries = [{} for _ in sensors]  # per sensor: mapper -> [(positie, update, store, flush), ...]
+        sends = {port: self._send_function(port) for port in {route.port for route in self.routes}}
+        for destination, routes in by_destination.items():
+            first = routes[0]
+            low, high = _VALUE_RANGES[first.kind]
+            emitter = _make_emitter(first.kind, first.channel, first.controller, first.velocity, sends[first.port])
+            functions = _make_update(self._merge_rules[destination], len(routes), emitter, low, high,
+                                     self.send_on_change, release_on_none=first.kind == "note")
+            for position, route in enumerate(routes):
+                entries[sensors[route.sensor]].setdefault(route.mapper, []).append((position,) + functions)
+
+        self._sensors = sensors
+        self._table = [tuple((mapper, tuple(targets)) for mapper, targets in entry.items()) for entry in entries]
+        return len(by_destination)
+
+    def sensor_index(self, sensor):
+        """Index van een sensor in de verzendtabel (na compile()), voor route()."""
+        return self._sensors[sensor]
+
+    def route(self, sensor_index, distance):
+        """Verwerkt één meting (None bij een mislukte meting) van de sensor met deze index."""
+        for mapper, targets in self._table[sensor_index]:
+            value = None if distance is None else mapper(distance)
+            for position, update, store, flush in targets:
+                update(position, value)
+
+    def route_frame(self, distances):
+        """
+        Verwerkt één meting per sensor, in de volgorde van sensor_index(). Eerst worden alle
+        metingen samengevoegd, daarna gaat per geraakte bestemming één bericht uit, zodat er geen
+        tussenwaarden (of opnieuw aangeslagen noten) worden verstuurd.
+        """
+        touched = {}  # flush -> None; een dict houdt de volgorde vast
+        for entries, distance in zip(self._table, distances):
+            for mapper, targets in entries:
+                value = None if distance is None else mapper(distance)
+                for position, update, store, flush in targets:
+                    store(position, value)
+                    touched[flush] = None
+        for flush in touched:
+            flush()
@@ -0,0 +1,236 @@
+import time
+
+from modules import jj_gpio
+from modules import jj_health as health
+from modules import jj_ultrasonic as us
+
+class SensorArray:
+    """
+    Scheduler voor meerdere HC-SR04 sensoren op één Raspberry Pi.
+
+    De array beheert alle pinnen via één gedeelde GPIO-backend en vuurt de sensoren af in
+    'slots'. Sensoren in hetzelfde slot worden vlak na elkaar getriggerd en hun echo's worden
+    tegelijk afgewacht; slots komen na elkaar aan de beurt (round-robin). Standaard heeft elke
+    sensor een eigen slot, zodat de ping van de ene sensor niet in de echo van de andere valt.
+    Sensoren die ver genoeg uit elkaar staan kun je met build_slots() in één slot zetten.
+
+    Met health_options krijgt elke sensor een SensorHealth met circuit breaker: een sensor die
+    steeds faalt wordt overgeslagen (alleen af en toe een probe), zodat hij de gezonde sensoren
+    geen echo-timeouts en meettijd kost.
+    """
+
+    def __init__(self, pins, gpio=None, unit="cm", timeout_s=0.03, slots=None,
+                 min_interval_s=0.06, guard_s=0.002, health_options=None):
+        """
+        Initialiseert de sensorarray.
+
+        Args:
+            pins (list): Lijst van (trig_pin, echo_pin) tuples, één per sensor.
+            gpio (GPIOBackend, optional): De GPIO-backend. Standaard jj_gpio.create_backend().
+            unit (str, optional): Eenheid van de afstanden ('cm' of 'm'). Standaard is 'cm'.
+            timeout_s (float, optional): Maximale wachttijd op de echo's van een slot.
+                                         Standaard 0.03s (ruim boven de ~25ms van 4m heen en terug).
+            slots (list, optional): Lijst van lijsten met sensorindexen die samen vuren.
+                                    Standaard krijgt elke sensor een eigen slot.
+            min_interval_s (float, optional): Minimale tijd tussen twee triggers van dezelfde sensor.
+                                              Standaard 0.06s (aanbevolen meetcyclus HC-SR04).
+            guard_s (float, optional): Rusttijd na elk slot zodat late echo's kunnen uitsterven.
+            health_options (dict, optional): Argumenten voor een SensorHealth per sensor (bijv.
+                                             {"on_event": HealthReporter()}); {} voor de standaardwaarden.
+                                             Standaard (None) geen gezondheidsbewaking.
+        """
+        if not pins:
+            raise ValueError("Geef minstens één (trig_pin, echo_pin) paar op.")
+
+        self._owns_gpio = gpio is None
+        self.gpio = gpio if gpio is not None else jj_gpio.create_backend()
+        self.timeout_s = timeout_s
+        self.min_interval_s = min_interval_s
+        self.guard_s = guard_s
+
+        self.sensors = [
+            us.UltrasonicSensor(trig, echo, unit=unit, timeout_s=timeout_s, gpio=self.gpio,
+                                capture="edge", settle_s=0.5)  # Stabiliseren gebeurt pas vóór de eerste trigger
+            for trig, echo in pins
+        ]
+
+        if slots is None:
+            slots = [[i] for i in range(len(self.sensors))]
+        seen = sorted(i for slot in slots for i in slot)
+        if seen != list(range(len(self.sensors))):
+            raise ValueError("Elke sensor moet precies één keer in de slots voorkomen.")
+        self.slots = [list(slot) for slot in slots]
+
+        self.health = None
+        if health_options is not None:
+            self.health = [health.SensorHealth(i, **health_options) for i in range(len(self.sensors))]
+
+        self.distances = [None] * len(self.sensors)
+        self._last_trigger = [0.0] * len(self.sensors)
+        self._next_slot = 0
+        self.measurement_count = 0
+        self.timeout_count = 0
+        self._started_at = None
+
+    @staticmethod
+    def build_slots(positions, min_separation):
+        """
+        Groepeert sensoren in slots zodat sensoren binnen een slot minstens min_separation
+        van elkaar af staan (eenvoudige greedy kleuring).
+
+        Args:
+            positions (list): Positie per sensor als (x, y) tuple, in dezelfde eenheid als min_separation.
+            min_separation (float): Minimale onderlinge afstand om tegelijk te mogen vuren.
+        Returns:
+            list: Lijst van slots (lijsten met sensorindexen).
+        """
+        slots = []
+        for i, (x, y) in enumerate(positions):
+            for slot in slots:
+                if all(((x - positions[j][0]) ** 2 + (y - positions[j][1]) ** 2) ** 0.5 >= min_separation
+                       for j in slot):
+                    slot.append(i)
+                    break
+            else:
+                slots.append([i])
+        return slots
+
+    def measure_slot(self, slot_index):
+        """
+        Vuurt alle sensoren van één slot af en wacht op hun echo's.
+
+        Returns:
+            dict: Sensorindex -> afstand (of None bij een timeout). Sensoren waarvan de breaker open
+                  staat worden niet gemeten en ontbreken in de dict (een leeg slot kost geen tijd).
+        """
+        slot = self.slots[slot_index]
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        if self.health is not None:
+            now = time.perf_counter()
+            skipped = [i for i in slot if not self.health[i].allow(now)]
+            if skipped:
+                for i in skipped:
+                    self.distances[i] = None
+                slot = [i for i in slot if i not in skipped]
+                if not slot:
+                    return {}
+
+        # Respecteer de minimale hertrigger-tijd van elke sensor in het slot
+        ready_at = max(self._last_trigger[i] for i in slot) + self.min_interval_s
+        delay = ready_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        for i in slot:
+            self._last_trigger[i] = time.perf_counter()
+            self.sensors[i].start_measurement()
+
+        deadline = time.perf_counter() + self.timeout_s
+        results = {}
+        for i in slot:
+            sensor = self.sensors[i]
+            try:
+                pulse = sensor.wait_pulse_duration(deadline - time.perf_counter())
+                results[i] = sensor.pulse_to_distance(pulse)
+                outcome = health.OK
+            except RuntimeError as e:
+                results[i] = None
+                self.timeout_count += 1
+                outcome = health.TIMEOUT if isinstance(e, us.EchoTimeout) else health.ERROR
+            if self.health is not None:
+                tracker = self.health[i]
+                if outcome == health.OK:
+                    outcome = tracker.classify(results[i], sensor.unit)
+                tracker.record(outcome)
+            self.distances[i] = results[i]
+            self.measurement_count += 1
+
+        if self.guard_s > 0:
+            time.sleep(self.guard_s)
+        return results
+
+    def poll(self):
+        """
+        Meet het volgende slot in de round-robin volgorde.
+
+        Returns:
+            dict: Sensorindex -> afstand (of None) voor de sensoren in dat slot. Slots zonder
+                  meetbare sensor worden overgeslagen; staan alle breakers open, dan wacht poll()
+                  tot de eerstvolgende probe.
+        """
+        while True:
+            for _ in range(len(self.slots)):
+                results = self.measure_slot(self._next_slot)
+                self._next_slot = (self._next_slot + 1) % len(self.slots)
+                if results or self.health is None:
+                    return results
+            self._wait_for_probe()
+
+    def _wait_for_probe(self):
+        """Slaapt tot de eerste sensor met een open breaker weer een probe mag doen."""
+        probes = [tracker.next_probe_at for tracker in self.health if tracker.state == "open"]
+        if len(probes) == len(self.health):
+            delay = min(probes) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def measure_all(self):
+        """
+        Doorloopt alle slots één keer.
+
+        Returns:
+            list: Afstand per sensor (None bij een timeout).
+        """
+        measured = False
+        for slot_index in range(len(self.slots)):
+            measured = bool(self.measure_slot(slot_index)) or measured
+        self._next_slot = 0
+        if not measured and self.health is not None:
+            self._wait_for_probe()  # Geen enkele sensor gemeten: niet in een lege lus blijven draaien
+        return list(self.distances)
+
+    def run(self, callback, cycles=None):
+        """
+        Meet continu (of cycles keer alle slots) en roept callback(index, afstand) aan per meting.
+        """
+        done = 0
+        while cycles is None or done < cycles:
+            measured = False
+            for slot_index in range(len(self.slots)):
+                for i, distance in self.measure_slot(slot_index).items():
+                    measured = True
+                    callback(i, distance)
+            if not measured and self.health is not None:
+                self._wait_for_probe()
+            done += 1
+
+    def measurement_rate(self):
+        """Geeft het geaggregeerde aantal metingen per seconde sinds de eerste meting."""
+        if self._started_at is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._started_at
+        return self.measurement_count / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Geeft een dict met meetaantallen, timeouts en de geaggregeerde meetsnelheid."""
+        return {
+            "sensors": len(self.sensors),
+            "slots": len(self.slots),
+            "measurements": self.measurement_count,
+            "timeouts": self.timeout_count,
+            "rate_hz": self.measurement_rate(),
+            "health": None if self.health is None else [tracker.stats() for tracker in self.health],
+        }
+
+    def close(self):
+        """Geeft alle pinnen van de array vrij."""
+        for sensor in self.sensors:
+            sensor.close()
+        self.sensors = []
+        if self._owns_gpio:
+            self.gpio.cleanup()
+
+    def __del__(self):
+        if getattr(self, "sensors", None):
+            self.close()
@@ -0,0 +1,263 @@
+import collections
+import gc
+import math
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# Indeling van het gedeelde geheugen: een header van 64 bytes gevolgd door `capacity` records.
+#   header: schrijfteller (uint64, sequencenummer van het laatst gepubliceerde record), capaciteit (uint64)
+#   record: sequencenummer (uint64), tijdstempel perf_counter_ns (int64), afstand (float64, NaN bij
+#           een mislukte meting), sensor-id (uint16), vlaggen (uint16), opvulling, sequencenummer (uint64)
+# Het sequencenummer staat aan begin én eind. De schrijver zet het eerste eerst op 0 (slot wordt
+# geschreven), schrijft dan de rest en zet het pas als laatste op het nieuwe nummer. Een lezer
+# accepteert een record alleen als beide nummers kloppen én de schrijfteller na het kopiëren laat
+# zien dat de schrijver het slot nog niet opnieuw kan zijn gaan beschrijven (zie RingReader.read).
+# Python kent geen geheugenbarrières; op ARM kunnen schrijfacties in theorie in een andere volgorde
+# zichtbaar worden. De controle achteraf op de schrijfteller vangt een ingehaalde lezer altijd af.
+HEADER_SIZE = 64
+COUNTER = struct.Struct("<Q")
+CAPACITY = struct.Struct("<Q")
+SEQUENCE = struct.Struct("<Q")
+RECORD = struct.Struct("<QqdHH4xQ")
+
+RingRecord = collections.namedtuple("RingRecord", ["sequence", "timestamp_ns", "distance", "sensor_id", "flags"])
+
+_CREATED = set()  # Namen van de ringen die dit proces heeft aangemaakt
+
+
+def _attach(name, untrack):
+    """
+    Koppelt aan een bestaand blok. Vóór Python 3.13 registreert elke koppeling het blok bij de
+    resource tracker, die het bij afsluiten van een los lezerproces zou opruimen terwijl de
+    schrijver het nog gebruikt; met untrack wordt die registratie weer ingetrokken. Processen
+    die de tracker van de aanmaker delen (kindprocessen, of de aanmaker zelf) mogen dat niet doen.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        if untrack:
+            resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class SharedRing:
+    """
+    Ringbuffer met records van vaste grootte in multiprocessing.shared_memory, voor één schrijver
+    en een willekeurig aantal lezers (elk met een eigen RingReader).
+
+    De schrijver schrijft een record en publiceert daarna de schrijfteller; er zijn geen locks.
+    Een lezer die te ver achterloopt, slaat de overschreven records over (en telt ze).
+    """
+
+    def __init__(self, name=None, capacity=1024, create=True, untrack=None):
+        """
+        Args:
+            name (str, optional): Naam van het gedeelde geheugenblok; standaard een unieke naam.
+            capacity (int, optional): Aantal records in de ring (alleen bij create=True).
+            create (bool, optional): Maak een nieuw blok aan, of koppel aan een bestaand blok.
+            untrack (bool, optional): Zie _attach(); standaard alleen als dit proces de ring niet aanmaakte.
+        """
+        if create:
+            self._block = shared_memory.SharedMemory(name=name, create=True,
+                                                     size=HEADER_SIZE + capacity * RECORD.size)
+            COUNTER.pack_into(self._block.buf, 0, 0)
+            CAPACITY.pack_into(self._block.buf, 8, capacity)
+            _CREATED.add(self._block.name)
+        else:
+            self._block = _attach(name, name not in _CREATED if untrack is None else untrack)
+            capacity = CAPACITY.unpack_from(self._block.buf, 8)[0]
+        self.name = self._block.name
+        self.capacity = capacity
+        self._owner = create
+        self._buf = self._block.buf
+        self._next = COUNTER.unpack_from(self._buf, 0)[0] + 1
+
+    def write(self, distance, sensor_id=0, flags=0, timestamp_ns=None):
+        """Schrijft één meting (distance None bij een mislukte meting) en publiceert die."""
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        buf, sequence = self._buf, self._next
+        offset = HEADER_SIZE + (sequence % self.capacity) * RECORD.size
+        SEQUENCE.pack_into(buf, offset, 0)  # Markeer het slot als 'wordt geschreven'
+        RECORD.pack_into(buf, offset, 0, timestamp_ns, math.nan if distance is None else distance,
+                         sensor_id, flags, sequence)
+        SEQUENCE.pack_into(buf, offset, sequence)
+        COUNTER.pack_into(buf, 0, sequence)
+        self._next = sequence + 1
+
+    def head(self):
+        """Sequencenummer van het laatst gepubliceerde record (0 als de ring nog leeg is)."""
+        return COUNTER.unpack_from(self._buf, 0)[0]
+
+    def close(self):
+        if self._block is None:
+            return
+        self._buf = None
+        self._block.close()
+        if self._owner:
+            self._block.unlink()
+            _CREATED.discard(self.name)
+        self._block = None
+
+
+class RingReader:
+    """
+    Leest nieuwe records uit een SharedRing, ook vanuit een ander proces (via de naam van de ring).
+
+    get_distance() wacht op een nieuwe meting en heeft dezelfde vorm als UltrasonicSensor.get_distance(),
+    zodat de lezer direct als read_sample van een SensorMidiPipeline of in een AdaptiveSampler past.
+    """
+
+    def __init__(self, ring_or_name, poll_interval_s=0.0005, from_start=False):
+        """
+        Args:
+            ring_or_name: Een SharedRing, of de naam van een bestaande ring.
+            poll_interval_s (float, optional): Wachttijd tussen controles op nieuwe records.
+            from_start (bool, optional): Begin bij de oudste nog aanwezige record in plaats van bij nu.
+        """
+        self.ring = ring_or_name if isinstance(ring_or_name, SharedRing) else SharedRing(ring_or_name, create=False)
+        self.poll_interval_s = poll_interval_s
+        head = self.ring.head()
+        self._last = max(0, head - self.ring.capacity) if from_start else head
+        self.overrun_count = 0
+
+    def read(self):
+        """Geeft alle nieuwe records sinds de vorige aanroep (lijst van RingRecord)."""
+        ring = self.ring
+        buf, capacity = ring._buf, ring.capacity
+        head = COUNTER.unpack_from(buf, 0)[0]
+        if head - self._last > capacity:
+            self.overrun_count += head - self._last - capacity
+            self._last = head - capacity
+        copies = [RECORD.unpack_from(buf, HEADER_SIZE + (sequence % capacity) * RECORD.size)
+                  for sequence in range(self._last + 1, head + 1)]
+        # Na het kopiëren: de schrijver heeft hooguit head_after gepubliceerd en is misschien bezig
+        # met head_after + 1, dat het slot van head_after + 1 - capacity overschrijft. Alles tot en
+        # met dat nummer kan tijdens het kopiëren veranderd zijn, ook als de nummers toevallig kloppen.
+        oldest_valid = COUNTER.unpack_from(buf, 0)[0] + 2 - capacity
+        records = []
+        for sequence, (first, timestamp_ns, distance, sensor_id, flags, last) in enumerate(copies, self._last + 1):
+            if sequence < oldest_valid or first != sequence or last != sequence:
+                self.overrun_count += 1  # Ingehaald of half geschreven door de schrijver
+                continue
+            records.append(RingRecord(sequence, timestamp_ns,
+                                      None if math.isnan(distance) else distance, sensor_id, flags))
+        self._last = head
+        return records
+
+    def wait(self, timeout_s=1.0):
+        """Wacht tot er nieuwe records zijn en geeft ze terug (leeg na timeout_s)."""
+        deadline = time.perf_counter() + timeout_s
+        while True:
+            records = self.read()
+            if records or time.perf_counter() >= deadline:
+                return records
+            time.sleep(self.poll_interval_s)
+
+    def get_distance(self, timeout_s=1.0):
+        """Wacht op nieuwe metingen en geeft de nieuwste afstand (None bij een mislukte meting of timeout)."""
+        records = self.wait(timeout_s)
+        return records[-1].distance if records else None
+
+    def close(self):
+        self.ring.close()
+
+
+def _acquire(ring_name, sensor_factory, rate_hz, sensor_id, cpu, disable_gc, stop_event, ready_event):
+    """Meetlus van het acquisitieproces: meten en in de ring schrijven, verder niets."""
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+    if disable_gc:
+        # De meetlus maakt geen referentiecycli; zonder GC geen onvoorspelbare pauzes midden in een echo
+        gc.collect()
+        gc.disable()
+    ring = SharedRing(ring_name, create=False, untrack=False)  # Deelt de resource tracker van de ouder
+    sensor = sensor_factory()
+    period_s = 1.0 / rate_hz
+    next_at = time.perf_counter()
+    ready_event.set()
+    try:
+        while not stop_event.is_set():
+            timestamp_ns = time.perf_counter_ns()
+            ring.write(sensor.get_distance(), sensor_id, 0, timestamp_ns)
+            next_at += period_s
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.perf_counter()  # Achter geraakt: niet inhalen met een burst
+    finally:
+        sensor.close()
+        ring.close()
+
+
+class AcquisitionProcess:
+    """
+    Draait de sensor in een eigen proces (optioneel vastgezet op één CPU-kern) dat de metingen
+    in een SharedRing schrijft. Mapping, MIDI en logging lezen in andere processen met een
+    RingReader, zodat hun GIL, GC-pauzes of trage prints de echo-timing niet verstoren.
+
+        acquisition = AcquisitionProcess(make_sensor, rate_hz=16.0, cpu=3)
+        acquisition.start()
+        reader = acquisition.reader()   # of RingReader(acquisition.ring_name) in een ander proces
+
+    sensor_factory wordt in het acquisitieproces aangeroepen (de GPIO-pinnen horen bij dat proces);
+    gebruik een functie op moduleniveau als de startmethode 'spawn' is.
+    """
+
+    def __init__(self, sensor_factory, rate_hz=16.0, capacity=1024, sensor_id=0, cpu=None,
+                 disable_gc=True, context=None):
+        """
+        Args:
+            sensor_factory (callable): Maakt de sensor aan (iets met get_distance() en close()).
+            rate_hz (float, optional): Meetsnelheid.
+            capacity (int, optional): Aantal records in de ring.
+            sensor_id (int, optional): Sensor-id in de records.
+            cpu (int, optional): CPU-kern voor het acquisitieproces (alleen Linux).
+            disable_gc (bool, optional): Zet de garbage collector in het acquisitieproces uit.
+            context (optional): multiprocessing-context; standaard de standaardcontext.
+        """
+        self.sensor_factory = sensor_factory
+        self.rate_hz = rate_hz
+        self.sensor_id = sensor_id
+        self.cpu = cpu
+        self.disable_gc = disable_gc
+        self._context = context or multiprocessing.get_context()
+        self.ring = SharedRing(capacity=capacity)
+        self.ring_name = self.ring.name
+        self._stop = self._context.Event()
+        self._ready = self._context.Event()
+        self._process = None
+
+    def start(self, timeout_s=10.0):
+        """Start het acquisitieproces en wacht tot de sensor is geïnitialiseerd."""
+        if self._process is not None:
+            return
+        self._process = self._context.Process(
+            target=_acquire, name="jj-acquisition", daemon=True,
+            args=(self.ring_name, self.sensor_factory, self.rate_hz, self.sensor_id, self.cpu,
+                  self.disable_gc, self._stop, self._ready))
+        self._process.start()
+        if not self._ready.wait(timeout_s):
+            self.stop()
+            raise RuntimeError("Acquisitieproces is niet op tijd gestart.")
+
+    def reader(self, **kwargs):
+        """Een RingReader op de ring van dit proces (met een eigen koppeling aan het geheugenblok)."""
+        return RingReader(self.ring_name, **kwargs)
+
+    def stop(self, timeout_s=5.0):
+        if self._process is not None:
+            self._stop.set()
+            self._process.join(timeout_s)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+
+    def close(self):
+        self.stop()
+        self.ring.close()
@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+from array import array
+
+from modules import jj_log
+
+log = jj_log.get_logger("temperature")
+
+
+def speed_of_sound_cm_per_s(temperature_c, humidity=None):
+    """
+    Geeft de geluidssnelheid in lucht (cm/s) bij een temperatuur en optioneel een relatieve
+    luchtvochtigheid (%). Benadering: 331.3 * sqrt(1 + T/273.15) m/s plus ~0.0124 m/s per % RV.
+    """
+    speed = 331.3 * math.sqrt(1.0 + temperature_c / 273.15)
+    if humidity is not None:
+        speed += 0.0124 * humidity
+    return speed * 100.0
+
+
+class FixedTemperature:
+    """Temperatuurbron met een vaste waarde, bijv. voor binnen of om te testen."""
+
+    def __init__(self, temperature_c=20.0, humidity=None):
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+
+    def read(self):
+        return self.temperature_c, self.humidity
+
+
+class CallbackTemperature:
+    """Temperatuurbron die een functie aanroept die (temperatuur, vochtigheid of None) teruggeeft."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def read(self):
+        return self.callback()
+
+
+class FileTemperature:
+    """
+    Temperatuurbron die een getal uit een bestand leest, bijv. een DS18B20 via
+    /sys/bus/w1/devices/28-*/temperature (millidegrees, scale=1000).
+    """
+
+    def __init__(self, path, scale=1000.0, humidity_path=None, humidity_scale=1.0):
+        self.path = path
+        self.scale = scale
+        self.humidity_path = humidity_path
+        self.humidity_scale = humidity_scale
+
+    def _read_number(self, path, scale):
+        with open(path) as f:
+            return float(f.read().strip()) / scale
+
+    def read(self):
+        temperature = self._read_number(self.path, self.scale)
+        humidity = None
+        if self.humidity_path:
+            humidity = self._read_number(self.humidity_path, self.humidity_scale)
+        return temperature, humidity
+
+
+class SimulatedTemperature:
+    """Gesimuleerde buitentemperatuur: een sinus rond base_c met een periode van een dag."""
+
+    def __init__(self, base_c=15.0, amplitude_c=8.0, period_s=86400.0, humidity=None, clock=None):
+        self.base_c = base_c
+        self.amplitude_c = amplitude_c
+        self.period_s = period_s
+        self.humidity = humidity
+        self.clock = clock or time.time
+
+    def read(self):
+        phase = 2.0 * math.pi * (self.clock() % self.period_s) / self.period_s
+        return self.base_c + self.amplitude_c * math.sin(phase), self.humidity
+
+
+class SpeedOfSoundCompensator:
+    """
+    Houdt per temperatuurbucket een vooraf berekende tabel pulsduur (µs) -> afstand (cm) bij.
+
+    update() leest de temperatuurbron en wisselt, als de bucket verandert, in één toewijzing
+    naar de tabel van die bucket (eerder gebouwde tabellen worden bewaard). Een meting kost
+    daardoor één tabelopzoeking. Luisteraars (bijv. een DistanceMapper) krijgen de nieuwe
+    geluidssnelheid door, zodat hun eigen tabellen mee kunnen schuiven.
+    """
+
+    # Temperatuur waarmee de tabel wordt gevuld totdat de bron voor het eerst leesbaar is
+    DEFAULT_TEMPERATURE_C = 20.0
+
+    def __init__(self, source, bucket_c=0.5, max_pulse_us=30000, update_interval_s=10.0):
+        """
+        Args:
+            source: Temperatuurbron met een read()-methode, zie FixedTemperature e.d.
+            bucket_c (float, optional): Breedte van een temperatuurbucket in °C. Standaard 0.5 °C
+                                        (~0.1% afstandsfout binnen een bucket).
+            max_pulse_us (int, optional): Langste pulsduur in de tabel. Standaard 30000 µs (~5 m).
+            update_interval_s (float, optional): Interval van de achtergrondthread (zie start()).
+        """
+        self.source = source
+        self.bucket_c = bucket_c
+        self.max_pulse_us = max_pulse_us
+        self.update_interval_s = update_interval_s
+        self._tables = {}
+        self._listeners = []
+        self._thread = None
+        self._stop = threading.Event()
+        self.bucket = None
+        self.temperature_c = None
+        self.humidity = None
+        self.speed_cm_per_s = None
+        self.table = None
+        # Begin met de tabel bij DEFAULT_TEMPERATURE_C, zodat er ook een geldige tabel is als
+        # de eerste update() mislukt
+        self._apply_bucket((round(self.DEFAULT_TEMPERATURE_C / bucket_c), None))
+        self.update()
+
+    def add_listener(self, listener):
+        """Registreert listener(speed_cm_per_s), aangeroepen bij elke bucketwissel."""
+        self._listeners.append(listener)
+        listener(self.speed_cm_per_s)
+
+    def _build_table(self, speed_cm_per_s):
+        half_speed_per_us = speed_cm_per_s / 2e6
+        return array("f", (us * half_speed_per_us for us in range(self.max_pulse_us + 1)))
+
+    def update(self):
+        """
+        Leest de temperatuurbron en wisselt zo nodig van tabel.
+
+        Returns:
+            bool: True als de bucket (en dus de tabel) is gewisseld.
+        """
+        try:
+            temperature_c, humidity = self.source.read()
+        except (OSError, ValueError) as e:
+            log.warning(f"Temperatuur niet leesbaar, vorige waarde blijft actief: {e}", key="temperature_read_error")
+            return False
+        self.temperature_c = temperature_c
+        self.humidity = humidity
+        bucket = (round(temperature_c / self.bucket_c),
+                  None if humidity is None else round(humidity / 10.0))
+        if bucket == self.bucket:
+            return False
+        self._apply_bucket(bucket)
+        return True
+
+    def _apply_bucket(self, bucket):
+        """Schakelt over naar de tabel van een (temperatuur, vochtigheid)-bucket en meldt dat aan de luisteraars."""
+        bucket_temperature = bucket[0] * self.bucket_c
+        bucket_humidity = None if bucket[1] is None else bucket[1] * 10.0
+        speed = speed_of_sound_cm_per_s(bucket_temperature, bucket_humidity)
+        table = self._tables.get(bucket)
+        if table is None:
+            table = self._tables[bucket] = self._build_table(speed)
+        # Eerst de snelheid, dan de tabel: een lezer ziet altijd een geldige tabel
+        self.speed_cm_per_s = speed
+        self.table = table
+        self.bucket = bucket
+        for listener in self._listeners:
+            listener(speed)
+
+    def pulse_to_distance_cm(self, pulse_s):
+        """Zet een pulsduur (s) om naar een afstand in cm met de tabel van de huidige temperatuur."""
+        table = self.table
+        index = int(pulse_s * 1e6 + 0.5)
+        if index < len(table):
+            return table[index]
+        return pulse_s * self.speed_cm_per_s / 2.0
+
+    def start(self):
+        """Start een achtergrondthread die elke update_interval_s de temperatuur bijwerkt."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.update_interval_s):
+            try:
+                self.update()
+            except Exception as e:
+                # Bijv. een fout in een CallbackTemperature of luisteraar: de thread moet blijven
+                # pollen, anders blijft de tabel van de laatste temperatuur stilletjes staan
+                log.error(f"Bijwerken van de temperatuur mislukt: {e}",
+                          key=f"temperature_update_error:{type(e).__name__}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
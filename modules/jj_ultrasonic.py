@@ -1,6 +1,25 @@
-import RPi.GPIO as GPIO
+import array
+import collections
+import threading
 import time
 
+from modules import jj_gpio
+from modules import jj_log
+
+log = jj_log.get_logger("ultrasonic")
+
+# Resultaat van UltrasonicSensor.measure_burst(): de robuuste afstand (None als er te weinig geldige
+# echo's waren of de spreiding te groot was), de variantie van de gebruikte echo's in de eenheid van
+# de sensor in het kwadraat, het aantal geldige echo's en het aantal verstuurde pings.
+BurstResult = collections.namedtuple("BurstResult", ["distance", "variance", "valid", "count"])
+
+BURST_ESTIMATORS = ("median", "trimmed_mean")
+
+
+class EchoTimeout(RuntimeError):
+    """Geen (volledige) echo binnen de timeout. Een RuntimeError, zodat bestaande except-blokken blijven werken."""
+
+
 class UltrasonicSensor:
     """
     Klasse voor het uitlezen van een HC-SR04 ultrasone afstandssensor op een Raspberry Pi.
@@ -15,7 +34,15 @@ class UltrasonicSensor:
     # De snelheid van geluid varieert met temperatuur: ~331.3 + (0.606 * temperatuur_celsius) m/s
     SPEED_OF_SOUND_CM_PER_S = 34320  # cm/s (ongeveer 343.2 m/s)
 
-    def __init__(self, trig_pin, echo_pin, unit="cm", timeout_s=1.0):
+    # Minimale tijd tussen twee triggers volgens de HC-SR04 datasheet (meetcyclus van 60 ms)
+    MIN_RETRIGGER_S = 0.06
+    # Tijd tussen einde triggerpuls en begin van de echo (8 pulsen van 40 kHz plus verwerking)
+    TRIGGER_LATENCY_S = 0.0005
+
+    CAPTURE_MODES = ("poll", "edge")
+
+    def __init__(self, trig_pin, echo_pin, unit="cm", timeout_s=1.0, gpio=None, capture="poll",
+                 settle_s=0.5, metrics=None, compensator=None, max_range_cm=None, defer_settle=True):
         """
         Initialiseert de ultrasone sensor.
 
@@ -25,56 +52,184 @@ class UltrasonicSensor:
             unit (str, optional): De gewenste eenheid voor de afstand ('cm' of 'm'). Standaard is 'cm'.
             timeout_s (float, optional): De maximale tijd (in seconden) om te wachten op een echo.
                                          Voorkomt dat de code blijft hangen bij geen object. Standaard is 1.0s.
+            gpio (GPIOBackend, optional): De GPIO-backend. Standaard jj_gpio.create_backend() (RPi.GPIO,
+                                          of gesimuleerd als dat niet beschikbaar is); geef een
+                                          SimulatedGPIOBackend mee om zonder Raspberry Pi te testen.
+            capture (str, optional): 'poll' meet de echo door de ECHO-pin actief uit te lezen (busy-wait),
+                                     'edge' laat flank-callbacks de tijdstempels vastleggen en wacht op
+                                     een event, zodat de CPU vrij blijft. Standaard is 'poll'.
+            settle_s (float, optional): Wachttijd na initialisatie zodat de sensor kan stabiliseren.
+                                        Standaard is 0.5s.
+            metrics (Instrumentation, optional): Legt 'trigger_to_echo' en 'echo_width' per meting vast.
+            compensator (SpeedOfSoundCompensator, optional): Rekent pulsduur om naar afstand met de
+                                                             geluidssnelheid bij de actuele temperatuur,
+                                                             in plaats van SPEED_OF_SOUND_CM_PER_S.
+            max_range_cm (float, optional): Grootste afstand die gemeten moet worden. Als dit is opgegeven,
+                                            wordt timeout_s daaruit afgeleid (zie timeout_for_range()),
+                                            bijv. ~28 ms voor 400 cm in plaats van een volle seconde.
+            defer_settle (bool, optional): Wacht de stabilisatietijd pas af vlak voor de eerste trigger
+                                           (en alleen het restant), zodat de constructor direct terugkeert
+                                           en de rest van het opstarten intussen door kan gaan.
         """
         self.trig_pin = trig_pin
         self.echo_pin = echo_pin
         self.unit = unit.lower()
-        self.timeout_s = timeout_s
+        self.max_range_cm = max_range_cm
+        self.timeout_s = timeout_s if max_range_cm is None else self.timeout_for_range(max_range_cm)
 
         # Controleer of de eenheid geldig is
         if self.unit not in ["cm", "m"]:
             raise ValueError("Ongeldige eenheid. Kies 'cm' of 'm'.")
+        if capture not in self.CAPTURE_MODES:
+            raise ValueError("Ongeldige capture-modus. Kies 'poll' of 'edge'.")
+        self.capture = capture
+        self.metrics = metrics
+        self.compensator = compensator
+        self.timeout_count = 0  # Aantal echo-timeouts sinds het aanmaken (bijv. voor AdaptiveSampler)
 
         # GPIO initialisatie
-        GPIO.setmode(GPIO.BCM)  # Gebruik BCM-nummering voor GPIO-pinnen
-        GPIO.setup(self.trig_pin, GPIO.OUT)
-        GPIO.setup(self.echo_pin, GPIO.IN)
+        # Een zelf aangemaakte backend is van deze sensor; een meegegeven backend wordt gedeeld
+        # (bijv. door een SensorArray) en wordt bij het opruimen alleen voor onze pinnen vrijgegeven.
+        self._owns_gpio = gpio is None
+        self._closed = False
+        self.gpio = gpio if gpio is not None else jj_gpio.create_backend()
+        self.gpio.setup_output(self.trig_pin)
+        self.gpio.setup_input(self.echo_pin)
+
+        # Tijdstempels (perf_counter_ns) van de echo-flanken voor de 'edge'-modus
+        self._trigger_ns = 0
+        self._rise_ns = None
+        self._fall_ns = None
+        self._echo_event = threading.Event()
+        if self.capture == "edge":
+            self.gpio.add_edge_callback(self.echo_pin, self._on_echo_edge)
 
         # Zorg ervoor dat de TRIG-pin laag is bij de start
-        GPIO.output(self.trig_pin, GPIO.LOW)
-        time.sleep(0.5)  # Geef de sensor even de tijd om te stabiliseren
+        self.gpio.output(self.trig_pin, self.gpio.LOW)
+        self._settle_until = None
+        if settle_s > 0:
+            if defer_settle:
+                self._settle_until = time.perf_counter() + settle_s
+            else:
+                time.sleep(settle_s)  # Geef de sensor even de tijd om te stabiliseren
+
+        log.info(f"Ultrasonic Sensor initialized: Trig={self.trig_pin}, Echo={self.echo_pin}")
+
+    @classmethod
+    def timeout_for_range(cls, max_range_cm, margin=1.2):
+        """
+        Geeft de echo-timeout (s) voor een maximale afstand: de looptijd heen en terug plus de
+        triggerlatentie, met een marge.
+        """
+        round_trip_s = 2.0 * max_range_cm / cls.SPEED_OF_SOUND_CM_PER_S
+        return (round_trip_s + cls.TRIGGER_LATENCY_S) * margin
 
-        print(f"Ultrasonic Sensor initialized: Trig={self.trig_pin}, Echo={self.echo_pin}")
+    def _send_trigger(self):
+        """Stuurt een korte puls (10 microseconden) op de TRIG-pin."""
+        if self._settle_until is not None:
+            # Uitgestelde stabilisatie: alleen de eerste trigger wacht nog het restant af
+            remaining_s = self._settle_until - time.perf_counter()
+            if remaining_s > 0:
+                time.sleep(remaining_s)
+            self._settle_until = None
+        self.gpio.output(self.trig_pin, self.gpio.HIGH)
+        time.sleep(0.00001)
+        self.gpio.output(self.trig_pin, self.gpio.LOW)
+
+    def _on_echo_edge(self, pin, level, timestamp_ns):
+        """
+        Edge-callback voor de ECHO-pin. Legt de stijgende en dalende flank vast
+        en maakt de wachtende meting wakker zodra de puls compleet is.
+        """
+        if level:
+            self._rise_ns = timestamp_ns
+        elif self._rise_ns is not None and self._fall_ns is None:
+            self._fall_ns = timestamp_ns
+            self._echo_event.set()
 
     def _get_raw_pulse_duration(self):
         """
         Interne methode om de duur van de echo-puls te meten.
         Deze methode is 'private' (door de underscore) omdat deze intern door de klasse wordt gebruikt.
         """
-        # Stuur een korte puls op de TRIG-pin
-        GPIO.output(self.trig_pin, GPIO.HIGH)
-        time.sleep(0.00001)  # 10 microseconden puls
-        GPIO.output(self.trig_pin, GPIO.LOW)
+        try:
+            if self.capture == "edge":
+                return self._get_pulse_duration_edge()
+            return self._get_pulse_duration_poll()
+        except EchoTimeout:
+            self.timeout_count += 1
+            raise
+
+    def _get_pulse_duration_edge(self):
+        """Meet de echo-puls via flank-callbacks; de aanroeper slaapt tot de puls binnen is."""
+        self.start_measurement()
+        return self.wait_pulse_duration(self.timeout_s)
+
+    def start_measurement(self):
+        """
+        Start een meting in de 'edge'-modus zonder op de echo te wachten.
+        Gebruik wait_pulse_duration() om het resultaat op te halen. Hiermee kan een aanroeper
+        (bijv. een SensorArray) meerdere sensoren vlak na elkaar triggeren en hun echo's
+        tegelijk afwachten.
+        """
+        if self.capture != "edge":
+            raise RuntimeError("start_measurement() vereist capture='edge'.")
+        self._rise_ns = None
+        self._fall_ns = None
+        self._echo_event.clear()
+        self._send_trigger()
+        self._trigger_ns = time.perf_counter_ns()
+
+    def wait_pulse_duration(self, timeout_s):
+        """
+        Wacht op de echo van een met start_measurement() gestarte meting.
+
+        Args:
+            timeout_s (float): Maximale wachttijd in seconden.
+        Returns:
+            float: De duur van de echo-puls in seconden.
+        Raises:
+            EchoTimeout: Bij een echo timeout.
+        """
+        if not self._echo_event.wait(max(0.0, timeout_s)):
+            if self._rise_ns is None:
+                raise EchoTimeout("Echo timeout: Geen echo ontvangen (sensor te ver of geen object).")
+            raise EchoTimeout("Echo timeout: Echo bleef te lang hoog.")
+        if self.metrics is not None:
+            self.metrics.record("trigger_to_echo", max(0, self._rise_ns - self._trigger_ns))
+            self.metrics.record("echo_width", self._fall_ns - self._rise_ns)
+        return (self._fall_ns - self._rise_ns) / 1e9
 
-        pulse_start_time = time.time()
-        pulse_end_time = time.time()
+    def _get_pulse_duration_poll(self):
+        """Meet de echo-puls door de ECHO-pin actief uit te lezen (busy-wait)."""
+        gpio_input = self.gpio.input
+        echo_pin = self.echo_pin
+        low = self.gpio.LOW
+        high = self.gpio.HIGH
+        perf_counter_ns = time.perf_counter_ns
+        timeout_ns = int(self.timeout_s * 1e9)
+
+        self._send_trigger()
+        trigger_ns = perf_counter_ns()
 
         # Wacht tot de ECHO-pin HOOG wordt (start van de puls)
-        timeout_start = time.time()
-        while GPIO.input(self.echo_pin) == GPIO.LOW:
-            pulse_start_time = time.time()
-            if time.time() - timeout_start > self.timeout_s:
-                raise RuntimeError("Echo timeout: Geen echo ontvangen (sensor te ver of geen object).")
+        pulse_start_ns = timeout_start_ns = perf_counter_ns()
+        while gpio_input(echo_pin) == low:
+            pulse_start_ns = perf_counter_ns()
+            if pulse_start_ns - timeout_start_ns > timeout_ns:
+                raise EchoTimeout("Echo timeout: Geen echo ontvangen (sensor te ver of geen object).")
 
         # Wacht tot de ECHO-pin LAAG wordt (einde van de puls)
-        timeout_start = time.time()
-        while GPIO.input(self.echo_pin) == GPIO.HIGH:
-            pulse_end_time = time.time()
-            if time.time() - timeout_start > self.timeout_s:
-                raise RuntimeError("Echo timeout: Echo bleef te lang hoog.")
+        pulse_end_ns = timeout_start_ns = perf_counter_ns()
+        while gpio_input(echo_pin) == high:
+            pulse_end_ns = perf_counter_ns()
+            if pulse_end_ns - timeout_start_ns > timeout_ns:
+                raise EchoTimeout("Echo timeout: Echo bleef te lang hoog.")
 
-        pulse_duration = pulse_end_time - pulse_start_time
-        return pulse_duration
+        if self.metrics is not None:
+            self.metrics.record("trigger_to_echo", pulse_start_ns - trigger_ns)
+            self.metrics.record("echo_width", pulse_end_ns - pulse_start_ns)
+        return (pulse_end_ns - pulse_start_ns) / 1e9
 
     def get_distance(self):
         """
@@ -86,32 +241,153 @@ class UltrasonicSensor:
         """
         try:
             pulse_duration = self._get_raw_pulse_duration()
-
-            # Afstand = (duur van de puls * snelheid van geluid) / 2
-            # Deel door 2 omdat het geluid heen en weer reist
-            distance_cm = (pulse_duration * self.SPEED_OF_SOUND_CM_PER_S) / 2
-
-            if self.unit == "m":
-                return distance_cm / 100.0  # Converteer naar meters
-            else:
-                return round(distance_cm, 2) # Rond af op 2 decimalen voor cm
+            return self.pulse_to_distance(pulse_duration)
 
         except RuntimeError as e:
             # Vang specifieke fouten van _get_raw_pulse_duration op
-            print(f"Sensor Error: {e}")
+            log.warning(f"Sensor Error: {e}", key=f"sensor_error:{self.trig_pin}:{e}", trig=self.trig_pin)
             return None
         except Exception as e:
             # Vang andere onverwachte fouten op
-            print(f"An unexpected error occurred: {e}")
+            log.error(f"An unexpected error occurred: {e}", key=f"unexpected:{self.trig_pin}", trig=self.trig_pin)
             return None
 
+    def measure_burst(self, count=5, estimator="median", trim=0.2, interval_s=None, min_valid=None,
+                      max_variance=None):
+        """
+        Stuurt count pings direct na elkaar (met de minimale tussentijd van de sensor) en geeft één
+        robuuste afstand terug, samen met de spreiding. Vervangt een lus van count losse
+        get_distance()-aanroepen met sleeps ertussen.
+
+        De echo-duren komen in een array('d') die tussen aanroepen wordt hergebruikt; ook sorteren
+        en middelen gebeurt in die array, zonder kopieën of slices. Time-outs tellen niet mee; de
+        schatting en variantie worden over de geldige echo's berekend en pas aan het eind
+        omgerekend naar een afstand.
+
+        Args:
+            count (int, optional): Aantal pings in de burst.
+            estimator (str, optional): 'median', of 'trimmed_mean' (gemiddelde zonder de uitschieters).
+            trim (float, optional): Fractie die aan beide kanten wordt weggelaten bij de variantie
+                                    (en bij 'trimmed_mean' ook bij de schatting).
+            interval_s (float, optional): Tijd tussen de triggers; standaard MIN_RETRIGGER_S.
+            min_valid (int, optional): Minimaal aantal geldige echo's; standaard de helft van count (naar boven).
+                                       Bij minder is distance None.
+            max_variance (float, optional): Grootste toegestane variantie (eenheid²); bij een grotere
+                                            spreiding is distance None (de variantie blijft beschikbaar).
+
+        Returns:
+            BurstResult: (distance, variance, valid, count).
+        """
+        if estimator not in BURST_ESTIMATORS:
+            raise ValueError(f"Ongeldige schatter '{estimator}'. Kies uit {BURST_ESTIMATORS}.")
+        if count < 1 or not 0.0 <= trim < 0.5:
+            raise ValueError("Ongeldige burst. count moet minimaal 1 zijn en trim tussen 0 en 0.5 liggen.")
+        if interval_s is None:
+            interval_s = self.MIN_RETRIGGER_S
+        if min_valid is None:
+            min_valid = (count + 1) // 2
+
+        # Echo-duren, hergebruikt per aanroep; pas hier aangemaakt zodat ook subklassen met een eigen
+        # constructor (ReplaySensor) hem krijgen
+        buffer = self.__dict__.get("_burst_buffer")
+        if buffer is None:
+            buffer = self._burst_buffer = array.array("d")
+        if len(buffer) < count:
+            buffer.extend([0.0] * (count - len(buffer)))
+        perf_counter = time.perf_counter
+        valid = 0
+        error = None
+        next_at = perf_counter()
+        for _ in range(count):
+            delay = next_at - perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at = perf_counter() + interval_s
+            try:
+                buffer[valid] = self._get_raw_pulse_duration()
+                valid += 1
+            except RuntimeError as e:
+                error = e
+
+        if valid < max(1, min_valid):
+            if error is not None:
+                log.warning(f"Sensor Error: {error} ({count - valid} van {count} pings)", key=f"burst_error:{self.trig_pin}",
+                            trig=self.trig_pin)
+            return BurstResult(None, None, valid, count)
+
+        # De uitschieters aan beide kanten tellen niet mee in de spreiding (en bij 'trimmed_mean' ook
+        # niet in de schatting), zodat één verdwaalde echo een goede burst niet afkeurt
+        # Insertion sort in de buffer zelf: voor een handvol pings sneller dan sorted() en zonder nieuwe lijst
+        for i in range(1, valid):
+            value = buffer[i]
+            j = i - 1
+            while j >= 0 and buffer[j] > value:
+                buffer[j + 1] = buffer[j]
+                j -= 1
+            buffer[j + 1] = value
+        cut = int(valid * trim)
+        used = valid - 2 * cut
+        total = 0.0
+        for i in range(cut, valid - cut):
+            total += buffer[i]
+        mean = total / used
+        if estimator == "median":
+            middle = valid // 2
+            pulse = buffer[middle] if valid % 2 else (buffer[middle - 1] + buffer[middle]) / 2
+        else:
+            pulse = mean
+        squares = 0.0
+        for i in range(cut, valid - cut):
+            deviation = buffer[i] - mean
+            squares += deviation * deviation
+        pulse_variance = squares / used
+
+        distance = self.pulse_to_distance(pulse)
+        # Afstand is lineair in de pulsduur: schaal de variantie met (afstand per seconde)²
+        scale = distance / pulse if pulse > 0 else 0.0
+        variance = pulse_variance * scale * scale
+        if max_variance is not None and variance > max_variance:
+            distance = None
+        return BurstResult(distance, variance, valid, count)
+
+    def pulse_to_distance(self, pulse_duration):
+        """
+        Rekent een echo-pulsduur (s) om naar een afstand in de eenheid van de sensor.
+        """
+        if self.compensator is not None:
+            # Tabelopzoeking met de geluidssnelheid bij de actuele temperatuur
+            distance_cm = self.compensator.pulse_to_distance_cm(pulse_duration)
+        else:
+            # Afstand = (duur van de puls * snelheid van geluid) / 2
+            # Deel door 2 omdat het geluid heen en weer reist
+            distance_cm = (pulse_duration * self.SPEED_OF_SOUND_CM_PER_S) / 2
+
+        if self.unit == "m":
+            return distance_cm / 100.0  # Converteer naar meters
+        else:
+            return round(distance_cm, 2) # Rond af op 2 decimalen voor cm
+
+    def close(self):
+        """
+        Geeft de GPIO-pinnen van deze sensor vrij. Mag meerdere keren worden aangeroepen.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        log.info(f"Cleaning up GPIO for sensor on Trig={self.trig_pin}, Echo={self.echo_pin}")
+        if self.capture == "edge":
+            self.gpio.remove_edge_callback(self.echo_pin)
+        if self._owns_gpio:
+            self.gpio.cleanup() # Dit zal alle GPIO-pinnen opruimen die zijn ingesteld.
+        else:
+            # Gedeelde backend: alleen onze eigen pinnen vrijgeven, andere sensoren gaan door.
+            self.gpio.cleanup((self.trig_pin, self.echo_pin))
+
     def __del__(self):
         """
         Opruim-methode die wordt aangeroepen wanneer het object wordt vernietigd.
         Zorgt ervoor dat de GPIO-pinnen correct worden vrijgegeven.
         """
-        print(f"Cleaning up GPIO for sensor on Trig={self.trig_pin}, Echo={self.echo_pin}")
-        GPIO.cleanup() # Dit zal alle GPIO-pinnen opruimen die zijn ingesteld.
-                       # Overweeg GPIO.cleanup(self.trig_pin) en GPIO.cleanup(self.echo_pin)
-                       # als je meerdere sensoren hebt die doorgaan.
+        if not getattr(self, "_closed", True):
+            self.close()
 
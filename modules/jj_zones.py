@@ -0,0 +1,399 @@
+import collections
+import json
+import math
+import time
+
+from modules import jj_optional
+from modules import jj_recording as recording
+
+# Plaats van een sensor in de ruimte (cm) en de richting waarin hij kijkt (graden, 0 = +x, 90 = +y)
+SensorPlacement = collections.namedtuple("SensorPlacement", ["x", "y", "angle_deg"])
+
+# Een zonegebeurtenis: kind is 'enter' of 'exit', zone de index in de ZoneGrid,
+# position de geschatte (x, y) op dat moment (None bij een exit zonder positie).
+ZoneEvent = collections.namedtuple("ZoneEvent", ["kind", "zone", "timestamp", "position"])
+
+# Onder deze determinant (in genormaliseerde coördinaten) is de sensoropstelling voor de
+# kleinste-kwadratenoplossing te slecht bepaald, bijv. als alle meetbare sensoren op één lijn staan.
+_MIN_DETERMINANT = 1e-9
+
+
+class SensorLayout:
+    """
+    Schat de 2D-positie van één doel uit de afstanden van meerdere sensoren in een ruimte.
+
+    Met drie of meer geldige metingen wordt de positie bepaald met lineaire kleinste kwadraten:
+    |x - p_i|² = r_i² wordt per sensor i de lineaire vergelijking [-2p_i, 1]·[x, y, |x|²] = r_i² - |p_i|².
+    De matrixtermen van elke sensor (a_i·a_iᵀ) worden bij het aanmaken berekend, zodat een frame
+    alleen een gewogen som, een 3x3-oplossing en wat vermenigvuldigingen kost. Ontbrekende metingen
+    (None/NaN, buiten bereik) krijgen gewicht 0.
+
+    Bij minder dan drie metingen, of sensoren die (vrijwel) op één lijn staan, valt de schatting
+    terug op de projectie langs de kijkrichting: het gemiddelde van p_i + r_i·richting_i.
+
+        layout = SensorLayout.from_config({"sensors": [{"x": 0, "y": 0, "angle": 45}, ...]})
+        x, y = layout.locate([120.5, None, 88.0, 210.3])   # of None
+        posities = layout.locate_batch(frames)               # (F, 2), NaN zonder positie
+    """
+
+    def __init__(self, placements, min_distance_cm=2.0, max_distance_cm=400.0):
+        """
+        Args:
+            placements (list): SensorPlacement of (x, y, angle_deg) per sensor, in cm en graden.
+            min_distance_cm (float, optional): Kleinere afstanden tellen als ontbrekend.
+            max_distance_cm (float, optional): Grotere afstanden tellen als ontbrekend.
+        """
+        np = jj_optional.load_numpy()
+        if np is None:
+            raise RuntimeError("SensorLayout vereist NumPy.")
+        if len(placements) < 2:
+            raise ValueError("Geef minstens twee sensorposities op.")
+        self.placements = [SensorPlacement(*placement) for placement in placements]
+        self.min_distance_cm = min_distance_cm
+        self.max_distance_cm = max_distance_cm
+
+        positions = np.array([(p.x, p.y) for p in self.placements], dtype=float)
+        angles = np.radians([p.angle_deg for p in self.placements])
+        self.positions = positions
+        self.directions = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        # Normaliseer rond het zwaartepunt, zodat de 3x3-matrix goed geschaald is
+        self._center = positions.mean(axis=0)
+        self._scale = max(float(np.abs(positions - self._center).max()), 1.0)
+        normalized = (positions - self._center) / self._scale
+        rows = np.column_stack((-2.0 * normalized, np.ones(len(normalized))))
+        self._rows = rows                                                 # (n, 3)
+        self._outer = np.einsum("ni,nj->nij", rows, rows).reshape(len(rows), 9)  # (n, 9)
+        self._offsets = (normalized ** 2).sum(axis=1)                     # |p_i|², (n,)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Maakt een layout uit een configuratie-dict, bijv. ingelezen uit JSON:
+
+            {"sensors": [{"x": 0, "y": 0, "angle": 45}, {"x": 400, "y": 0, "angle": 135}, ...],
+             "min_distance_cm": 2, "max_distance_cm": 400}
+        """
+        placements = [(sensor["x"], sensor["y"], sensor.get("angle", 0.0)) for sensor in config["sensors"]]
+        return cls(placements, min_distance_cm=config.get("min_distance_cm", 2.0),
+                   max_distance_cm=config.get("max_distance_cm", 400.0))
+
+    @classmethod
+    def load(cls, path):
+        """Leest een layout uit een JSON-bestand (zie from_config())."""
+        with open(path) as f:
+            return cls.from_config(json.load(f))
+
+    @property
+    def sensor_count(self):
+        return len(self.placements)
+
+    def locate(self, distances):
+        """
+        Schat de positie uit één meting per sensor.
+
+        Args:
+            distances (list): Afstand (cm) per sensor, in de volgorde van de layout; None bij een mislukte meting.
+        Returns:
+            tuple: (x, y) in cm, of None als er geen enkele geldige meting is.
+        """
+        np = jj_optional.load_numpy()
+        r = np.array([math.nan if d is None else d for d in distances], dtype=float)
+        valid = (r >= self.min_distance_cm) & (r <= self.max_distance_cm)  # NaN vergelijkt als False
+        count = int(valid.sum())
+        if count == 0:
+            return None
+        weights = valid.astype(float)
+        r = np.where(valid, r, 0.0)
+        if count >= 3:
+            normal = (weights @ self._outer).reshape(3, 3)
+            if abs(np.linalg.det(normal)) > _MIN_DETERMINANT:
+                scaled = r / self._scale
+                rhs = (weights * (scaled * scaled - self._offsets)) @ self._rows
+                solution = np.linalg.solve(normal, rhs)
+                return (float(self._center[0] + solution[0] * self._scale),
+                        float(self._center[1] + solution[1] * self._scale))
+        projected = (weights @ self.positions + (weights * r) @ self.directions) / count
+        return float(projected[0]), float(projected[1])
+
+    def locate_batch(self, frames):
+        """
+        Schat de positie voor een reeks frames tegelijk (bijv. een opname).
+
+        Args:
+            frames: (F, n) array-achtig met afstanden; NaN (of None) bij een mislukte meting.
+        Returns:
+            numpy.ndarray: (F, 2) posities in cm; NaN voor frames zonder geldige meting.
+        """
+        np = jj_optional.load_numpy()
+        r = np.asarray(frames, dtype=float)
+        valid = (r >= self.min_distance_cm) & (r <= self.max_distance_cm)
+        weights = valid.astype(float)
+        r = np.where(valid, r, 0.0)
+        counts = weights.sum(axis=1)
+        result = np.full((len(r), 2), np.nan)
+
+        normal = (weights @ self._outer).reshape(-1, 3, 3)
+        solvable = counts >= 3
+        solvable[solvable] = np.abs(np.linalg.det(normal[solvable])) > _MIN_DETERMINANT
+        if solvable.any():
+            scaled = r[solvable] / self._scale
+            rhs = (weights[solvable] * (scaled * scaled - self._offsets)) @ self._rows
+            solution = np.linalg.solve(normal[solvable], rhs[..., None])[..., 0]
+            result[solvable] = self._center + solution[:, :2] * self._scale
+
+        fallback = ~solvable & (counts > 0)
+        if fallback.any():
+            w = weights[fallback]
+            result[fallback] = ((w @ self.positions + (w * r[fallback]) @ self.directions)
+                                / counts[fallback, None])
+        return result
+
+
+class ZoneGrid:
+    """
+    Verdeelt een rechthoekig gebied in columns x rows zones. Zone-index = rij * columns + kolom,
+    met rij 0 bij y_min en kolom 0 bij x_min. Posities buiten het gebied vallen in geen zone.
+    """
+
+    def __init__(self, x_min, y_min, x_max, y_max, columns=3, rows=3):
+        if x_max <= x_min or y_max <= y_min or columns < 1 or rows < 1:
+            raise ValueError("Ongeldig zonegrid. Controleer de grenzen en het aantal kolommen/rijen.")
+        self.x_min, self.y_min, self.x_max, self.y_max = x_min, y_min, x_max, y_max
+        self.columns = columns
+        self.rows = rows
+        self._cell_width = (x_max - x_min) / columns
+        self._cell_height = (y_max - y_min) / rows
+
+    @classmethod
+    def from_config(cls, config):
+        """Uit een dict: {"x_min": 0, "y_min": 0, "x_max": 400, "y_max": 300, "columns": 4, "rows": 3}."""
+        return cls(config.get("x_min", 0.0), config.get("y_min", 0.0), config["x_max"], config["y_max"],
+                   config.get("columns", 3), config.get("rows", 3))
+
+    @property
+    def zone_count(self):
+        return self.columns * self.rows
+
+    def zone_at(self, x, y):
+        """Geeft de zone-index van een positie, of None buiten het grid."""
+        if not (self.x_min <= x < self.x_max and self.y_min <= y < self.y_max):
+            return None  # Ook voor NaN
+        column = int((x - self.x_min) / self._cell_width)
+        row = int((y - self.y_min) / self._cell_height)
+        return min(row, self.rows - 1) * self.columns + min(column, self.columns - 1)
+
+    def zones_for(self, positions):
+        """Zone-index per positie voor een (F, 2) array; -1 buiten het grid of zonder positie."""
+        np = jj_optional.load_numpy()
+        positions = np.asarray(positions, dtype=float)
+        x, y = positions[:, 0], positions[:, 1]
+        inside = (x >= self.x_min) & (x < self.x_max) & (y >= self.y_min) & (y < self.y_max)
+        columns = np.clip(((np.where(inside, x, self.x_min) - self.x_min) / self._cell_width).astype(int),
+                          0, self.columns - 1)
+        rows = np.clip(((np.where(inside, y, self.y_min) - self.y_min) / self._cell_height).astype(int),
+                       0, self.rows - 1)
+        return np.where(inside, rows * self.columns + columns, -1)
+
+    def center(self, zone):
+        """Middelpunt (x, y) van een zone."""
+        row, column = divmod(zone, self.columns)
+        return (self.x_min + (column + 0.5) * self._cell_width,
+                self.y_min + (row + 0.5) * self._cell_height)
+
+
+class ZoneTracker:
+    """
+    Houdt bij in welke zone het doel staat en meldt 'enter'/'exit'-gebeurtenissen. Een nieuwe
+    zone (of het verlaten van het grid) telt pas na hold_frames opeenvolgende frames, zodat
+    ruis op een zonegrens geen reeks wisselingen geeft.
+    """
+
+    def __init__(self, grid, hold_frames=2):
+        """
+        Args:
+            grid (ZoneGrid): Het zonegrid.
+            hold_frames (int, optional): Aantal frames dat een nieuwe zone moet aanhouden.
+        """
+        self.grid = grid
+        self.hold_frames = max(1, hold_frames)
+        self.reset()
+
+    def reset(self):
+        self.zone = None
+        self._candidate = None
+        self._candidate_frames = 0
+
+    def update(self, position, timestamp=None):
+        """
+        Verwerkt één positie ((x, y) of None) en geeft de lijst met ZoneEvents van dit frame.
+        """
+        zone = None if position is None else self.grid.zone_at(position[0], position[1])
+        return self._step(zone, position, time.perf_counter() if timestamp is None else timestamp)
+
+    def _step(self, zone, position, timestamp):
+        if zone == self.zone:
+            self._candidate = None
+            self._candidate_frames = 0
+            return []
+        if zone != self._candidate:
+            self._candidate = zone
+            self._candidate_frames = 0
+        self._candidate_frames += 1
+        if self._candidate_frames < self.hold_frames:
+            return []
+
+        events = []
+        if self.zone is not None:
+            events.append(ZoneEvent("exit", self.zone, timestamp, position))
+        if zone is not None:
+            events.append(ZoneEvent("enter", zone, timestamp, position))
+        self.zone = zone
+        self._candidate = None
+        self._candidate_frames = 0
+        return events
+
+    def track_batch(self, positions, timestamps):
+        """
+        Verwerkt een reeks posities ((F, 2) array, NaN zonder positie) in één keer. De zones worden
+        gevectoriseerd bepaald; alleen frames waarin de zone verandert worden nog in Python bekeken.
+        Geeft dezelfde gebeurtenissen als update() per frame (de tracker wordt eerst gereset).
+        """
+        np = jj_optional.load_numpy()
+        self.reset()
+        zones = self.grid.zones_for(positions)
+        events = []
+        if len(zones) == 0:
+            return events
+        # Splits in stukken met dezelfde zone. Binnen een stuk zijn hooguit hold_frames frames nodig:
+        # daarna is de wissel gemeld, of het stuk was te kort en eindigt de lus vanzelf.
+        changes = np.flatnonzero(np.diff(zones)) + 1
+        starts = np.concatenate(([0], changes))
+        ends = np.concatenate((changes, [len(zones)]))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            zone = int(zones[start])
+            zone = None if zone < 0 else zone
+            for i in range(start, min(end, start + self.hold_frames)):
+                x, y = positions[i]
+                frame_events = self._step(zone, None if math.isnan(x) else (float(x), float(y)),
+                                          float(timestamps[i]))
+                events.extend(frame_events)
+                if zone == self.zone:
+                    break
+        return events
+
+
+class ZoneMidi:
+    """
+    Zet zonegebeurtenissen om naar MIDI: een note-on bij 'enter' en een note-off bij 'exit'.
+    Met x_controller/y_controller wordt daarnaast de positie binnen het grid als CC (0-127)
+    verstuurd, alleen als de waarde verandert.
+    """
+
+    def __init__(self, sender, grid, notes=None, base_note=60, channel=0, velocity=100,
+                 x_controller=None, y_controller=None):
+        """
+        Args:
+            sender (MidiSender): Verstuurt de berichten.
+            grid (ZoneGrid): Het zonegrid (voor het aantal zones en de CC-schaal).
+            notes (list, optional): Noot per zone; standaard base_note + zone-index.
+            base_note (int, optional): Eerste noot als notes niet is opgegeven.
+            channel (int, optional): MIDI-kanaal (0-15).
+            velocity (int, optional): Velocity van de note-ons.
+            x_controller (int, optional): Controllernummer voor de x-positie.
+            y_controller (int, optional): Controllernummer voor de y-positie.
+        """
+        self.sender = sender
+        self.grid = grid
+        self.notes = list(notes) if notes is not None else [base_note + i for i in range(grid.zone_count)]
+        if len(self.notes) != grid.zone_count or not all(0 <= note <= 127 for note in self.notes):
+            raise ValueError("Geef precies één geldige noot (0-127) per zone op.")
+        self.channel = channel
+        self.velocity = velocity
+        self.x_controller = x_controller
+        self.y_controller = y_controller
+        self._last_cc = {}
+
+    def handle(self, events, position=None):
+        """Verstuurt de berichten voor de gebeurtenissen (en positie) van één frame."""
+        for event in events:
+            if event.kind == "exit":
+                self.sender.send_note_off(self.channel, self.notes[event.zone])
+            else:
+                self.sender.send_note_on(self.channel, self.notes[event.zone], self.velocity)
+        if position is not None:
+            grid = self.grid
+            if self.x_controller is not None:
+                self._send_cc(self.x_controller, (position[0] - grid.x_min) / (grid.x_max - grid.x_min))
+            if self.y_controller is not None:
+                self._send_cc(self.y_controller, (position[1] - grid.y_min) / (grid.y_max - grid.y_min))
+
+    def _send_cc(self, controller, fraction):
+        value = int(round(min(max(fraction, 0.0), 1.0) * 127))
+        if self._last_cc.get(controller) != value:
+            self._last_cc[controller] = value
+            self.sender.send_control_change(self.channel, controller, value)
+
+    def release(self, zone):
+        """Laat de noot van een zone los (bijv. bij afsluiten)."""
+        if zone is not None:
+            self.sender.send_note_off(self.channel, self.notes[zone])
+
+
+class OccupancyEngine:
+    """
+    Koppelt SensorLayout, ZoneTracker en (optioneel) ZoneMidi: één frame met een afstand per
+    sensor gaat erin, de positie en zonegebeurtenissen komen eruit.
+
+        engine = OccupancyEngine(layout, grid, sender=sender, x_controller=20)
+        while True:
+            engine.update(array.measure_all())
+    """
+
+    def __init__(self, layout, grid, sender=None, hold_frames=2, **midi_options):
+        self.layout = layout
+        self.tracker = ZoneTracker(grid, hold_frames=hold_frames)
+        self.midi = ZoneMidi(sender, grid, **midi_options) if sender is not None else None
+        self.position = None
+        self.frame_count = 0
+
+    def update(self, distances, timestamp=None):
+        """Verwerkt één frame; geeft de lijst met ZoneEvents."""
+        self.position = self.layout.locate(distances)
+        events = self.tracker.update(self.position, timestamp)
+        if self.midi is not None:
+            self.midi.handle(events, self.position)
+        self.frame_count += 1
+        return events
+
+    def close(self):
+        """Laat een nog klinkende zonenoot los."""
+        if self.midi is not None:
+            self.midi.release(self.tracker.zone)
+        self.tracker.reset()
+
+
+def frames_from_session(path, sensor_count, speed_of_sound_cm_per_s=34320):
+    """
+    Zet een opgenomen sessie met meerdere sensoren (zie jj_recording) om naar frames voor
+    SensorLayout.locate_batch(): per record een frame met de laatst bekende afstand van elke sensor
+    (sample-and-hold). Frames vóórdat een sensor zijn eerste meting had, hebben daar NaN.
+
+    Returns:
+        tuple: (timestamps in s als (F,) array, frames als (F, sensor_count) array in cm).
+    """
+    np = jj_optional.load_numpy()
+    if np is None:
+        raise RuntimeError("frames_from_session() vereist NumPy.")
+    records = recording.load_session(path)
+    sensor_ids = np.asarray(records["sensor_id"])
+    pulses = np.asarray(records["pulse_ns"]).astype(float)
+    distances = np.where(pulses == recording.NO_ECHO, np.nan, pulses / 1e9 * speed_of_sound_cm_per_s / 2)
+    index = np.arange(len(records))
+    frames = np.full((len(records), sensor_count), np.nan)
+    for sensor in range(sensor_count):
+        mine = sensor_ids == sensor
+        latest = np.maximum.accumulate(np.where(mine, index, -1))  # Index van de laatste eigen meting
+        seen = latest >= 0
+        frames[seen, sensor] = distances[latest[seen]]
+    return np.asarray(records["timestamp_ns"]) / 1e9, frames
@@ -0,0 +1,118 @@
+import gc
+import math
+import statistics
+import sys
+import threading
+import time
+
+from modules import jj_gpio
+from modules import jj_mapping as mapping
+from modules import jj_midi as midi
+from modules import jj_shm as shm
+from modules import jj_ultrasonic as us
+
+# Benchmark: timing-jitter van de metingen met meten en MIDI-uitvoer in één proces, tegenover
+# een apart acquisitieproces met een gedeelde ringbuffer. Gebruikt de gesimuleerde GPIO-backend
+# (echo's in realtime) en een gesimuleerde MIDI-uitvoer, dus er is geen hardware nodig.
+
+RATE_HZ = 16.0
+DURATION_S = 5.0
+DISTANCE_CM = 120.0
+ACQUISITION_CPU = None  # Bijv. 3 om het acquisitieproces op de laatste kern van een Pi 4 te zetten
+
+def make_sensor():
+    gpio = jj_gpio.SimulatedGPIOBackend(realtime=True)
+    gpio.attach_echo(23, 24, jj_gpio.SimulatedGPIOBackend.pulse_for_distance(DISTANCE_CM))
+    return us.UltrasonicSensor(23, 24, gpio=gpio, capture="poll", settle_s=0.0, max_range_cm=400)
+
+def consumer_work(sender, mapper, distance, out):
+    """Werk van de uitvoerkant per meting: mappen, MIDI, een print en wat rommel voor de GC."""
+    value = mapper.map_distance(distance)
+    if value is not None:
+        sender.send_control_change(0, 7, value)
+    print(f"Afstand: {distance} cm -> {value}", file=out)
+    garbage = [[i] for i in range(2000)]
+    for i in range(len(garbage) - 1):
+        garbage[i].append(garbage[i + 1])  # Referentiecycli, zodat de GC echt werk heeft
+
+def make_consumer():
+    sender = midi.MidiSender(port_index=0, midiout=midi.SimulatedMidiOut(send_delay_s=0.002, keep_messages=False))
+    return sender, mapping.DistanceMapper(target="cc")
+
+def jitter(timestamps_ns, distances):
+    period_ms = 1000.0 / RATE_HZ
+    deviations = sorted(abs((b - a) / 1e6 - period_ms) for a, b in zip(timestamps_ns, timestamps_ns[1:]))
+    valid = [d for d in distances if d is not None]
+    if not deviations:
+        # Minder dan twee samples: geen intervallen om te vergelijken
+        deviations = [math.nan]
+    return {
+        "samples": len(timestamps_ns),
+        "jitter_mean_ms": statistics.fmean(deviations),
+        "jitter_p99_ms": deviations[int(0.99 * (len(deviations) - 1))],
+        "jitter_max_ms": deviations[-1],
+        "distance_stdev_cm": statistics.pstdev(valid) if len(valid) > 1 else 0.0,
+    }
+
+def run_single_process(out):
+    """Meten in de hoofdthread, uitvoer in een tweede thread van hetzelfde proces (zoals de pipeline)."""
+    sensor = make_sensor()
+    sender, mapper = make_consumer()
+    latest = [None]
+    stop = threading.Event()
+
+    def consume():
+        while not stop.is_set():
+            if latest[0] is not None:
+                consumer_work(sender, mapper, latest[0], out)
+            else:
+                time.sleep(0.001)
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    timestamps, distances = [], []
+    period_s = 1.0 / RATE_HZ
+    next_at = time.perf_counter()
+    end = next_at + DURATION_S
+    while time.perf_counter() < end:
+        timestamps.append(time.perf_counter_ns())
+        distance = sensor.get_distance()
+        distances.append(distance)
+        latest[0] = distance
+        next_at += period_s
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    stop.set()
+    thread.join()
+    sensor.close()
+    return jitter(timestamps, distances)
+
+def run_split(out):
+    """Meten in een eigen proces, uitvoer in dit proces via de gedeelde ringbuffer."""
+    acquisition = shm.AcquisitionProcess(make_sensor, rate_hz=RATE_HZ, cpu=ACQUISITION_CPU)
+    acquisition.start()
+    reader = acquisition.reader()
+    sender, mapper = make_consumer()
+    records = []
+    end = time.perf_counter() + DURATION_S
+    while time.perf_counter() < end:
+        new = reader.read()
+        records.extend(new)
+        if new and new[-1].distance is not None:
+            consumer_work(sender, mapper, new[-1].distance, out)
+        else:
+            time.sleep(0.001)
+    acquisition.stop()
+    records.extend(reader.read())
+    reader.close()
+    acquisition.close()
+    result = jitter([r.timestamp_ns for r in records], [r.distance for r in records])
+    result["overruns"] = reader.overrun_count
+    return result
+
+if __name__ == "__main__":
+    with open("/dev/null" if sys.platform != "win32" else "nul", "w") as out:
+        for label, run in (("Eén proces", run_single_process), ("Acquisitieproces + ring", run_split)):
+            gc.collect()
+            result = run(out)
+            print(f"{label:<25} " + ", ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                                               for key, value in result.items()))
@@ -0,0 +1,53 @@
+import statistics
+import subprocess
+import sys
+import time
+
+from modules import jj_gpio
+from modules import jj_midi as midi
+from modules import jj_ultrasonic as us
+
+# Benchmark van de opstarttijd: hoe snel zijn de modules geïmporteerd en hoe lang duurt het tot de
+# eerste meting, met de stabilisatietijd en poortdetectie direct in de constructors (zoals vroeger)
+# tegenover uitgesteld/op de achtergrond. Gebruikt gesimuleerde GPIO en een gesimuleerde MIDI-poort
+# waarvan het opsommen van de poorten ENUMERATE_DELAY_S duurt (zoals ALSA op een Pi).
+
+RUNS = 5
+ENUMERATE_DELAY_S = 0.3
+MODULES = ["jj_gpio", "jj_ultrasonic", "jj_midi", "jj_mapping", "jj_filters", "jj_pipeline", "jj_notes",
+           "jj_ports", "jj_recording", "jj_metrics"]
+
+class SlowEnumerationMidiOut(midi.SimulatedMidiOut):
+    def get_ports(self):
+        time.sleep(ENUMERATE_DELAY_S)
+        return super().get_ports()
+
+def cold_import_ms():
+    """Importtijd van alle modules in een vers Python-proces (mediaan over RUNS)."""
+    code = ("import time; start = time.perf_counter(); "
+            + "; ".join(f"import modules.{name}" for name in MODULES)
+            + "; print((time.perf_counter() - start) * 1000)")
+    times = [float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+             for _ in range(RUNS)]
+    return statistics.median(times)
+
+def time_to_first_measurement_ms(deferred):
+    start = time.perf_counter()
+    gpio = jj_gpio.SimulatedGPIOBackend(realtime=True)
+    gpio.attach_echo(23, 24, jj_gpio.SimulatedGPIOBackend.pulse_for_distance(100.0))
+    sender = midi.MidiSender(port_index=0, midiout=SlowEnumerationMidiOut(), background=deferred)
+    sensor = us.UltrasonicSensor(23, 24, gpio=gpio, capture="edge", max_range_cm=400, defer_settle=deferred)
+    constructed_ms = (time.perf_counter() - start) * 1000
+    sensor.get_distance()
+    first_measurement_ms = (time.perf_counter() - start) * 1000
+    sender.wait_ready()
+    midi_ready_ms = (time.perf_counter() - start) * 1000
+    sensor.close()
+    return constructed_ms, first_measurement_ms, midi_ready_ms
+
+if __name__ == "__main__":
+    print(f"Import van alle modules (koud, mediaan van {RUNS}): {cold_import_ms():.1f} ms")
+    for label, deferred in (("Direct (constructors wachten)", False), ("Uitgesteld / achtergrond", True)):
+        constructed, first, ready = time_to_first_measurement_ms(deferred)
+        print(f"{label:<32} constructors klaar: {constructed:7.1f} ms, eerste meting: {first:7.1f} ms, "
+              f"MIDI klaar: {ready:7.1f} ms")